@@ -1,11 +1,12 @@
 from django import forms
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.core.exceptions import ValidationError
 
 from api.constants import POST_RESERVED_SLUGS
 from api.models import (
     Anime,
     Comment,
+    EmbeddingIndex,
     Gal,
     Guest,
     Post,
@@ -285,8 +286,46 @@ class AnimeAdmin(admin.ModelAdmin):
     list_display = ["name", "created_at", "updated_at"]
 
 
+class EmbeddingIndexAdmin(admin.ModelAdmin):
+    list_display = ["embedding_model", "status", "dimensions", "activated_at"]
+    readonly_fields = [
+        "dimensions",
+        "status",
+        "activated_at",
+        "retired_at",
+        "created_at",
+    ]
+    actions = ["build_index", "cutover_index"]
+
+    @admin.action(description="Build (or resume) the shadow index")
+    def build_index(self, request, queryset):
+        from api.tasks import build_embedding_index_task
+
+        for index in queryset:
+            build_embedding_index_task.delay(index.embedding_model)
+        self.message_user(request, "Building in background.")
+
+    @admin.action(description="Switch the search to this index")
+    def cutover_index(self, request, queryset):
+        from api.embedding_index import cutover
+
+        if queryset.count() != 1:
+            self.message_user(request, "Select one index.", messages.ERROR)
+            return
+
+        try:
+            index = cutover(queryset.get().embedding_model)
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+
+        # the old vectors are garbage-collected by `prune_embedding_models_task`
+        self.message_user(request, f"Search is served by '{index.embedding_model}'.")
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Guest, GuestAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Gal, GalAdmin)
 admin.site.register(Anime, AnimeAdmin)
+admin.site.register(EmbeddingIndex, EmbeddingIndexAdmin)
@@ -0,0 +1,34 @@
+"""
+asyncio Redis client of the cache server.
+
+`cache.client` of django-redis is only sync, the async views run their scripts
+and pipelines (rate limit, auth nonce) by this client instead of switching to a
+thread. The keys are still made by `cache.make_key`.
+"""
+
+import asyncio
+import weakref
+
+from django.conf import settings
+from redis.asyncio import Redis
+
+__all__ = ["get_async_redis"]
+
+# a connection is bound to the loop which opened it
+_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Redis] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_redis() -> Redis:
+    """the client of the running event loop, connected on the first command"""
+    loop = asyncio.get_running_loop()
+    if (client := _clients.get(loop)) is None:
+        config = settings.CACHES["default"]
+        location = config["LOCATION"]
+        # the first server is the primary of django-redis
+        if isinstance(location, str):
+            location = location.split(",")
+        pool_kwargs = config.get("OPTIONS", {}).get("CONNECTION_POOL_KWARGS", {})
+        client = _clients[loop] = Redis.from_url(location[0], **pool_kwargs)
+    return client
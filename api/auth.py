@@ -1,23 +1,117 @@
-import asyncio
 import base64
+import functools
 import hashlib
 import logging
+import time
 import uuid
 from abc import ABC, abstractmethod
 
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 from django.conf import settings
 from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from ninja.security import HttpBearer
 
+from api.async_redis import get_async_redis
+
 logger = logging.getLogger(__name__)
 
+TOKEN_TTL = 30  # seconds
+# Fernet accepts a token up to 60s in the future, the nonce is kept until expired
+NONCE_TTL = TOKEN_TTL + 60
+# the live nonces of a client, the tokens beyond are rejected
+MAX_NONCES_PER_CLIENT = 10000
+
+
+def _fernet(key: str) -> Fernet:
+    digest = hashlib.sha256(key.encode()).digest()
+    return Fernet(base64.urlsafe_b64encode(digest))
+
+
+class Keyring:
+    """
+    The keys of the clients, `API_KEY` is shared by the clients without their
+    own keys (`API_CLIENT_KEYS`).
+
+    The first key of a client encrypts, the others are still accepted while
+    rotating, like `SECRET_KEY_FALLBACKS`.
+    """
+
+    def __init__(self, default_keys: list[str], client_keys: dict[str, list[str]]):
+        self.default = self._multi_fernet(default_keys)
+        self.clients = {
+            client_id: self._multi_fernet(keys)
+            for client_id, keys in client_keys.items()
+            if keys
+        }
+
+    @staticmethod
+    def _multi_fernet(keys: list[str]) -> MultiFernet | None:
+        keys = [key for key in keys if key]
+        return MultiFernet([_fernet(key) for key in keys]) if keys else None
+
+    def get(self, client_id: str | None = None) -> MultiFernet:
+        """the keys of the client, the shared ones if it has no keys"""
+        fernet = self.clients.get(client_id) or self.default
+        if fernet is None:
+            raise ValueError("API_KEY is not configured")
+        return fernet
+
+
+@functools.cache
+def get_keyring() -> Keyring:
+    """loaded once from the settings"""
+    return Keyring(
+        [settings.API_KEY, *settings.API_KEY_FALLBACKS], settings.API_CLIENT_KEYS
+    )
+
+
+@receiver(setting_changed)
+def _reset_keyring(setting, **kwargs):
+    if setting in ("API_KEY", "API_KEY_FALLBACKS", "API_CLIENT_KEYS"):
+        get_keyring.cache_clear()
+
+
+def _queue_claim(pipe, client_id: str, nonce: str) -> None:
+    """
+    The nonces of a client are a sorted set by the time, pruned by the TTL in
+    the same round-trip, the storage is bounded by the clients.
+    """
+
+    key = cache.make_key(f"auth_nonce:{client_id}")
+    now = time.time()
+    pipe.zremrangebyscore(key, "-inf", now - NONCE_TTL)
+    pipe.zadd(key, {nonce: now}, nx=True)
+    pipe.zcard(key)
+    pipe.expire(key, NONCE_TTL)
+
+
+def _claimed(results: list) -> bool:
+    _, added, count, _ = results
+    return bool(added) and count <= MAX_NONCES_PER_CLIENT
+
+
+def _claim_nonce(client_id: str, nonce: str) -> bool:
+    """record the nonce of the client, False if it's used (a replay)"""
+    pipe = cache.client.get_client(write=True).pipeline(transaction=True)
+    _queue_claim(pipe, client_id, nonce)
+    return _claimed(pipe.execute())
+
+
+async def _aclaim_nonce(client_id: str, nonce: str) -> bool:
+    """`_claim_nonce` by the asyncio client, see 'api/async_redis.py'"""
+    pipe = get_async_redis().pipeline(transaction=True)
+    _queue_claim(pipe, client_id, nonce)
+    return _claimed(await pipe.execute())
+
 
 class TimeBaseAuth(HttpBearer, ABC):
     """
     S2S authentication based on Fernet. TTL: 30s
 
-    token format: client_id:nonce
+    token format: client_id:nonce, encrypted by the shared `API_KEY`, or
+    `client_id.<encrypted>` by the keys of the client
     """
 
     @classmethod
@@ -25,13 +119,12 @@ class TimeBaseAuth(HttpBearer, ABC):
         if nonce is None:
             nonce = uuid.uuid4().hex
 
-        f = cls.get_fernet()
+        keyring = get_keyring()
         payload = cls.generate_token_format(client_id, nonce).encode("utf-8")
-        return f.encrypt(payload).decode("utf-8")
-
-    @staticmethod
-    def generate_auth_token_cache_key(client_id: str, nonce: str):
-        return f"auth_token:{client_id}:{nonce}"
+        token = keyring.get(client_id).encrypt(payload).decode("utf-8")
+        if client_id in keyring.clients:
+            return f"{client_id}.{token}"
+        return token
 
     @staticmethod
     def generate_token_format(client_id: str, nonce: str):
@@ -39,20 +132,35 @@ class TimeBaseAuth(HttpBearer, ABC):
 
     @staticmethod
     def get_fernet():
-        if not settings.API_KEY:
-            raise ValueError("API_KEY is not configured")
+        return get_keyring().get()
 
-        key = hashlib.sha256(settings.API_KEY.encode()).digest()
-        return Fernet(base64.urlsafe_b64encode(key))
+    @staticmethod
+    def decrypt_token(token: str) -> tuple[str, str] | None:
+        """(client_id, nonce) of a valid token, decrypting is cheap, it's inline"""
+        keyring = get_keyring()
+        # a Fernet token is urlsafe base64, without "."
+        client_id, _, token = token.rpartition(".")
+        if client_id and client_id not in keyring.clients:
+            return None
+
+        payload = keyring.get(client_id or None).decrypt(token.encode(), ttl=TOKEN_TTL)
+        payload_client_id, _, nonce = payload.decode().partition(":")
+        if not payload_client_id or not nonce:
+            return None
+        # a client's key only signs its own tokens, and the shared key doesn't
+        # sign for a client with its own keys
+        if client_id and payload_client_id != client_id:
+            return None
+        if not client_id and payload_client_id in keyring.clients:
+            return None
+        return payload_client_id, nonce
 
     @abstractmethod
     def authenticate(self, request, token):
         raise NotImplementedError("use AsyncTimeBaseAuth or SyncTimeBaseAuth instead")
 
 
-# TODO: Auth,
-#  1. multi-client and corresponding API key verification
-#  2. fine-grained permissions: read/write
+# TODO: Auth, fine-grained permissions: read/write
 class AsyncTimeBaseAuth(TimeBaseAuth):
     """
     Asynchronous S2S authentication based on Fernet. TTL: 30s
@@ -61,26 +169,14 @@ class AsyncTimeBaseAuth(TimeBaseAuth):
     @classmethod
     async def authenticate(cls, request, token):
         try:
-            # fernet decrypt
-            f = cls.get_fernet()
-            decrypt_token_bytes: bytes = await asyncio.to_thread(
-                f.decrypt, token.encode(), ttl=30
-            )
-            decrypt_token = decrypt_token_bytes.decode()
-
-            # get payload
-            client_id, nonce = decrypt_token.split(":", 1)
-            if not client_id or not nonce:
+            if (payload := cls.decrypt_token(token)) is None:
                 return None
 
-            cache_key = cls.generate_auth_token_cache_key(client_id, nonce)
-            # TODO: Auth, cache storage DOS protection
-            is_new_request = await cache.aadd(cache_key, 1, timeout=30)  # atomicity
-            if not is_new_request:
-                # protect against replay attacks
+            # protect against replay attacks
+            if not await _aclaim_nonce(*payload):
                 return None
 
-            return client_id
+            return payload[0]
         except Exception as e:
             # ban attackers?
             logger.debug(e)
@@ -95,19 +191,13 @@ class SyncTimeBaseAuth(TimeBaseAuth):
     @classmethod
     def authenticate(cls, request, token):
         try:
-            f = cls.get_fernet()
-            decrypt_token = f.decrypt(token.encode(), ttl=30).decode("utf-8")
-
-            client_id, nonce = decrypt_token.split(":", 1)
-            if not client_id or not nonce:
+            if (payload := cls.decrypt_token(token)) is None:
                 return None
 
-            cache_key = cls.generate_auth_token_cache_key(client_id, nonce)
-            is_new_request = cache.add(cache_key, 1, timeout=30)
-            if not is_new_request:
+            if not _claim_nonce(*payload):
                 return None
 
-            return client_id
+            return payload[0]
         except Exception as e:
             logger.debug(e)
             return None
@@ -0,0 +1,291 @@
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable
+
+from asgiref.sync import sync_to_async
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_prometheus.cache.backends.redis import RedisCache
+from django_prometheus.cache.metrics import (
+    django_cache_get_total,
+    django_cache_hits_total,
+    django_cache_misses_total,
+)
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+# the payload to drop every local entry, e.g. `clear()`
+_FLUSH = "*"
+
+
+class LocalLRU:
+    """bounded LRU of the pickled values, the entries expire after `timeout`"""
+
+    def __init__(self, max_entries: int, timeout: float):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+        # increased by every invalidation, a value read from Redis before it
+        # may be stale and is not stored
+        self.generation = 0
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, data = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+        # a copy for every caller, e.g. the session dict is changed in place
+        return pickle.loads(data)
+
+    def set(self, key: str, value: Any, generation: int) -> None:
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.timeout, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TwoTierRedisCache(RedisCache):
+    """
+    Redis cache with an in-process LRU in front of it.
+
+    Only the keys starting with `OPTIONS["LOCAL_KEY_PREFIXES"]` (e.g. the
+    rendered responses) are kept in the process, the others (rate limit, auth
+    nonce, sessions) always go to Redis. A write of a local key publishes the
+    key to `OPTIONS["LOCAL_CHANNEL"]`, every worker evicts it. The local tier is
+    bypassed while the worker is not subscribed, and the entries expire after
+    `OPTIONS["LOCAL_TIMEOUT"]` seconds in case a message is lost.
+
+    The hits and misses of the local tier are exported with `backend="local"`,
+    the same metrics as the Redis tier.
+    """
+
+    def __init__(self, server: str, params: dict[str, Any]) -> None:
+        super().__init__(server, params)
+        options = params.get("OPTIONS", {})
+        self._local_prefixes = tuple(options.get("LOCAL_KEY_PREFIXES", ()))
+        self._channel = options.get("LOCAL_CHANNEL", "cache:invalidate")
+        self._local = LocalLRU(
+            max_entries=options.get("LOCAL_MAX_ENTRIES", 1024),
+            timeout=options.get("LOCAL_TIMEOUT", 5),
+        )
+        self._subscribed = threading.Event()
+        self._listener_pid: int | None = None
+        self._listener_lock = threading.Lock()
+
+    # === local tier ===
+
+    def _is_local(self, key: str) -> bool:
+        return bool(self._local_prefixes) and str(key).startswith(self._local_prefixes)
+
+    def _ensure_listener(self) -> bool:
+        """start the subscriber of this process (after the fork of gunicorn)"""
+        if self._listener_pid != os.getpid():
+            with self._listener_lock:
+                if self._listener_pid != os.getpid():
+                    self._local.clear()
+                    self._subscribed.clear()
+                    self._listener_pid = os.getpid()
+                    threading.Thread(
+                        target=self._listen, name="cache-invalidation", daemon=True
+                    ).start()
+        return self._subscribed.is_set()
+
+    def _listen(self) -> None:
+        backoff = 1
+        while True:
+            pubsub = None
+            try:
+                redis = self.client.get_client(write=False)
+                pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                # the messages missed before subscribing
+                self._local.clear()
+                self._subscribed.set()
+                backoff = 1
+                for message in pubsub.listen():
+                    self._on_message(message["data"])
+            except Exception as e:
+                logger.warning(f"Cache invalidation channel lost: {e}")
+            finally:
+                # can't know the writes now, stop serving local entries
+                self._subscribed.clear()
+                self._local.clear()
+                if pubsub is not None:
+                    pubsub.close()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _on_message(self, data: bytes | str) -> None:
+        keys = json.loads(data)
+        if keys == _FLUSH:
+            self._local.clear()
+        else:
+            self._local.evict(keys)
+
+    def _publish(self, payload: list[str] | str) -> None:
+        try:
+            self.client.get_client(write=True).publish(
+                self._channel, json.dumps(payload)
+            )
+        except Exception as e:
+            # the other workers keep it until the local timeout
+            logger.warning(f"Failed publish cache invalidation: {e}")
+
+    def _invalidate(self, keys: Iterable[str], version: int | None = None) -> None:
+        made_keys = [self.make_key(k, version) for k in keys if self._is_local(k)]
+        if made_keys:
+            self._local.evict(made_keys)
+            self._publish(made_keys)
+
+    def _invalidate_all(self) -> None:
+        self._local.clear()
+        self._publish(_FLUSH)
+
+    def _local_get(self, key: str, version: int | None) -> tuple[Any, int | None]:
+        """the local value (or `_MISSING`) and the generation to store it"""
+        if not self._is_local(key) or not self._ensure_listener():
+            return _MISSING, None
+
+        django_cache_get_total.labels(backend="local").inc()
+        value = self._local.get(self.make_key(key, version))
+        if value is _MISSING:
+            django_cache_misses_total.labels(backend="local").inc()
+            return _MISSING, self._local.generation
+        django_cache_hits_total.labels(backend="local").inc()
+        return value, None
+
+    def _local_set(
+        self, key: str, version: int | None, value: Any, generation: int | None
+    ) -> None:
+        if generation is not None and value is not None:
+            self._local.set(self.make_key(key, version), value, generation)
+
+    # === reads ===
+
+    def _redis_get(self, key, default, version, client, generation):
+        value = super().get(key, default=None, version=version, client=client)
+        self._local_set(key, version, value, generation)
+        return default if value is None else value
+
+    def get(self, key, default=None, version=None, client=None):
+        value, generation = self._local_get(key, version)
+        if value is not _MISSING:
+            return value
+        return self._redis_get(key, default, version, client, generation)
+
+    async def aget(self, key, default=None, version=None):
+        # a local hit doesn't switch to the thread
+        value, generation = self._local_get(key, version)
+        if value is not _MISSING:
+            return value
+        return await sync_to_async(self._redis_get)(
+            key, default, version, None, generation
+        )
+
+    def _local_get_many(self, keys, version) -> tuple[dict, dict]:
+        """the local values, and the generations of the missed keys"""
+        found, missed = {}, {}
+        for key in keys:
+            value, generation = self._local_get(key, version)
+            if value is _MISSING:
+                missed[key] = generation
+            else:
+                found[key] = value
+        return found, missed
+
+    def _redis_get_many(self, missed: dict, version, client) -> dict:
+        # one MGET, `BaseCache.aget_many` would `aget` the keys one by one
+        values = super().get_many(list(missed), version=version, client=client)
+        for key, value in values.items():
+            self._local_set(key, version, value, missed[key])
+        return values
+
+    def get_many(self, keys, version=None, client=None):
+        found, missed = self._local_get_many(keys, version)
+        if missed:
+            found |= self._redis_get_many(missed, version, client)
+        return found
+
+    async def aget_many(self, keys, version=None):
+        found, missed = self._local_get_many(keys, version)
+        if missed:
+            found |= await sync_to_async(self._redis_get_many)(missed, version, None)
+        return found
+
+    # === writes ===
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, **kwargs):
+        result = super().set(key, value, timeout=timeout, version=version, **kwargs)
+        self._invalidate([key], version)
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, **kwargs):
+        result = super().add(key, value, timeout=timeout, version=version, **kwargs)
+        if result:
+            self._invalidate([key], version)
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, **kwargs):
+        result = super().set_many(data, timeout=timeout, version=version, **kwargs)
+        self._invalidate(data, version)
+        return result
+
+    def delete(self, key, version=None, **kwargs):
+        result = super().delete(key, version=version, **kwargs)
+        self._invalidate([key], version)
+        return result
+
+    def delete_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        result = super().delete_many(keys, version=version, **kwargs)
+        self._invalidate(keys, version)
+        return result
+
+    def incr(self, key, delta=1, version=None, **kwargs):
+        result = super().incr(key, delta=delta, version=version, **kwargs)
+        self._invalidate([key], version)
+        return result
+
+    def decr(self, key, delta=1, version=None, **kwargs):
+        result = super().decr(key, delta=delta, version=version, **kwargs)
+        self._invalidate([key], version)
+        return result
+
+    def delete_pattern(self, *args, **kwargs):
+        result = super().delete_pattern(*args, **kwargs)
+        self._invalidate_all()
+        return result
+
+    def clear(self):
+        result = super().clear()
+        self._invalidate_all()
+        return result
@@ -1 +1,2 @@
 from .ResendEmailBackend import ResendEmailBackend as ResendEmailBackend
+from .TwoTierRedisCache import TwoTierRedisCache as TwoTierRedisCache
@@ -0,0 +1,66 @@
+"""
+Batch multi-get of the detail objects, e.g. `/post/batch?ids=3,1,2`.
+
+The objects are returned in the requested order (the missing ones are
+skipped), the bodies cached by the detail endpoint (see 'api/response_cache.py')
+are read with one multi-get and the others are fetched with one query.
+"""
+
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponse
+from ninja.errors import HttpError
+from pydantic import BaseModel
+
+from api.renderers import dumps
+from api.response_cache import get_cached_responses
+
+__all__ = ["BATCH_MAX_SIZE", "parse_ids", "batch_response"]
+
+BATCH_MAX_SIZE = 100
+
+
+def parse_ids(ids: str, max_size: int = BATCH_MAX_SIZE) -> list[int]:
+    """
+    the unique ids of a comma separated list, in order.
+
+    :raise HttpError: 400 if an id is not an integer, or too many
+    """
+
+    try:
+        values = [int(i) for i in ids.split(",") if i.strip()]
+    except ValueError:
+        raise HttpError(400, "ids must be comma separated integers")
+    values = list(dict.fromkeys(values))
+    if not values:
+        raise HttpError(400, "No ids")
+    if len(values) > max_size:
+        raise HttpError(400, f"At most {max_size} ids")
+    return values
+
+
+async def batch_response(
+    request: HttpRequest,
+    ids: list[int],
+    queryset: QuerySet,
+    schema: type[BaseModel],
+    cached: tuple[str, str] | None = None,
+) -> HttpResponse:
+    """
+    the JSON list of the objects of the ids.
+
+    :param queryset: the objects with their relations, filtered by the pk
+    :param cached: (endpoint, path param) of the detail response cache
+    """
+
+    bodies: dict[int, bytes] = {}
+    if cached is not None:
+        endpoint, param = cached
+        bodies = await get_cached_responses(endpoint, schema, param, ids)
+
+    if misses := [i for i in ids if i not in bodies]:
+        async for obj in queryset.filter(pk__in=misses):
+            data = schema.model_validate(obj, context={"request": request})
+            bodies[obj.pk] = dumps(data.model_dump())
+
+    body = b",".join(bodies[i] for i in ids if i in bodies)
+    return HttpResponse(b"[" + body + b"]", content_type="application/json")
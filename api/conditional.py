@@ -0,0 +1,50 @@
+"""
+Conditional GET for the detail endpoints.
+
+The validators (ETag and Last-Modified) are built from a few small columns,
+which are queried by the primary key or a unique index. If the client (e.g.
+the ISR revalidation of the frontend) already has the same version, `304 Not
+Modified` is returned before the row is loaded and serialized.
+"""
+
+from datetime import datetime
+
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from core.hash import calculate_blake3_hash
+
+__all__ = ["build_etag", "check_not_modified"]
+
+
+def build_etag(*parts) -> str:
+    """a strong ETag of the parts, e.g. the primary key and `updated_at`"""
+    return f'"{calculate_blake3_hash(":".join(map(str, parts)))[:32]}"'
+
+
+def check_not_modified(
+    request: HttpRequest,
+    response: HttpResponse,
+    etag: str,
+    last_modified: datetime | None = None,
+) -> HttpResponse | None:
+    """
+    set the validators to the (ninja temporal) response.
+
+    :return: `304` (or `412`) response if the condition matches, otherwise None,
+        the view continues to return the body
+    """
+
+    response.headers["ETag"] = etag
+    timestamp = None
+    if last_modified is not None:
+        timestamp = int(last_modified.timestamp())
+        response.headers["Last-Modified"] = http_date(timestamp)
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=timestamp, response=response
+    )
+    if conditional is response:
+        return None
+    return conditional
@@ -7,6 +7,7 @@ POST_RESERVED_SLUGS: set[str] = {
     "api",
     "archive",
     "atom",
+    "batch",
     "categories",
     "category",
     "comment",
@@ -0,0 +1,101 @@
+"""
+Parse the Markdown content once and share the result.
+
+Saving a post needs the front matter (metadata), the HTML, the plain text
+(keywords, description, FTS) and the sections (chunking). `analyze_content`
+builds all of them from one `render_with_frontmatter` call plus one text
+extraction, and memoises the result by the content hash, so the admin form,
+`Post.save`, the signals and the tasks won't parse the same content again.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import cached_property
+from threading import Lock
+from typing import Any
+
+from core.hash import calculate_blake3_hash
+
+from .markdown import Markdown
+from .text_chunking import TextNormalizer, TextSection
+from .utils import MetadataResult, build_metadata, extract_first_image
+
+__all__ = ["ContentAnalysis", "analyze_content", "render_review_html"]
+
+# the posts are large, keep a few of them
+CACHE_SIZE = 32
+
+_markdown = Markdown(html=True)
+# the reviews have no front matter
+_review_markdown = Markdown(html=True, frontmatter=False)
+_cache: OrderedDict[str, "ContentAnalysis"] = OrderedDict()
+_cache_lock = Lock()
+
+
+@dataclass(frozen=True)
+class ContentAnalysis:
+    content_hash: str
+    front_matter: dict[str, Any]
+    html: str
+    sections: tuple[TextSection, ...]
+    first_image: str | None = None
+    _metadata: dict[int, MetadataResult] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+
+    @cached_property
+    def text(self) -> str:
+        """plain text, paragraphs are separated by blank lines"""
+        return "\n\n".join(section.text for section in self.sections)
+
+    @cached_property
+    def tokenized(self) -> str:
+        """the plain text cut by jieba, for PG FTS"""
+        import jieba
+
+        return " ".join(jieba.lcut(self.text, cut_all=True))
+
+    def metadata(self, num_keywords: int = 5) -> MetadataResult:
+        if (metadata := self._metadata.get(num_keywords)) is None:
+            metadata = build_metadata(
+                self.front_matter, self.text, self.first_image, num_keywords
+            )
+            self._metadata[num_keywords] = metadata
+        # don't share the mutable tags list
+        return {**metadata, "tags": list(metadata["tags"])}
+
+
+def _analyze(content: str, content_hash: str) -> ContentAnalysis:
+    # the front matter must be at the very beginning for the parser
+    markdown = TextNormalizer.LEADING_BLANK_LINES_RE.sub("", content)
+    front_matter, html = _markdown.render_with_frontmatter(markdown)
+    return ContentAnalysis(
+        content_hash=content_hash,
+        front_matter=front_matter,
+        html=html,
+        sections=tuple(TextNormalizer.sections(markdown)),
+        first_image=extract_first_image(markdown),
+    )
+
+
+def analyze_content(content: str) -> ContentAnalysis:
+    """memoised by the blake3 hash of the content"""
+
+    content_hash = calculate_blake3_hash(content)
+    with _cache_lock:
+        if (analysis := _cache.get(content_hash)) is not None:
+            _cache.move_to_end(content_hash)
+            return analysis
+
+    # parse outside the lock, the same content may be parsed twice but it's fine
+    analysis = _analyze(content, content_hash)
+    with _cache_lock:
+        _cache[content_hash] = analysis
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return analysis
+
+
+def render_review_html(review: str | None) -> str:
+    """the HTML of a `Gal` review"""
+    return _review_markdown.render_cached(review or "")
@@ -0,0 +1,111 @@
+"""
+Cached `COUNT(*)` for the paginated endpoints.
+
+The totals only change when a row is saved or deleted, so the count of a
+queryset is cached by the models it reads and the SQL signature. Every model
+has a version in the cache, `invalidate_counts` (called by the save, delete and
+m2m signals, see 'api/signals.py') changes it, the old counts are never read
+again and expire later. The models of the joined tables (e.g. filtered by
+`tags__name`) are in the key too, the subqueries are not.
+
+The count of a large unfiltered table is estimated by `pg_class.reltuples`.
+"""
+
+import functools
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.db.models import Model, QuerySet
+
+from core.hash import calculate_blake3_hash
+
+__all__ = [
+    "count_queryset",
+    "acount_queryset",
+    "invalidate_counts",
+]
+
+logger = logging.getLogger(__name__)
+
+COUNT_TIMEOUT = 60 * 60 * 24  # 1 day, invalidated by the signals anyway
+# use the estimate when the table is larger than it
+ESTIMATE_THRESHOLD = 100_000
+
+
+def _version_key(model: type[Model]) -> str:
+    return f"count:version:{model._meta.label_lower}"
+
+
+def invalidate_counts(*models: type[Model]) -> None:
+    """change the version of the models and the models referring to them"""
+
+    # e.g. deleting a category sets the `Post.category` to null
+    changed = set(models)
+    for model in models:
+        changed.update(rel.related_model for rel in model._meta.related_objects)
+    version = time.time_ns()
+    cache.set_many({_version_key(m): version for m in changed}, timeout=None)
+
+
+@functools.cache
+def _models_by_table() -> dict[str, type[Model]]:
+    # the auto-created ones are the m2m tables, e.g. `api_post_tags`
+    return {m._meta.db_table: m for m in apps.get_models(include_auto_created=True)}
+
+
+def _read_models(queryset: QuerySet) -> list[type[Model]]:
+    """the model of the queryset and the models of the joined tables"""
+    tables = {join.table_name for join in queryset.query.alias_map.values()}
+    models = {_models_by_table().get(table) for table in tables} - {None}
+    return sorted(models | {queryset.model}, key=lambda m: m._meta.label_lower)
+
+
+def _count_key(queryset: QuerySet) -> str:
+    version_keys = [_version_key(model) for model in _read_models(queryset)]
+    versions = cache.get_many(version_keys)
+    version = ":".join(str(versions.get(key, 0)) for key in version_keys)
+    sql, params = queryset.query.sql_with_params()
+    signature = calculate_blake3_hash(f"{sql}:{params!r}")
+    return f"count:{queryset.model._meta.label_lower}:{version}:{signature}"
+
+
+def _estimate(queryset: QuerySet) -> int | None:
+    """`reltuples` of the table, only for an unfiltered queryset"""
+    connection = connections[queryset.db]
+    if queryset.query.where or connection.vendor != "postgresql":
+        return None
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+    except DatabaseError as e:
+        logger.warning(f"Failed estimate count: {e}")
+        return None
+    # -1 if the table is never analyzed
+    if row is None or row[0] < ESTIMATE_THRESHOLD:
+        return None
+    return row[0]
+
+
+def count_queryset(queryset: QuerySet) -> int:
+    key = _count_key(queryset)
+    if (count := cache.get(key)) is not None:
+        return count
+
+    count = _estimate(queryset)
+    if count is None:
+        count = queryset.count()
+    cache.set(key, count, timeout=COUNT_TIMEOUT)
+    return count
+
+
+async def acount_queryset(queryset: QuerySet) -> int:
+    return await sync_to_async(count_queryset)(queryset)
@@ -0,0 +1,153 @@
+"""
+Zero-downtime embedding model migration.
+
+Every `PostChunk` is tagged with the model which produced it. The search only
+reads the vectors of the serving model, while a shadow index of another model
+can be built in the background (see `api.tasks.build_embedding_index_task`).
+After the shadow index is ready, `cutover` switches the search atomically, and
+the vectors of the retired models are garbage-collected later.
+"""
+
+import logging
+from datetime import datetime
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from api.ml_model import get_embedding_model_name
+from api.models import EmbeddingIndex, PostChunk
+from core.hash import calculate_blake3_hash
+
+__all__ = [
+    "get_serving_index",
+    "ensure_serving_index",
+    "get_writing_models",
+    "create_vector_index",
+    "drop_vector_index",
+    "cutover",
+    "prune_retired_models",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def _index_name(embedding_model: str) -> str:
+    # PG identifier max length is 63
+    return f"post_chunk_emb_{calculate_blake3_hash(embedding_model)[:16]}_idx"
+
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def get_serving_index() -> EmbeddingIndex | None:
+    """
+    the index which the search reads from.
+
+    `None` before the first embedding is written, never the configured model,
+    a changed model name must not switch the search without a cutover.
+    """
+
+    return EmbeddingIndex.objects.filter(status="serving").first()
+
+
+def ensure_serving_index() -> None:
+    """persist the configured model as the serving index if there is none yet"""
+
+    if EmbeddingIndex.objects.filter(status="serving").exists():
+        return
+    try:
+        with transaction.atomic():
+            EmbeddingIndex.objects.get_or_create(
+                embedding_model=get_embedding_model_name(),
+                defaults={"status": "serving"},
+            )
+    except IntegrityError:
+        # created by a concurrent embedding
+        pass
+
+
+def get_writing_models() -> list[str]:
+    """the models which need to keep up to date when a post changed"""
+
+    models = list(
+        EmbeddingIndex.objects.filter(
+            status__in=["serving", "building", "ready"]
+        ).values_list("embedding_model", flat=True)
+    )
+    configured = get_embedding_model_name()
+    if configured not in models:
+        models.append(configured)
+    return models
+
+
+def create_vector_index(embedding_model: str, dimensions: int) -> None:
+    """
+    create a partial HNSW index only for the vectors of the model.
+
+    `CONCURRENTLY` won't lock the table, so the serving index keeps working,
+    but it can't run inside a transaction.
+    """
+
+    table = connection.ops.quote_name(PostChunk._meta.db_table)
+    concurrently = "" if connection.in_atomic_block else "CONCURRENTLY"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE INDEX {concurrently} IF NOT EXISTS "
+            f"{connection.ops.quote_name(_index_name(embedding_model))} "
+            f"ON {table} USING hnsw "
+            f"((embedding::vector({int(dimensions)})) vector_cosine_ops) "
+            f"WITH (m = 32, ef_construction = 256) "
+            f"WHERE embedding_model = {_quote_literal(embedding_model)}"
+        )
+
+
+def drop_vector_index(embedding_model: str) -> None:
+    concurrently = "" if connection.in_atomic_block else "CONCURRENTLY"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DROP INDEX {concurrently} IF EXISTS "
+            f"{connection.ops.quote_name(_index_name(embedding_model))}"
+        )
+
+
+def cutover(embedding_model: str) -> EmbeddingIndex:
+    """switch the search to a ready index, in one transaction"""
+
+    with transaction.atomic():
+        target = EmbeddingIndex.objects.select_for_update().get(
+            embedding_model=embedding_model
+        )
+        if target.status == "serving":
+            return target
+        if target.status != "ready":
+            raise ValueError(
+                f"Embedding index '{embedding_model}' is not ready ({target.status})"
+            )
+
+        # retire first, the unique constraint allows only one serving index
+        now = timezone.now()
+        EmbeddingIndex.objects.filter(status="serving").update(
+            status="retired", retired_at=now, updated_at=now
+        )
+        target.status = "serving"
+        target.activated_at = timezone.now()
+        target.save(update_fields=["status", "activated_at", "updated_at"])
+
+    logger.info(f"Search switched to embedding model '{embedding_model}'")
+    return target
+
+
+def prune_retired_models(retired_before: datetime) -> list[str]:
+    """delete the vectors and indexes of the models retired before the time"""
+
+    pruned = []
+    for index in EmbeddingIndex.objects.filter(
+        status="retired", retired_at__lt=retired_before
+    ):
+        PostChunk.objects.filter(embedding_model=index.embedding_model).delete()
+        drop_vector_index(index.embedding_model)
+        index.delete()
+        pruned.append(index.embedding_model)
+        logger.info(f"Pruned embedding model '{index.embedding_model}'")
+    return pruned
@@ -0,0 +1,74 @@
+"""
+Sparse fieldsets, `?fields=title,slug` or `?exclude=content,content_html`.
+
+The view validates the query against the response schema with
+`parse_fieldset`, and loads only the columns of the fields. The names are kept
+on the request, `SparseSchema` (see 'api/schemas/base.py') only reads and
+dumps these fields of the object, the others are never touched, so a deferred
+column is not loaded by the serialization.
+"""
+
+import functools
+from collections.abc import Iterable
+
+from django.http import HttpRequest
+from ninja.errors import HttpError
+from ninja.schema import Schema
+from pydantic import create_model
+
+__all__ = ["parse_fieldset", "get_fieldset", "sparse_model"]
+
+_REQUEST_ATTRIBUTE = "_fieldsets"
+
+
+def _split(value: str | None) -> list[str]:
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def parse_fieldset(
+    request: HttpRequest,
+    schema: type[Schema],
+    fields: str | None = None,
+    exclude: str | None = None,
+) -> frozenset[str] | None:
+    """
+    the fields of the schema to return, None for all of them.
+
+    :raise HttpError: 400 if a field is not in the schema, or both are given
+    """
+
+    if fields and exclude:
+        raise HttpError(400, "Only one of 'fields' and 'exclude' can be given")
+    names = _split(fields) or _split(exclude)
+    if not names:
+        return None
+
+    if unknown := set(names) - schema.model_fields.keys():
+        raise HttpError(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    fieldset = frozenset(names) if fields else schema.model_fields.keys() - names
+    if not fieldset:
+        raise HttpError(400, "No fields to return")
+
+    fieldsets = request.__dict__.setdefault(_REQUEST_ATTRIBUTE, {})
+    fieldsets[schema] = frozenset(fieldset)
+    return fieldsets[schema]
+
+
+def get_fieldset(context: dict | None, schema: type[Schema]) -> frozenset[str] | None:
+    """the fields requested for the schema, from the pydantic validation context"""
+    request = (context or {}).get("request")
+    return getattr(request, _REQUEST_ATTRIBUTE, {}).get(schema)
+
+
+@functools.cache
+def sparse_model(schema: type[Schema], fields: Iterable[str]) -> type[Schema]:
+    """a schema of the subset of the fields"""
+    return create_model(
+        f"{schema.__name__}Sparse",
+        __base__=Schema,
+        **{
+            name: (schema.model_fields[name].annotation, schema.model_fields[name])
+            for name in sorted(fields)
+        },
+    )
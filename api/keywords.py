@@ -0,0 +1,249 @@
+"""
+Keyword extraction with the IDF of our own posts.
+
+jieba ships a generic IDF table, the words which are common in this blog
+(e.g. "游戏") still get high scores. `refresh_idf_table` counts the document
+frequency of the posts and pages, and writes a compact table:
+
+    <KEYWORD_IDF_DIR>/
+        terms.<version>.npy  sorted terms, fixed-width unicode, memory-mapped
+        df.<version>.npy     document frequency of each term (int32)
+        current.json         {"version": 3, "documents": 120}
+
+`current.json` is replaced atomically after the arrays are written, the readers
+reload the table when it changes. The terms of each document are kept in
+`CorpusDocument`, only the changed documents are tokenized again.
+"""
+
+import json
+import logging
+import os
+import tempfile
+from collections import Counter
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from core.hash import calculate_blake3_hash
+
+__all__ = [
+    "IdfTable",
+    "extract_keywords",
+    "get_idf_table",
+    "refresh_idf_table",
+    "tokenize_terms",
+    "write_idf_table",
+]
+
+logger = logging.getLogger(__name__)
+
+# longer terms are not in the table, they score as the median idf
+MAX_TERM_LENGTH = 16
+# the corpus is too small to tell the common words, use the jieba table
+MIN_DOCUMENTS = 20
+# keep the previous version, readers may still map it
+KEEP_VERSIONS = 2
+
+_CURRENT_FILE = "current.json"
+
+
+def _stop_words() -> set[str]:
+    from jieba import analyse as jieba_analyse
+
+    return jieba_analyse.default_tfidf.stop_words
+
+
+def tokenize_terms(text: str) -> list[str]:
+    """cut the text, drop the stop words and single characters (same as jieba)"""
+    import jieba
+
+    stop_words = _stop_words()
+    return [
+        word
+        for word in jieba.lcut(text)
+        if len(word.strip()) >= 2 and word.lower() not in stop_words
+    ]
+
+
+class IdfTable:
+    def __init__(
+        self, terms: np.ndarray, df: np.ndarray, documents: int, version: int = 0
+    ):
+        self.terms = terms
+        self.df = df
+        self.documents = documents
+        self.version = version
+        self.median_idf = float(np.median(self.idf_of(df))) if len(df) else 0.0
+
+    def idf_of(self, df: np.ndarray) -> np.ndarray:
+        return np.log((self.documents + 1) / (df + 1)) + 1
+
+    def lookup(self, words: np.ndarray) -> np.ndarray:
+        """idf of each word, the unknown words get the median idf"""
+        if not len(self.terms):
+            return np.full(len(words), self.median_idf)
+
+        index = np.searchsorted(self.terms, words)
+        index = np.minimum(index, len(self.terms) - 1)
+        found = self.terms[index] == words
+        df = np.where(found, self.df[index], 0)
+        return np.where(found, self.idf_of(df), self.median_idf)
+
+    def extract(self, text: str, top_k: int = 5) -> list[str]:
+        words = [word for word in tokenize_terms(text) if len(word) <= MAX_TERM_LENGTH]
+        if not words:
+            return []
+
+        unique, counts = np.unique(np.array(words), return_counts=True)
+        scores = counts / len(words) * self.lookup(unique)
+        # stable, the same scores keep the alphabet order
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [str(word) for word in unique[order]]
+
+    @classmethod
+    def load(cls, directory: str | Path) -> "IdfTable | None":
+        directory = Path(directory)
+        try:
+            meta = json.loads((directory / _CURRENT_FILE).read_text())
+            version = meta["version"]
+            terms = np.load(directory / f"terms.{version}.npy", mmap_mode="r")
+            df = np.load(directory / f"df.{version}.npy", mmap_mode="r")
+        except (OSError, ValueError, KeyError) as e:
+            logger.debug(f"IDF table is not available: {e}")
+            return None
+        return cls(terms, df, meta["documents"], version)
+
+
+def write_idf_table(
+    directory: str | Path, df: Counter[str], documents: int, version: int
+) -> None:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    terms = sorted(term for term in df if len(term) <= MAX_TERM_LENGTH)
+    width = max((len(term) for term in terms), default=1)
+    np.save(directory / f"terms.{version}.npy", np.array(terms, dtype=f"<U{width}"))
+    np.save(
+        directory / f"df.{version}.npy",
+        np.array([df[term] for term in terms], dtype=np.int32),
+    )
+
+    # switch the version atomically
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, suffix=".tmp", delete=False
+    ) as f:
+        json.dump({"version": version, "documents": documents}, f)
+    os.replace(f.name, directory / _CURRENT_FILE)
+
+    for old in range(version - KEEP_VERSIONS, 0, -1):
+        for name in (f"terms.{old}.npy", f"df.{old}.npy"):
+            (directory / name).unlink(missing_ok=True)
+
+
+_table: IdfTable | None = None
+_table_stat: tuple[int, int] | None = None
+_table_lock = Lock()
+
+
+def get_idf_table() -> IdfTable | None:
+    """the table of this process, reload it after the job wrote a new version"""
+    global _table, _table_stat
+
+    current = Path(settings.KEYWORD_IDF_DIR) / _CURRENT_FILE
+    try:
+        # `os.replace` always creates a new inode
+        stat = current.stat()
+    except OSError:
+        return None
+
+    with _table_lock:
+        if (stat.st_ino, stat.st_mtime_ns) != _table_stat:
+            _table = IdfTable.load(settings.KEYWORD_IDF_DIR)
+            _table_stat = (stat.st_ino, stat.st_mtime_ns)
+        return _table
+
+
+def extract_keywords(text: str, top_k: int = 5) -> list[str]:
+    """TF-IDF keywords, fallback to jieba if the corpus is too small"""
+
+    table = get_idf_table()
+    if table is not None and table.documents >= MIN_DOCUMENTS:
+        return table.extract(text, top_k)
+
+    from jieba import analyse as jieba_analyse
+
+    return jieba_analyse.extract_tags(text, topK=top_k)
+
+
+def _corpus_models():
+    from api.models import Page, Post
+
+    return {"post": Post, "page": Page}
+
+
+def refresh_idf_table() -> bool:
+    """
+    tokenize the changed documents and rebuild the table.
+
+    :return: False if nothing changed and the table is up to date
+    """
+    from api.models import CorpusDocument
+    from api.text_chunking import TextNormalizer
+
+    existing = {
+        (source, object_id): (pk, content_hash)
+        for pk, source, object_id, content_hash in CorpusDocument.objects.values_list(
+            "pk", "source", "object_id", "content_hash"
+        )
+    }
+
+    changed = 0
+    with transaction.atomic():
+        for source, model in _corpus_models().items():
+            # compare the stored hashes, only load the content of the changed ones
+            changed_ids = []
+            for object_id, content_hash in model.objects.values_list(
+                "id", "content_hash"
+            ):
+                _, old_hash = existing.pop((source, object_id), (None, None))
+                if not content_hash or old_hash != content_hash:
+                    changed_ids.append(object_id)
+
+            rows = model.objects.filter(id__in=changed_ids).values_list("id", "content")
+            for object_id, content in rows.iterator():
+                terms = sorted(set(tokenize_terms(TextNormalizer.normalize(content))))
+                CorpusDocument.objects.update_or_create(
+                    source=source,
+                    object_id=object_id,
+                    defaults={
+                        "content_hash": calculate_blake3_hash(content),
+                        "terms": terms,
+                    },
+                )
+                changed += 1
+
+        # deleted documents
+        removed = [pk for pk, _ in existing.values()]
+        CorpusDocument.objects.filter(pk__in=removed).delete()
+        changed += len(removed)
+
+    table = IdfTable.load(settings.KEYWORD_IDF_DIR)
+    if not changed and table is not None:
+        return False
+
+    df: Counter[str] = Counter()
+    documents = 0
+    for terms in CorpusDocument.objects.values_list("terms", flat=True).iterator():
+        df.update(terms)
+        documents += 1
+
+    version = (table.version if table is not None else 0) + 1
+    write_idf_table(settings.KEYWORD_IDF_DIR, df, documents, version)
+    logger.info(
+        f"IDF table v{version}: {documents} documents, {len(df)} terms, "
+        f"{changed} changed"
+    )
+    return True
@@ -0,0 +1,126 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.content_analysis import analyze_content, render_review_html
+from api.models import Change, Gal, Post
+from api.response_cache import invalidate_post_responses, invalidate_response
+from api.sitemap import invalidate_sitemap
+from core.hash import calculate_blake3_hash
+
+
+def _render_post(content: str) -> tuple[str, str]:
+    analysis = analyze_content(content)
+    return analysis.html, analysis.content_hash
+
+
+def _render_review(review: str | None) -> tuple[str, str]:
+    return render_review_html(review), calculate_blake3_hash(review or "")
+
+
+def _invalidate_posts(ids: list[int]) -> None:
+    invalidate_post_responses(Post.objects.filter(pk__in=ids).values_list("pk", "slug"))
+
+
+def _invalidate_gals(ids: list[int]) -> None:
+    for gal_id in ids:
+        invalidate_response("gal", gal_id=gal_id)
+        # the `updated_at` of the gals is the lastmod of the sitemap
+        invalidate_sitemap(Gal, gal_id)
+
+
+# `bulk_update` sends no signals, the cached responses are deleted by `invalidate`
+# model -> (markdown field, html field, built-from-hash field, renderer, invalidate)
+TARGETS = {
+    "post": (
+        Post,
+        "content",
+        "content_html",
+        "content_html_hash",
+        _render_post,
+        _invalidate_posts,
+    ),
+    "gal": (
+        Gal,
+        "review",
+        "review_html",
+        "review_html_hash",
+        _render_review,
+        _invalidate_gals,
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = "Render the Markdown of the posts and gal reviews to HTML again."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="post, gal (all by default)",
+        )
+        parser.add_argument(
+            "--stale",
+            action="store_true",
+            help="only the rows whose HTML is not built from the current content",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="rows per UPDATE"
+        )
+
+    def handle(self, *args, **options):
+        names = options["models"] or list(TARGETS)
+        if unknown := set(names) - set(TARGETS):
+            raise CommandError(f"Unknown models: {', '.join(sorted(unknown))}")
+
+        for name in names:
+            updated = self._render(
+                *TARGETS[name], stale=options["stale"], batch_size=options["batch_size"]
+            )
+            self.stdout.write(self.style.SUCCESS(f"{name}: {updated} updated"))
+
+    @staticmethod
+    def _write(model, changed: list, fields: list[str], invalidate) -> int:
+        ids = [obj.pk for obj in changed]
+        with transaction.atomic():
+            updated = model.objects.bulk_update(changed, fields)
+            Change.record(model, ids, Change.Action.UPDATED)
+        # after the commit, a request before it would cache the old HTML again
+        invalidate(ids)
+        return updated
+
+    def _render(
+        self,
+        model,
+        source: str,
+        target: str,
+        marker: str,
+        render,
+        invalidate,
+        stale,
+        batch_size,
+    ) -> int:
+        fields = [target, marker, "updated_at"]
+        rows = model.objects.only("pk", source, *fields)
+        if stale:
+            rows = rows.exclude(**{marker: F("content_hash")})
+
+        # only write the rows whose HTML changed, e.g. after upgrading the renderer
+        changed = []
+        updated = 0
+        for obj in rows.iterator(chunk_size=batch_size):
+            html, content_hash = render(getattr(obj, source))
+            if html == getattr(obj, target) and content_hash == getattr(obj, marker):
+                continue
+            setattr(obj, target, html)
+            setattr(obj, marker, content_hash)
+            obj.updated_at = timezone.now()
+            changed.append(obj)
+            if len(changed) >= batch_size:
+                updated += self._write(model, changed, fields, invalidate)
+                changed = []
+        if changed:
+            updated += self._write(model, changed, fields, invalidate)
+        return updated
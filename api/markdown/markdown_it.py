@@ -1,15 +1,27 @@
 import json
+import logging
 import tomllib
+from collections import OrderedDict
+from threading import Lock
 from typing import Any
 
 import yaml
-from markdown_it_rs_py import FrontMatter, MarkdownIt
+from markdown_it_rs_py import Ast, FrontMatter, MarkdownIt
+
+from core.hash import calculate_blake3_hash
+
+logger = logging.getLogger(__name__)
 
 
 class Markdown:
     # rust render engine instance cache (it useless i think)
     _mds: dict[tuple, MarkdownIt] = {}
 
+    # rendered HTML by (options, content hash), see `render_cached`
+    HTML_CACHE_SIZE = 128
+    _html_cache: OrderedDict[tuple[tuple, str], str] = OrderedDict()
+    _html_cache_lock = Lock()
+
     def __init__(
         self,
         *,
@@ -54,20 +66,47 @@ class Markdown:
                 syntax_classed=syntax_classed,
             )
             self._mds[idx_key] = self.md
+        self.options = idx_key
 
     @staticmethod
     def _parse_frontmatter(frontmatter: FrontMatter) -> dict[str, Any]:
-        if frontmatter.kind == "yaml":
-            return yaml.safe_load(frontmatter.raw)
-        elif frontmatter.kind == "toml":
-            return tomllib.loads(frontmatter.raw)
-        else:
+        try:
+            if frontmatter.kind == "yaml":
+                data = yaml.safe_load(frontmatter.raw)
+            elif frontmatter.kind == "toml":
+                data = tomllib.loads(frontmatter.raw)
+            else:
+                data = None
+        except (yaml.YAMLError, tomllib.TOMLDecodeError) as e:
+            logger.warning(f"Invalid frontmatter: {e}")
             return {}
+        # empty or not a mapping (e.g. a single string)
+        return data if isinstance(data, dict) else {}
 
     def render(self, markdown: str) -> str:
         """markdown -> HTML"""
         return self.md.render(markdown)
 
+    def render_cached(self, markdown: str) -> str:
+        """the same as `render`, memoised by the options and the content hash"""
+        key = (self.options, calculate_blake3_hash(markdown))
+        cache = self._html_cache
+        with self._html_cache_lock:
+            if (html := cache.get(key)) is not None:
+                cache.move_to_end(key)
+                return html
+
+        html = self.render(markdown)
+        with self._html_cache_lock:
+            cache[key] = html
+            while len(cache) > self.HTML_CACHE_SIZE:
+                cache.popitem(last=False)
+        return html
+
+    def parse(self, markdown: str) -> Ast:
+        """markdown -> syntax tree, the frontmatter is not in the tree"""
+        return self.md.parse(markdown)
+
     def frontmatter(self, markdown: str) -> dict[str, Any]:
         """extract frontmatter"""
         frontmatter = self.md.parse_frontmatter(markdown)
@@ -0,0 +1,110 @@
+# Generated by Django 6.0.5 on 2026-10-19 10:12
+
+import pgvector.django.vector
+from django.conf import settings
+from django.db import migrations, models
+
+from core.hash import calculate_blake3_hash
+
+
+def _configured_embedding_model():
+    # same as `api.ml_model.get_embedding_model_name`, migrations should be frozen
+    if settings.USE_REMOTE_EMBEDDING:
+        return f"remote:{settings.REMOTE_EMBEDDING_MODEL_NAME}"
+    return f"local:{settings.MODEL_NAME}"
+
+
+def tag_existing_chunks(apps, schema_editor):
+    PostChunk = apps.get_model("api", "PostChunk")
+    EmbeddingIndex = apps.get_model("api", "EmbeddingIndex")
+
+    if not PostChunk.objects.exists():
+        return
+
+    # all the existing vectors are generated by the configured model
+    embedding_model = _configured_embedding_model()
+    PostChunk.objects.update(embedding_model=embedding_model)
+    EmbeddingIndex.objects.create(
+        embedding_model=embedding_model, dimensions=768, status="serving"
+    )
+
+    # rebuild the dropped HNSW index as the partial index of the model,
+    # same as `api.embedding_index.create_vector_index`
+    index_name = f"post_chunk_emb_{calculate_blake3_hash(embedding_model)[:16]}_idx"
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {schema_editor.quote_name(index_name)} "
+        f"ON {schema_editor.quote_name(PostChunk._meta.db_table)} USING hnsw "
+        f"((embedding::vector(768)) vector_cosine_ops) "
+        f"WITH (m = 32, ef_construction = 256) "
+        f"WHERE embedding_model = %s",
+        params=[embedding_model],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0049_remove_image_resource_remove_image_uploaded_by_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingIndex",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("embedding_model", models.CharField(max_length=200, unique=True)),
+                ("dimensions", models.PositiveIntegerField(blank=True, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("building", "构建中"),
+                            ("ready", "已就绪"),
+                            ("serving", "服务中"),
+                            ("retired", "已停用"),
+                        ],
+                        default="building",
+                        max_length=20,
+                    ),
+                ),
+                ("activated_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "abstract": False,
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("status", "serving")),
+                        fields=("status",),
+                        name="unique_serving_embedding_index",
+                    )
+                ],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name="postchunk",
+            name="post_chunk_embedding_idx",
+        ),
+        migrations.AlterField(
+            model_name="postchunk",
+            name="embedding",
+            field=pgvector.django.vector.VectorField(),
+        ),
+        migrations.AddField(
+            model_name="postchunk",
+            name="embedding_model",
+            field=models.CharField(db_index=True, default="", max_length=200),
+            preserve_default=False,
+        ),
+        migrations.RunPython(tag_existing_chunks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.5 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0050_embeddingindex_postchunk_embedding_model"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="postchunk",
+            name="heading_path",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
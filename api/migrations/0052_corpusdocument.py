@@ -0,0 +1,46 @@
+# Generated by Django 6.0.5 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0051_postchunk_heading_path"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CorpusDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[("post", "文章"), ("page", "页面")], max_length=20
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                ("content_hash", models.CharField(max_length=64)),
+                ("terms", models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                "abstract": False,
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("source", "object_id"), name="unique_corpus_document"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.5 on 2026-10-19 12:20
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_search_vectors_stale(apps, schema_editor):
+    # the old vectors are not weighted, rebuild them by
+    # `api.tasks.reindex_stale_search_vectors_task`
+    Post = apps.get_model("api", "Post")
+    Post.objects.update(search_version=F("search_version") + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0052_corpusdocument"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="search_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="search_indexed_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_search_vectors_stale, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 6.0.5 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+from core.hash import calculate_blake3_hash
+
+
+def fill_content_hash(apps, schema_editor):
+    # the derived fields are left empty, they are rebuilt on the next save
+    for model_name, field in (
+        ("Post", "content"),
+        ("Page", "content"),
+        ("Gal", "review"),
+    ):
+        model = apps.get_model("api", model_name)
+        rows = list(model.objects.only("pk", field))
+        for row in rows:
+            row.content_hash = calculate_blake3_hash(getattr(row, field) or "")
+        model.objects.bulk_update(rows, ["content_hash"], batch_size=100)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0053_post_search_version_post_search_indexed_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gal",
+            name="content_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="gal",
+            name="review_html_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="page",
+            name="content_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="content_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="content_html_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="search_content_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="postchunk",
+            name="post_content_hash",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.5 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0054_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["-order", "-created_at", "-id"], name="api_post_keyset_idx"
+            ),
+        ),
+    ]
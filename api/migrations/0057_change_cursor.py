@@ -0,0 +1,37 @@
+# Generated by Django 6.0.5 on 2026-10-19 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0056_change"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="change",
+            name="cursor",
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+        # the cursors of the existing changes are their ids, the clients keep
+        # following from the same place
+        migrations.RunSQL(
+            sql=[
+                "CREATE SEQUENCE api_change_cursor_seq;",
+                "UPDATE api_change SET cursor = id;",
+                "SELECT setval('api_change_cursor_seq', COALESCE(MAX(id), 0) + 1, false) "
+                "FROM api_change;",
+            ],
+            reverse_sql="DROP SEQUENCE IF EXISTS api_change_cursor_seq;",
+        ),
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(
+                condition=models.Q(("cursor__isnull", True)),
+                fields=["id"],
+                name="api_change_uncursored_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.5 on 2026-10-19 05:12
+
+from django.db import migrations
+from django.utils import timezone
+
+REINDEX_TASK_NAME = "Reindex stale search vectors"
+
+
+def schedule_reindex(apps, schema_editor):
+    # the posts marked stale by 0053 (and the saves missed by a down worker)
+    # are rebuilt by the beat, not only by the next save of each post
+    IntervalSchedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    interval, _ = IntervalSchedule.objects.get_or_create(every=10, period="minutes")
+    PeriodicTask.objects.get_or_create(
+        name=REINDEX_TASK_NAME,
+        defaults={
+            "task": "api.tasks.reindex_stale_search_vectors_task",
+            "interval": interval,
+        },
+    )
+    # the signals of the real models are not sent, tell the running beat
+    PeriodicTasks.objects.update_or_create(
+        ident=1, defaults={"last_update": timezone.now()}
+    )
+
+
+def unschedule_reindex(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(name=REINDEX_TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0057_change_cursor"),
+        ("django_celery_beat", "0018_improve_crontab_helptext"),
+    ]
+
+    operations = [
+        migrations.RunPython(schedule_reindex, unschedule_reindex),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.5 on 2026-10-19 05:40
+
+from django.db import migrations
+from django.utils import timezone
+
+PRUNE_TASK_NAME = "Prune changes feed"
+
+
+def schedule_prune(apps, schema_editor):
+    # the `Change` log is kept for `CHANGES_RETENTION`, see 'api/tasks.py'
+    IntervalSchedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    interval, _ = IntervalSchedule.objects.get_or_create(every=1, period="days")
+    PeriodicTask.objects.get_or_create(
+        name=PRUNE_TASK_NAME,
+        defaults={"task": "api.tasks.prune_changes_task", "interval": interval},
+    )
+    # the signals of the real models are not sent, tell the running beat
+    PeriodicTasks.objects.update_or_create(
+        ident=1, defaults={"last_update": timezone.now()}
+    )
+
+
+def unschedule_prune(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(name=PRUNE_TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0058_schedule_reindex_search_vectors"),
+    ]
+
+    operations = [
+        migrations.RunPython(schedule_prune, unschedule_prune),
+    ]
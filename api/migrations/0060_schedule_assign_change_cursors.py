@@ -0,0 +1,40 @@
+# Generated by Django 6.0.5 on 2026-10-19 09:20
+
+from django.db import migrations
+from django.utils import timezone
+
+ASSIGN_TASK_NAME = "Assign changes feed cursors"
+
+
+def schedule_assign(apps, schema_editor):
+    # the cursors are assigned after the commit of the write, the beat numbers
+    # the changes of a process killed before, see `Change.assign_cursors`
+    IntervalSchedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    interval, _ = IntervalSchedule.objects.get_or_create(every=1, period="minutes")
+    PeriodicTask.objects.get_or_create(
+        name=ASSIGN_TASK_NAME,
+        defaults={"task": "api.tasks.assign_change_cursors_task", "interval": interval},
+    )
+    # the signals of the real models are not sent, tell the running beat
+    PeriodicTasks.objects.update_or_create(
+        ident=1, defaults={"last_update": timezone.now()}
+    )
+
+
+def unschedule_assign(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(name=ASSIGN_TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0059_schedule_prune_changes"),
+    ]
+
+    operations = [
+        migrations.RunPython(schedule_assign, unschedule_assign),
+    ]
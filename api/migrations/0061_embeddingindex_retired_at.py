@@ -0,0 +1,27 @@
+# Generated by Django 6.0.5 on 2026-10-19 04:20
+
+from django.db import migrations, models
+
+
+def backfill_retired_at(apps, schema_editor):
+    # the status was the last change of the retired indexes
+    EmbeddingIndex = apps.get_model("api", "EmbeddingIndex")
+    EmbeddingIndex.objects.filter(status="retired").update(
+        retired_at=models.F("updated_at")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0060_schedule_assign_change_cursors"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="embeddingindex",
+            name="retired_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_retired_at, migrations.RunPython.noop),
+    ]
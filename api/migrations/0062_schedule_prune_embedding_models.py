@@ -0,0 +1,43 @@
+# Generated by Django 6.0.5 on 2026-10-19 04:24
+
+from django.db import migrations
+from django.utils import timezone
+
+PRUNE_TASK_NAME = "Prune retired embedding models"
+
+
+def schedule_prune(apps, schema_editor):
+    # the retired vectors are kept for `PRUNE_EMBEDDING_DELAY`, see 'api/tasks.py'
+    IntervalSchedule = apps.get_model("django_celery_beat", "IntervalSchedule")
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTasks = apps.get_model("django_celery_beat", "PeriodicTasks")
+
+    interval, _ = IntervalSchedule.objects.get_or_create(every=1, period="hours")
+    PeriodicTask.objects.get_or_create(
+        name=PRUNE_TASK_NAME,
+        defaults={
+            "task": "api.tasks.prune_embedding_models_task",
+            "interval": interval,
+        },
+    )
+    # the signals of the real models are not sent, tell the running beat
+    PeriodicTasks.objects.update_or_create(
+        ident=1, defaults={"last_update": timezone.now()}
+    )
+
+
+def unschedule_prune(apps, schema_editor):
+    PeriodicTask = apps.get_model("django_celery_beat", "PeriodicTask")
+    PeriodicTask.objects.filter(name=PRUNE_TASK_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0061_embeddingindex_retired_at"),
+        ("django_celery_beat", "0018_improve_crontab_helptext"),
+    ]
+
+    operations = [
+        migrations.RunPython(schedule_prune, unschedule_prune),
+    ]
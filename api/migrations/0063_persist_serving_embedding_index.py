@@ -0,0 +1,34 @@
+# Generated by Django 6.0.5 on 2026-10-19 04:31
+
+from django.conf import settings
+from django.db import migrations
+
+
+def _configured_embedding_model():
+    # same as `api.ml_model.get_embedding_model_name`, migrations should be frozen
+    if settings.USE_REMOTE_EMBEDDING:
+        return f"remote:{settings.REMOTE_EMBEDDING_MODEL_NAME}"
+    return f"local:{settings.MODEL_NAME}"
+
+
+def persist_serving_index(apps, schema_editor):
+    # 0050 only created it for the existing chunks, the search read the
+    # configured model without it and a changed model name switched the search
+    EmbeddingIndex = apps.get_model("api", "EmbeddingIndex")
+    if EmbeddingIndex.objects.filter(status="serving").exists():
+        return
+    EmbeddingIndex.objects.update_or_create(
+        embedding_model=_configured_embedding_model(),
+        defaults={"status": "serving"},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0062_schedule_prune_embedding_models"),
+    ]
+
+    operations = [
+        migrations.RunPython(persist_serving_index, migrations.RunPython.noop),
+    ]
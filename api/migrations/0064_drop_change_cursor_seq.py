@@ -0,0 +1,23 @@
+# Generated by Django 6.0.5 on 2026-10-19 04:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0063_persist_serving_embedding_index"),
+    ]
+
+    operations = [
+        # `Change.assign_cursors` numbers after the largest cursor, a sequence
+        # left gaps which expired the cursors before them
+        migrations.RunSQL(
+            sql="DROP SEQUENCE IF EXISTS api_change_cursor_seq;",
+            reverse_sql=[
+                "CREATE SEQUENCE api_change_cursor_seq;",
+                "SELECT setval('api_change_cursor_seq', COALESCE(MAX(cursor), 0) + 1, "
+                "false) FROM api_change;",
+            ],
+        ),
+    ]
@@ -8,16 +8,52 @@ from django.conf import settings
 if TYPE_CHECKING:
     from httpx import AsyncClient, Client
     from sentence_transformers import SentenceTransformer
+    from transformers import PreTrainedTokenizerFast
 
 __all__ = [
     "EmbeddingProvider",
+    "FastTokenizer",
     "LocalEmbedding",
     "RemoteEmbedding",
+    "get_embedding_model_name",
     "get_ml_model",
 ]
 
+LOCAL_MODEL_PREFIX = "local:"
+REMOTE_MODEL_PREFIX = "remote:"
+
+
+class FastTokenizer:
+    """count and split text with a huggingface fast tokenizer (Rust)"""
+
+    def __init__(self, tokenizer: PreTrainedTokenizerFast, max_tokens: int):
+        self.tokenizer = tokenizer
+        # the special tokens (e.g. <bos>) also use the context window
+        self.max_tokens = max_tokens - tokenizer.num_special_tokens_to_add()
+
+    def count(self, texts: list[str]) -> list[int]:
+        encoded = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    def split(self, text: str, max_tokens: int) -> list[str]:
+        offsets = self.tokenizer(
+            text, add_special_tokens=False, return_offsets_mapping=True
+        )["offset_mapping"]
+        # cut at the token boundaries
+        starts = [offsets[i][0] for i in range(0, len(offsets), max_tokens)]
+        return [text[start:end] for start, end in zip(starts, [*starts[1:], None])]
+
 
 class EmbeddingProvider(ABC):
+    # identify which model produced a vector, e.g. "local:google/embeddinggemma-300m"
+    model_name: str
+
+    @property
+    @abstractmethod
+    def embedding_model(self) -> str: ...
+    @abstractmethod
+    def get_tokenizer(self) -> FastTokenizer: ...
+
     @abstractmethod
     def embed_documents(self, texts: list[str]) -> list[list[float]]: ...
     @abstractmethod
@@ -49,18 +85,36 @@ class LocalEmbedding(EmbeddingProvider):
     def __new__(cls, *args, **kwargs):
         with cls._lock:
             if cls._instance is None:
-                from sentence_transformers import SentenceTransformer
-
                 cls._instance = super(LocalEmbedding, cls).__new__(cls, *args, **kwargs)
-                # NOTE: this will block event loop in async. MUST warnup
-                cls._instance.model = SentenceTransformer(
-                    settings.MODEL_NAME,
-                    cache_folder=settings.SENTENCE_TRANSFORMERS_HOME,
-                    local_files_only=True,
-                )
+                cls._instance._load(settings.MODEL_NAME)
 
         return cls._instance
 
+    @classmethod
+    def for_model(cls, model_name: str) -> "LocalEmbedding":
+        """an instance which not share the singleton, used by the shadow index"""
+        instance = super(LocalEmbedding, cls).__new__(cls)
+        instance._load(model_name)
+        return instance
+
+    def _load(self, model_name: str) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        # NOTE: this will block event loop in async. MUST warnup
+        self.model = SentenceTransformer(
+            model_name,
+            cache_folder=settings.SENTENCE_TRANSFORMERS_HOME,
+            local_files_only=True,
+        )
+
+    @property
+    def embedding_model(self) -> str:
+        return f"{LOCAL_MODEL_PREFIX}{self.model_name}"
+
+    def get_tokenizer(self) -> FastTokenizer:
+        return FastTokenizer(self.model.tokenizer, self.model.max_seq_length)
+
     def embed_query(self, text: str) -> list[float]:
         self._validate_query_text(text)
         embedding: Any = self.model.encode_query(text)
@@ -104,12 +158,46 @@ class RemoteEmbedding(EmbeddingProvider):
         self.api_base = settings.REMOTE_EMBEDDING_API_BASE
         self.api_key = settings.REMOTE_EMBEDDING_API_KEY
         self.model_name = settings.REMOTE_EMBEDDING_MODEL_NAME
+        self.tokenizer_name = settings.REMOTE_EMBEDDING_TOKENIZER
         self.client: Client | None = None
         self.aclient: AsyncClient | None = None
+        self.tokenizer: FastTokenizer | None = None
 
         # mark as inited
         self._initialized = True
 
+    @classmethod
+    def for_model(cls, model_name: str) -> "RemoteEmbedding":
+        """an instance which not share the singleton, used by the shadow index"""
+        instance = super(RemoteEmbedding, cls).__new__(cls)
+        instance.__init__()
+        instance.model_name = model_name
+        # the configured tokenizer is of the configured model, the other
+        # models are tokenized by their own files (same name on the hub)
+        if model_name != settings.REMOTE_EMBEDDING_MODEL_NAME:
+            instance.tokenizer_name = model_name
+        return instance
+
+    @property
+    def embedding_model(self) -> str:
+        return f"{REMOTE_MODEL_PREFIX}{self.model_name}"
+
+    def get_tokenizer(self) -> FastTokenizer:
+        """the remote API can't tokenize, load the tokenizer files locally"""
+        if self.tokenizer is None:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(
+                self.tokenizer_name,
+                cache_dir=settings.SENTENCE_TRANSFORMERS_HOME,
+                local_files_only=True,
+                use_fast=True,
+            )
+            self.tokenizer = FastTokenizer(
+                tokenizer, settings.REMOTE_EMBEDDING_MAX_TOKENS
+            )
+        return self.tokenizer
+
     def embed_query(self, text: str) -> list[float]:
         self._validate_query_text(text)
         response = self._get_client().post(
@@ -205,10 +293,48 @@ class RemoteEmbedding(EmbeddingProvider):
         return self.aclient
 
 
-def get_ml_model() -> EmbeddingProvider:
+# providers of the models which are not configured in settings
+_other_models: dict[str, EmbeddingProvider] = {}
+_other_models_lock = Lock()
+
+
+def get_embedding_model_name() -> str:
+    """the configured embedding model, without loading it"""
     if settings.USE_REMOTE_EMBEDDING:
-        return RemoteEmbedding()
-    return LocalEmbedding()
+        return f"{REMOTE_MODEL_PREFIX}{settings.REMOTE_EMBEDDING_MODEL_NAME}"
+    return f"{LOCAL_MODEL_PREFIX}{settings.MODEL_NAME}"
+
+
+def get_ml_model(embedding_model: str | None = None) -> EmbeddingProvider:
+    """
+    get the embedding provider.
+
+    :param embedding_model: tagged model name (see `get_embedding_model_name`),
+        use the configured model by default. Other models are needed while
+        the search is still served by the old model during a migration.
+    """
+    if embedding_model is None or embedding_model == get_embedding_model_name():
+        if settings.USE_REMOTE_EMBEDDING:
+            return RemoteEmbedding()
+        return LocalEmbedding()
+
+    with _other_models_lock:
+        if provider := _other_models.get(embedding_model):
+            return provider
+
+        if embedding_model.startswith(REMOTE_MODEL_PREFIX):
+            provider = RemoteEmbedding.for_model(
+                embedding_model.removeprefix(REMOTE_MODEL_PREFIX)
+            )
+        elif embedding_model.startswith(LOCAL_MODEL_PREFIX):
+            provider = LocalEmbedding.for_model(
+                embedding_model.removeprefix(LOCAL_MODEL_PREFIX)
+            )
+        else:
+            raise ValueError(f"Unknown embedding model: {embedding_model}")
+
+        _other_models[embedding_model] = provider
+        return provider
 
 
 if __name__ == "__main__":
@@ -1,7 +1,10 @@
 from .anime import Anime
 from .base import BaseModel
 from .category import Category
+from .change import Change
 from .comment import Comment
+from .corpus import CorpusDocument
+from .embedding import EmbeddingIndex
 from .gal import Gal
 from .guest import Guest
 from .page import Page
@@ -14,12 +17,15 @@ __all__ = [
     # post
     "Post",
     "PostChunk",
+    "EmbeddingIndex",
     # category
     "Category",
     # tag
     "Tag",
     # comment
     "Comment",
+    # keyword
+    "CorpusDocument",
     # guest
     "Guest",
     # page
@@ -28,4 +34,6 @@ __all__ = [
     "Anime",
     # gal
     "Gal",
+    # changes feed
+    "Change",
 ]
@@ -0,0 +1,82 @@
+from collections.abc import Iterable
+
+from django.db import connection, models, transaction
+
+# `pg_advisory_xact_lock` key of `Change.assign_cursors`
+CURSOR_LOCK_ID = 0x6368616E6765  # "change"
+
+
+class Change(models.Model):
+    """
+    Append-only log of the created, updated and deleted objects, the `cursor`
+    is the position in the changes feed (see 'api/routers/change.py').
+
+    Written by the save and delete signals in the transaction of the write, a
+    rollback drops the change too. The cursors are assigned after the commit of
+    the write, and by `assign_change_cursors_task` if the process died before.
+    """
+
+    class Action(models.TextChoices):
+        CREATED = "created"
+        UPDATED = "updated"
+        DELETED = "deleted"
+
+    id = models.BigAutoField(primary_key=True)
+    # the lowercase model name, e.g. "post"
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=Action.choices)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # assigned after the commit by `assign_cursors`, in the order of the commits,
+    # the `id` is taken at the insert and a smaller one may commit later
+    cursor = models.BigIntegerField(null=True, unique=True, editable=False)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(cursor__isnull=True),
+                name="api_change_uncursored_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} {self.action}"
+
+    @classmethod
+    def record(
+        cls, model: type[models.Model], object_ids: Iterable[int], action: str
+    ) -> None:
+        cls.objects.bulk_create(
+            cls(model=model._meta.model_name, object_id=object_id, action=action)
+            for object_id in object_ids
+        )
+        # a failed numbering is retried by the beat, the write is committed
+        transaction.on_commit(cls.assign_cursors, robust=True)
+
+    @classmethod
+    def assign_cursors(cls) -> None:
+        """
+        number the committed changes without a cursor.
+
+        Only one transaction numbers them at a time (holding the lock until the
+        commit), so a visible cursor is never followed by a smaller one
+        committed later. Waits for the one numbering them now, the changes
+        committed after its snapshot are numbered here.
+
+        Numbered after the largest cursor, not by a sequence, a rollback leaves
+        no gap: the feed expires a cursor by the one before the oldest kept.
+        """
+
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [CURSOR_LOCK_ID])
+            cursor.execute(
+                f"UPDATE {table} SET cursor = numbered.cursor "
+                f"FROM (SELECT id, "
+                f"(SELECT COALESCE(MAX(cursor), 0) FROM {table}) "
+                f"+ row_number() OVER (ORDER BY id) AS cursor "
+                f"FROM {table} WHERE cursor IS NULL) AS numbered "
+                f"WHERE {table}.id = numbered.id"
+            )
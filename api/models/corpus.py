@@ -0,0 +1,28 @@
+from django.db import models
+
+from .base import BaseModel
+
+
+class CorpusDocument(BaseModel):
+    """
+    The terms of a post or page, used to count the document frequency of the
+    keyword IDF table (see 'api/keywords.py').
+    """
+
+    source = models.CharField(
+        max_length=20, choices=[("post", "文章"), ("page", "页面")]
+    )
+    object_id = models.BigIntegerField()
+    # skip tokenizing if the content not changed
+    content_hash = models.CharField(max_length=64)
+    terms = models.JSONField(default=list, blank=True)
+
+    class Meta(BaseModel.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "object_id"], name="unique_corpus_document"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.source}:{self.object_id}"
@@ -0,0 +1,42 @@
+from django.db import models
+
+from .base import BaseModel
+
+
+class EmbeddingIndex(BaseModel):
+    """
+    State of the chunk embeddings generated by one model.
+
+    Only one index is serving the search at the same time, the others are
+    building in the background (shadow index) or waiting to be cleaned up.
+    """
+
+    embedding_model = models.CharField(max_length=200, unique=True)
+    dimensions = models.PositiveIntegerField(null=True, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ("building", "构建中"),
+            ("ready", "已就绪"),
+            ("serving", "服务中"),
+            ("retired", "已停用"),
+        ],
+        default="building",
+    )
+    activated_at = models.DateTimeField(null=True, blank=True)
+    # the vectors are pruned `PRUNE_EMBEDDING_DELAY` after it (see 'api/tasks.py')
+    retired_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(BaseModel.Meta):
+        ordering = ["-created_at"]
+        constraints = [
+            # the cutover must be atomic, never two serving indexes
+            models.UniqueConstraint(
+                fields=["status"],
+                condition=models.Q(status="serving"),
+                name="unique_serving_embedding_index",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.embedding_model} ({self.status})"
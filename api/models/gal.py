@@ -1,5 +1,8 @@
 from django.db import models
 
+from api.content_analysis import render_review_html
+from core.hash import calculate_blake3_hash
+
 from .base import BaseModel
 
 
@@ -22,6 +25,9 @@ class Gal(BaseModel):
     )  # No spoilers
     review = models.TextField(blank=True, null=True)
     review_html = models.TextField(blank=True, null=True)
+    # blake3 of `review`, and the one `review_html` is built from
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    review_html_hash = models.CharField(max_length=64, blank=True, editable=False)
 
     cover_image = models.URLField(
         max_length=500, blank=True, null=True, help_text="(暂时没用)"
@@ -31,4 +37,18 @@ class Gal(BaseModel):
         return self.vndb_id
 
     def save(self, *args, **kwargs) -> None:
+        # render only if the review changed, written by this save
+        self.content_hash = calculate_blake3_hash(self.review or "")
+        if self.review_html_hash != self.content_hash:
+            self.review_html = render_review_html(self.review)
+            self.review_html_hash = self.content_hash
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "review" in update_fields:
+            kwargs["update_fields"] = {
+                *update_fields,
+                "content_hash",
+                "review_html",
+                "review_html_hash",
+            }
         return super().save(*args, **kwargs)
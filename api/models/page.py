@@ -2,6 +2,7 @@ from django.db import models
 from django.utils.text import Truncator, slugify
 
 from api.utils import extract_metadata
+from core.hash import calculate_blake3_hash
 
 from .base import BaseModel
 from .category import Category
@@ -12,6 +13,8 @@ class Page(BaseModel):
     # 基础信息
     title = models.CharField(max_length=50)
     content = models.TextField()
+    # blake3 of `content`, e.g. the keyword IDF table skips the unchanged pages
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
 
     # 渲染后的内容
     content_html = models.TextField(null=True, blank=True)
@@ -88,4 +91,9 @@ class Page(BaseModel):
         if not self.keywords:
             self.keywords = extract_metadata(self.content).get("keywords")
 
+        self.content_hash = calculate_blake3_hash(self.content)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "content" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "content_hash"}
+
         return super().save(*args, **kwargs)
@@ -1,17 +1,72 @@
+from collections.abc import Iterable
+
 from django.contrib.postgres.indexes import GinIndex
-from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
-from pgvector.django import HnswIndex, VectorField
+from django.utils import timezone
+from pgvector.django import VectorField
 
 from api.constants import POST_RESERVED_SLUGS
-from api.utils import chinese_slugify, extract_metadata
+from api.content_analysis import analyze_content
+from api.utils import chinese_slugify
+from core.hash import calculate_blake3_hash
 
 from .base import BaseModel
 from .category import Category
 from .tag import Tag
 
 
+class PostQuerySet(models.QuerySet):
+    # the columns of `PostCardSchema` and the ordering (cursor pagination),
+    # no content, HTML or search columns
+    CARD_FIELDS = (
+        "id",
+        "order",
+        "title",
+        "slug",
+        "meta_description",
+        "cover_image",
+        "created_at",
+        "updated_at",
+        "content_update_at",
+        "category__id",
+        "category__name",
+    )
+
+    def cards(self):
+        """the posts for listing, only the card columns are loaded"""
+        return (
+            self.select_related("category")
+            .only(*self.CARD_FIELDS)
+            .prefetch_related(
+                models.Prefetch("tags", queryset=Tag.objects.only("id", "name"))
+            )
+        )
+
+    def project(self, fields: Iterable[str], *required: str):
+        """
+        only load the columns of the fields (of a sparse fieldset), the
+        relations are joined or prefetched only if they are requested
+
+        :param required: the columns always loaded, e.g. the ordering
+        """
+        queryset, columns = self, {"id", *required}
+        for name in fields:
+            field = self.model._meta.get_field(name)
+            if field.many_to_many:
+                related = field.related_model.objects.only("id", "name")
+                queryset = queryset.prefetch_related(
+                    models.Prefetch(name, queryset=related)
+                )
+            elif field.is_relation:
+                queryset = queryset.select_related(name)
+                columns.update((f"{name}__id", f"{name}__name"))
+            else:
+                columns.add(name)
+        return queryset.only(*columns)
+
+
 class Post(BaseModel):
     # 基础信息
     title = models.CharField(
@@ -19,8 +74,12 @@ class Post(BaseModel):
     )
     content = models.TextField(blank=False, null=False, help_text="文章正文, 必填")
 
+    # blake3 of `content`, the derived fields record the hash they were built from
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+
     # 渲染后的内容
     content_html = models.TextField(null=True, blank=True, help_text="自动生成")
+    content_html_hash = models.CharField(max_length=64, blank=True, editable=False)
 
     # 图片相关
     cover_image = models.URLField(
@@ -85,29 +144,108 @@ class Post(BaseModel):
     # 向量化搜索已迁移至 PostChunk
     # embedding = VectorField(dimensions=768, null=True, blank=True)
 
-    # PG full-text search
+    # PG full-text search, built in background, see 'api/search_index.py'
     pg_gin_search_vector = SearchVectorField(null=True, blank=True)
     tokenized_content = models.TextField(blank=True, null=True)
-
-    # update in 'api/signals.py'
+    # `tokenized_content` is built from
+    search_content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    # increased on every save of the search fields, the vector is stale while
+    # `search_indexed_version` is behind
+    search_version = models.PositiveIntegerField(default=0)
+    search_indexed_version = models.PositiveIntegerField(default=0)
+
+    # update in `Post.save`
     content_update_at = models.DateTimeField(
         null=False, blank=True, help_text="文章正文最后更新时间"
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta(BaseModel.Meta):
         ordering = ["-order", "-created_at"]
         indexes = [
             GinIndex(fields=["pg_gin_search_vector"]),
+            # the ordering of the listing, for the keyset pagination
+            models.Index(
+                fields=["-order", "-created_at", "-id"], name="api_post_keyset_idx"
+            ),
+        ]
+
+    # the fields which the search vector is built from (and the tags)
+    SEARCH_FIELDS = frozenset(["title", "content", "keywords"])
+    # written only by the search task, the save of a post loaded before the
+    # task finished must not revert them
+    SEARCH_INDEX_FIELDS = frozenset(
+        [
+            "pg_gin_search_vector",
+            "tokenized_content",
+            "search_content_hash",
+            "search_indexed_version",
         ]
+    )
+    # compared with the loaded values to find the changed fields on save,
+    # the content is compared by the hash, the large text is not kept
+    TRACKED_FIELDS = frozenset(["title", "slug", "keywords", "content_hash"])
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # only a reference of the loaded value, no copy and no more query
+        instance._loaded_values = {
+            name: value
+            for name, value in zip(field_names, values, strict=True)
+            if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        self._remember_loaded_values(
+            self.TRACKED_FIELDS if fields is None else set(fields)
+        )
+
+    def _remember_loaded_values(self, fields):
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        for name in self.TRACKED_FIELDS.intersection(fields):
+            if name in self.__dict__:
+                loaded[name] = self.__dict__[name]
+
+    def get_loaded_value(self, name: str):
+        """the value of a tracked field when it was loaded, until the save returns"""
+        return getattr(self, "_loaded_values", {}).get(name)
+
+    def get_dirty_fields(self) -> set[str]:
+        """the tracked fields which changed after loading (all of them if new)"""
+        if self._state.adding:
+            # the content is tracked by its hash, which is not set yet
+            return {"content", *self.TRACKED_FIELDS}
+
+        loaded = getattr(self, "_loaded_values", {})
+        dirty = set()
+        for name in ("title", "slug", "keywords"):
+            if name in loaded:
+                if getattr(self, name) != loaded[name]:
+                    dirty.add(name)
+            # deferred when loading, treat it as changed if it's set
+            elif name in self.__dict__:
+                dirty.add(name)
+
+        if "content" in self.__dict__ and (
+            calculate_blake3_hash(self.content) != loaded.get("content_hash")
+        ):
+            dirty.add("content")
+        return dirty
+
     # rewrite save action
     # called after adminFrom (at `./admin.py`)
     @transaction.atomic  # keep atomic, all success or all failures
     def save(self, *args, **kwargs):
-        post_metadata = extract_metadata(self.content)
+        # parsed once, shared with the admin form, signals and tasks
+        analysis = analyze_content(self.content)
+        post_metadata = analysis.metadata()
 
         # === title ===
         if not self.title:
@@ -143,10 +281,41 @@ class Post(BaseModel):
             category, created = Category.objects.get_or_create(name=category)
             self.category = category
 
-        # === tokenize (PG FTS) ===
-        import jieba
-
-        self.tokenized_content = " ".join(jieba.lcut(self.content, cut_all=True))
+        # === derived fields ===
+        # computed here and written by the single save below, no signal saves again
+        dirty_fields = self.get_dirty_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            dirty_fields &= set(update_fields)
+        derived_fields = set()
+
+        content_changed = "content" in dirty_fields
+        if content_changed:
+            self.content_hash = analysis.content_hash
+            derived_fields.add("content_hash")
+        if content_changed or self.content_update_at is None:
+            self.content_update_at = timezone.now()
+            derived_fields.add("content_update_at")
+        if self.content_html_hash != self.content_hash:
+            self.content_html = analysis.html
+            self.content_html_hash = self.content_hash
+            derived_fields |= {"content_html", "content_html_hash"}
+
+        # === PG FTS ===
+        # the vector is built by the task, see 'api/search_index.py'
+        if dirty_fields & self.SEARCH_FIELDS:
+            self.search_version += 1
+            derived_fields.add("search_version")
+
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, *derived_fields}
+        elif not self._state.adding and not kwargs.get("force_insert"):
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = {
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+            } - self.SEARCH_INDEX_FIELDS
 
         # === vector ===
         # Moved to Celery task (see api/tasks.py: generate_post_embedding)
@@ -154,44 +323,47 @@ class Post(BaseModel):
 
         # save main object, all settings above will be saved
         # after that, continue to process operations that require primary keys
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        self._remember_loaded_values(self.TRACKED_FIELDS)
 
         # === tags ===
         # NOTE: This logic is already handled in PostAdminForm.clean()
         # However, it's kept here to support non-Admin post creation (e.g. scripts, API)
-        # This is safe as it checks `if not self.tags.exists()` before processing
-        if not self.tags.exists():  # must use `.exists()` to check it
-            tags_to_set = []
-            tag_list = post_metadata["tags"]
-            for tag_name in tag_list:
-                tag_obj, created = Tag.objects.get_or_create(name=tag_name)
-                tags_to_set.append(tag_obj)
-            self.tags.set(tags_to_set)
-
-        # === Full-text search ===
-        # generate PG full-text search vector
-        Post.objects.filter(pk=self.pk).update(
-            pg_gin_search_vector=SearchVector(
-                "title",
-                "tokenized_content",
-                config="simple",
+        # filled from the front matter whenever the post has no tags
+        tag_names = post_metadata["tags"]
+        if tag_names and adding:
+            # the search version is increased above, skip the `m2m_changed` signal
+            Post.tags.through.objects.bulk_create(
+                Post.tags.through(post_id=self.pk, tag_id=tag.pk)
+                for tag in _get_or_create_tags(tag_names)
             )
+        elif tag_names and not self.tags.exists():
+            # e.g. the tags are cleared, the signal reindexes the post
+            self.tags.add(*_get_or_create_tags(tag_names))
+
+
+def _get_or_create_tags(names: list[str]) -> list[Tag]:
+    """bulk `Tag.objects.get_or_create`, at most 3 queries"""
+    tags = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+    if missing := [name for name in dict.fromkeys(names) if name not in tags]:
+        Tag.objects.bulk_create(
+            [Tag(name=name) for name in missing], ignore_conflicts=True
         )
+        tags.update({tag.name: tag for tag in Tag.objects.filter(name__in=missing)})
+    return [tags[name] for name in dict.fromkeys(names) if name in tags]
 
 
 class PostChunk(BaseModel):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="chunks")
     content = models.TextField()
-    embedding = VectorField(dimensions=768)
+    # no fixed dimensions, vectors of different models live together during a
+    # model migration. HNSW indexes are partial per model, see 'api/embedding_index.py'
+    embedding = VectorField()
+    # which model produced the vector, see `api.ml_model.get_embedding_model_name`
+    embedding_model = models.CharField(max_length=200, db_index=True)
     chunk_index = models.IntegerField()  # The order of the block in the original text
-
-    class Meta:
-        indexes = [
-            HnswIndex(
-                name="post_chunk_embedding_idx",
-                fields=["embedding"],
-                m=32,
-                ef_construction=256,
-                opclasses=["vector_cosine_ops"],
-            )
-        ]
+    # the headings which the chunk belongs to, e.g. ["安装", "Linux"]
+    heading_path = models.JSONField(default=list, blank=True)
+    # `Post.content_hash` which the chunks are built from
+    post_content_hash = models.CharField(max_length=64, blank=True)
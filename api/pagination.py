@@ -3,24 +3,133 @@
 #  Zen of Python, line 13:
 #  > There should be one-- and preferably only one --obvious way to do it.
 
-from typing import Any, List, Type
+import base64
+import json
+from functools import reduce
+from operator import or_
+from typing import Any, List, Optional, Type
 
-from django.db.models import QuerySet
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
 from django.http import HttpRequest
 from ninja import Field, Schema
+from ninja.errors import HttpError
 from ninja.pagination import AsyncPaginationBase
 from pydantic import create_model
 
+from api.count_cache import acount_queryset, count_queryset
 from api.schemas import PaginationSchema
 
-__all__ = ["Pagination", "paginate_as"]
+__all__ = ["Pagination", "KeysetCursor", "paginate_as"]
+
+
+class KeysetCursor:
+    """
+    Keyset pagination over the ordering of a queryset.
+
+    The ordering is the one of the queryset (or the model `Meta.ordering`) plus
+    the primary key as the tie breaker, e.g. `(-order, -created_at, -id)` for
+    `Post`. A token is the ordering values of a row, the next page is the rows
+    after it, so a deep page costs the same as the first page, and the pages
+    won't shift while new rows are inserted.
+
+    The ordering fields must be local and not null.
+    """
+
+    def __init__(self, queryset: QuerySet):
+        self.queryset = queryset
+        model = queryset.model
+        ordering = list(queryset.query.order_by or model._meta.ordering)
+        pk = model._meta.pk.name
+        if not any(name.lstrip("-") in (pk, "pk") for name in ordering):
+            descending = bool(ordering) and ordering[-1].startswith("-")
+            ordering.append(f"-{pk}" if descending else pk)
+        self.ordering = ordering
+        self.fields = [model._meta.get_field(name.lstrip("-")) for name in ordering]
+
+    def encode(self, obj) -> str:
+        values = [field.value_to_string(obj) for field in self.fields]
+        data = json.dumps(values, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    def decode(self, token: str) -> list:
+        try:
+            data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            values = json.loads(data)
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError("length mismatch")
+            return [
+                field.to_python(value)
+                for field, value in zip(self.fields, values, strict=True)
+            ]
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HttpError(400, "Invalid cursor") from e
+
+    def _after(self, values: list, reverse: bool = False) -> Q:
+        # (a, b, c) after (x, y, z):
+        #   a >= x and (a > x or (a = x and b > y) or (a = x and b = y and c > z))
+        # the redundant leading bound is a range of the index, the OR alone
+        # can't be used as an index condition
+        conditions = []
+        for i, name in enumerate(self.ordering):
+            descending = name.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            equal = {self.fields[j].attname: values[j] for j in range(i)}
+            conditions.append(
+                Q(**equal, **{f"{self.fields[i].attname}__{lookup}": values[i]})
+            )
+        bound = "lte" if self.ordering[0].startswith("-") != reverse else "gte"
+        leading = Q(**{f"{self.fields[0].attname}__{bound}": values[0]})
+        return leading & reduce(or_, conditions)
+
+    def page(self, size: int, after: str = None, before: str = None) -> QuerySet:
+        """
+        the rows of a page, `size + 1` rows are queried to know if there are more.
+        in the `before` mode the rows are in the reversed order
+        """
+        if before:
+            reversed_ordering = [
+                name[1:] if name.startswith("-") else f"-{name}"
+                for name in self.ordering
+            ]
+            return self.queryset.filter(
+                self._after(self.decode(before), reverse=True)
+            ).order_by(*reversed_ordering)[: size + 1]
+
+        queryset = self.queryset.order_by(*self.ordering)
+        if after:
+            queryset = queryset.filter(self._after(self.decode(after)))
+        return queryset[: size + 1]
+
+    def paginate(
+        self, rows: list, size: int, after: str = None, before: str = None
+    ) -> tuple[list, Optional[str], Optional[str]]:
+        """:return: items, next token, previous token"""
+        more = len(rows) > size
+        items = rows[:size]
+        if before:
+            items.reverse()
+
+        if not items:
+            return items, None, None
+        first, last = self.encode(items[0]), self.encode(items[-1])
+        if before:
+            return items, last, first if more else None
+        return items, last if more else None, first if after else None
 
 
 class Pagination(AsyncPaginationBase):
+    """
+    Offset pagination by `page`, or keyset pagination by the `after` / `before`
+    tokens (see `KeysetCursor`). The keyset mode doesn't count the total.
+    """
+
     # Query Params
     class Input(Schema):
         page: int = Field(1, ge=1)
         size: int = Field(10, ge=1, le=100)
+        after: Optional[str] = Field(None, max_length=512)
+        before: Optional[str] = Field(None, max_length=512)
 
     class Output(Schema):
         result: List[Any]  # in API endpoint definition, MUST use List[...]
@@ -36,17 +145,17 @@ class Pagination(AsyncPaginationBase):
         request: HttpRequest,
         **params: Any,
     ) -> dict:
+        if pagination.after or pagination.before:
+            cursor = self._cursor(queryset)
+            rows = list(
+                cursor.page(pagination.size, pagination.after, pagination.before)
+            )
+            return self._keyset_result(cursor, rows, pagination)
+
         offset = (pagination.page - 1) * pagination.size
         total = self._items_count(queryset)
-
-        return {
-            self.items_attribute: queryset[offset : offset + pagination.size],
-            "pagination": {
-                "page": pagination.page,
-                "size": pagination.size,
-                "total": total,
-            },
-        }
+        items = list(queryset[offset : offset + pagination.size])
+        return self._offset_result(queryset, items, pagination, total)
 
     async def apaginate_queryset(
         self,
@@ -55,6 +164,16 @@ class Pagination(AsyncPaginationBase):
         request: HttpRequest,
         **params: Any,
     ) -> dict:
+        if pagination.after or pagination.before:
+            cursor = self._cursor(queryset)
+            rows = [
+                row
+                async for row in cursor.page(
+                    pagination.size, pagination.after, pagination.before
+                )
+            ]
+            return self._keyset_result(cursor, rows, pagination)
+
         # calculate offset
         offset = (pagination.page - 1) * pagination.size
         total = await self._aitems_count(queryset)
@@ -66,12 +185,57 @@ class Pagination(AsyncPaginationBase):
         elif hasattr(items, "__iter__"):
             items = list(items)
 
+        return self._offset_result(queryset, items, pagination, total)
+
+    def _items_count(self, queryset: QuerySet) -> int:
+        # cached, see 'api/count_cache.py'
+        if isinstance(queryset, QuerySet):
+            return count_queryset(queryset)
+        return len(queryset)
+
+    async def _aitems_count(self, queryset: QuerySet) -> int:
+        if isinstance(queryset, QuerySet):
+            return await acount_queryset(queryset)
+        return len(queryset)
+
+    @staticmethod
+    def _cursor(queryset) -> KeysetCursor:
+        if not isinstance(queryset, QuerySet):
+            raise HttpError(400, "Cursor is not supported")
+        return KeysetCursor(queryset)
+
+    def _offset_result(self, queryset, items: list, pagination: Input, total: int):
+        # the next token to switch to the keyset mode
+        next_token = None
+        if (
+            isinstance(queryset, QuerySet)
+            and items
+            and pagination.page * pagination.size < total
+        ):
+            next_token = KeysetCursor(queryset).encode(items[-1])
+
         return {
             self.items_attribute: items,
             "pagination": {
                 "page": pagination.page,
                 "size": pagination.size,
                 "total": total,
+                "next": next_token,
+            },
+        }
+
+    def _keyset_result(self, cursor: KeysetCursor, rows: list, pagination: Input):
+        items, next_token, previous_token = cursor.paginate(
+            rows, pagination.size, pagination.after, pagination.before
+        )
+        return {
+            self.items_attribute: items,
+            "pagination": {
+                "page": None,
+                "size": pagination.size,
+                "total": None,
+                "next": next_token,
+                "previous": previous_token,
             },
         }
 
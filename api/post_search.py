@@ -3,9 +3,11 @@ from typing import Dict, List, Optional, TypedDict
 
 from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.db.models import F, Min
-from pgvector.django import CosineDistance
+from django.db.models.functions import Cast
+from pgvector.django import CosineDistance, VectorField
 
 from api.models import Post, PostChunk
+from api.search_index import tokenize
 from api.tasks import generate_search_embedding_task
 
 # only `post_search` function is useful
@@ -28,11 +30,8 @@ class SearchResult(TypedDict):
 
 
 def perform_full_text_search(query: str) -> List[ScoreItem]:
-    import jieba
-
-    # tokenize query
-    tokenized_query = " ".join(jieba.lcut(query, cut_all=True))
-    search_query = SearchQuery(tokenized_query, config="simple")
+    # tokenize query, the same as the vector
+    search_query = SearchQuery(tokenize(query), config="simple")
 
     # perform query
     rows = (
@@ -45,20 +44,35 @@ def perform_full_text_search(query: str) -> List[ScoreItem]:
 
 
 def perform_semantic_search(query: str) -> Optional[List[ScoreItem]]:
+    from api.embedding_index import get_serving_index
+
+    # the query must be embedded by the same model as the serving chunks
+    index = get_serving_index()
+    if index is None:
+        return []
+
     # try celery task whether available
     try:
         # TODO: eliminate anti-patterns
         #  celery: Fire and Forget
-        query_embedding = generate_search_embedding_task.delay(query).get(timeout=1)
+        query_embedding = generate_search_embedding_task.delay(
+            query, index.embedding_model
+        ).get(timeout=1)
     except Exception as e:
         logger.warning(f"Search embedding task failed or timed out: {e}")
         return None
 
+    # cast to the same expression as the partial HNSW index of the model
+    embedding = F("embedding")
+    if index.dimensions:
+        embedding = Cast("embedding", VectorField(dimensions=index.dimensions))
+
     # Group by post_id, and calculate the minimum distance
     # to the most matching block for each post.
     rows = list(
-        PostChunk.objects.annotate(
-            dist=CosineDistance("embedding", query_embedding),
+        PostChunk.objects.filter(embedding_model=index.embedding_model)
+        .annotate(
+            dist=CosineDistance(embedding, query_embedding),
         )
         .filter(dist__lt=CONFIDENCE)
         .values("post_id")
@@ -1,36 +1,194 @@
+"""
+Rate limit of the views by the client address.
+
+The limit is a token bucket (GCRA) in Redis: `max_requests` in `window`
+seconds, refilled continuously instead of a fixed window resetting at once. The
+check and the update are one Lua script, one round-trip per request.
+
+A client over the limit is remembered in the process until it may retry, the
+next requests of a flood are rejected without calling Redis. The async views
+run the script by the asyncio client (see 'api/async_redis.py').
+"""
+
+import functools
+import ipaddress
+import logging
+import time
+from collections import OrderedDict
 from functools import wraps
 from typing import Callable
 
+from django.conf import settings
 from django.core.cache import cache
 from django.http import HttpRequest
+from redis.commands.core import AsyncScript
 
+from api.async_redis import get_async_redis
 from core.inspect import is_async
 
-__all__ = ["rate_limit"]
+__all__ = ["rate_limit", "get_client_ip"]
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1]: the theoretical arrival time (TAT) of the client, in ms
+# ARGV: emission interval (ms per request), burst (ms), cost
+# return: {allowed, retry after (ms)}
+_GCRA_SCRIPT = """
+local now_parts = redis.call("TIME")
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local tat = tonumber(redis.call("GET", KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+
+local new_tat = tat + interval * cost
+local retry_after = new_tat - burst - now
+if retry_after > 0 then
+    return {0, retry_after}
+end
+
+redis.call("SET", KEYS[1], new_tat, "PX", math.ceil(new_tat - now))
+return {1, 0}
+"""
+
+# the clients over the limit, key -> the monotonic time they may retry
+_LOCAL_MAX_ENTRIES = 10000
+_blocked: OrderedDict[str, float] = OrderedDict()
+
+# a Redis outage fails every request, log it once in the interval (seconds)
+_ERROR_LOG_INTERVAL = 60
+_error_logged_at = float("-inf")
 
 
 def _generate_cache_key(key_prefix: str, client_ip: str) -> str:
     return f"rate_limit:{key_prefix}:{client_ip}"
 
 
-def _get_client_ip(request: HttpRequest) -> str:
-    client_ip = request.META.get("HTTP_X_FORWARDED_FOR")
-    if client_ip:
-        return client_ip.split(",")[0]
-    return request.META.get("REMOTE_ADDR")
+@functools.cache
+def _trusted_networks(proxies: tuple[str, ...]) -> tuple:
+    return tuple(ipaddress.ip_network(proxy, strict=False) for proxy in proxies)
+
+
+def _is_trusted(ip: str, networks: tuple) -> bool:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def get_client_ip(request: HttpRequest) -> str:
+    """
+    the client address, `X-Forwarded-For` is read only from a trusted proxy
+    (`RATE_LIMIT_TRUSTED_PROXIES`), from the right, the hops added by the
+    trusted proxies are skipped, so a client can't spoof it.
+    """
+
+    if (client_ip := request.__dict__.get("_client_ip")) is not None:
+        return client_ip
+
+    networks = _trusted_networks(tuple(settings.RATE_LIMIT_TRUSTED_PROXIES))
+    client_ip = request.META.get("REMOTE_ADDR", "")
+    if _is_trusted(client_ip, networks):
+        forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+        for hop in reversed([hop.strip() for hop in forwarded.split(",")]):
+            if not hop:
+                continue
+            client_ip = hop
+            if not _is_trusted(hop, networks):
+                break
+
+    request._client_ip = client_ip
+    return client_ip
+
+
+def _locally_blocked(key: str) -> bool:
+    if (retry_at := _blocked.get(key)) is None:
+        return False
+    if retry_at > time.monotonic():
+        return True
+    _blocked.pop(key, None)
+    return False
+
 
+def _block_locally(key: str, retry_after_ms: int) -> None:
+    _blocked[key] = time.monotonic() + retry_after_ms / 1000
+    _blocked.move_to_end(key)
+    while len(_blocked) > _LOCAL_MAX_ENTRIES:
+        _blocked.popitem(last=False)
+
+
+@functools.cache
+def _script():
+    # `Script` runs EVALSHA, and loads the script once if Redis doesn't know it
+    return cache.client.get_client(write=True).register_script(_GCRA_SCRIPT)
+
+
+# the same for the asyncio clients, bytes don't need the encoder of a client
+_async_script = AsyncScript(None, _GCRA_SCRIPT.encode())
+
+
+def _script_args(max_requests: int, window: int, cost: int) -> list:
+    return [window * 1000 / max_requests, window * 1000, cost]
+
+
+def _log_error(key: str, e: Exception) -> None:
+    global _error_logged_at
+    now = time.monotonic()
+    if now - _error_logged_at >= _ERROR_LOG_INTERVAL:
+        _error_logged_at = now
+        logger.warning(f"Failed check rate limit {key}: {e}")
+
+
+def _check_result(key: str, result: list[int]) -> bool:
+    allowed, retry_after = result
+    if not allowed:
+        _block_locally(key, int(retry_after))
+    return bool(allowed)
+
+
+def _acquire(key: str, max_requests: int, window: int, cost: int) -> bool:
+    try:
+        result = _script()(
+            keys=[cache.make_key(key)], args=_script_args(max_requests, window, cost)
+        )
+    except Exception as e:
+        # the limit is not worth failing the request
+        _log_error(key, e)
+        return True
+    return _check_result(key, result)
+
+
+async def _aacquire(key: str, max_requests: int, window: int, cost: int) -> bool:
+    try:
+        result = await _async_script(
+            keys=[cache.make_key(key)],
+            args=_script_args(max_requests, window, cost),
+            client=get_async_redis(),
+        )
+    except Exception as e:
+        _log_error(key, e)
+        return True
+    return _check_result(key, result)
+
+
+def rate_limit(key_prefix: str, max_requests: int, window: int, cost: int = 1):
+    """
+    :param max_requests: the requests of a client in `window` seconds, the burst
+    :param cost: the requests counted for one call, e.g. an expensive route
+    """
 
-def rate_limit(key_prefix: str, max_requests: int, window: int):
     def decorator(func: Callable):
         @wraps(func)
         async def async_wrapper(request: HttpRequest, *args, **kwargs):
-            # get ip
-            client_ip = _get_client_ip(request)
-
-            cache_key = _generate_cache_key(key_prefix, client_ip)
-            await cache.aadd(cache_key, 0, timeout=window)
-            current_requests = await cache.aincr(cache_key)
-            if current_requests > max_requests:
+            cache_key = _generate_cache_key(key_prefix, get_client_ip(request))
+            if _locally_blocked(cache_key) or not await _aacquire(
+                cache_key, max_requests, window, cost
+            ):
                 return 429, {"message": "Too many request"}
 
             # run the raw func
@@ -38,13 +196,10 @@ def rate_limit(key_prefix: str, max_requests: int, window: int):
 
         @wraps(func)
         def sync_wrapper(request: HttpRequest, *args, **kwargs):
-            # get ip
-            client_ip = _get_client_ip(request)
-
-            cache_key = _generate_cache_key(key_prefix, client_ip)
-            cache.add(cache_key, 0, timeout=window)
-            current_requests = cache.incr(cache_key)
-            if current_requests > max_requests:
+            cache_key = _generate_cache_key(key_prefix, get_client_ip(request))
+            if _locally_blocked(cache_key) or not _acquire(
+                cache_key, max_requests, window, cost
+            ):
                 return 429, {"message": "Too many request"}
 
             # run the raw func
@@ -0,0 +1,46 @@
+"""
+orjson renderer and parser of the `NinjaAPI`.
+
+The datetimes, dates, UUIDs and enums are serialized by orjson natively
+(ISO 8601 with microseconds, `Z` for UTC, `DjangoJSONEncoder` truncates to
+milliseconds). The other types orjson doesn't know (pydantic models,
+`Decimal`, lazy strings, urls...) fall back to `NinjaJSONEncoder`.
+
+Benchmark: './scripts/benchmark_renderer.py'
+"""
+
+from typing import Any
+
+import orjson
+from django.http import HttpRequest
+from ninja.parser import Parser
+from ninja.renderers import BaseRenderer
+from ninja.responses import NinjaJSONEncoder
+from pydantic import BaseModel
+
+__all__ = ["ORJSONRenderer", "ORJSONParser", "dumps"]
+
+_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+_encoder = NinjaJSONEncoder()
+
+
+def _default(o: Any) -> Any:
+    if isinstance(o, BaseModel):
+        return o.model_dump()
+    return _encoder.default(o)
+
+
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=_default, option=_OPTIONS)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+
+    def render(self, request: HttpRequest, data: Any, *, response_status: int) -> Any:
+        return dumps(data)
+
+
+class ORJSONParser(Parser):
+    def parse_body(self, request: HttpRequest):
+        return orjson.loads(request.body)
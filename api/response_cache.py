@@ -0,0 +1,228 @@
+"""
+Cache of the rendered JSON responses of the hot read endpoints.
+
+`cache_response` wraps the ninja operation (with `decorate_view`), the body of
+a `200` response is stored as bytes with its validators, a hit is returned
+without touching the ORM or pydantic:
+
+    response:<endpoint>:<path params>               e.g. the post detail
+    response:<endpoint>:<generation>:<query string> e.g. the post cards
+
+The detail keys are invalidated precisely by the save and delete signals (see
+'api/signals.py'), the listings vary on the query string, so the generation
+of the endpoint is changed instead and the old pages expire later.
+
+An invalidated key is not deleted but replaced by a tombstone, a render which
+started before (and read the old rows) finds the key changed and doesn't write
+its stale body back (see `afill`).
+
+The entry records the version of the response schema, a deploy changing the
+schema makes the old entries misses without flushing the cache.
+"""
+
+import functools
+import json
+import logging
+import time
+from collections.abc import Callable, Iterable
+
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from pydantic import BaseModel
+
+from api.single_flight import single_flight
+from core.hash import calculate_blake3_hash
+
+__all__ = [
+    "cache_response",
+    "get_cached_responses",
+    "invalidate_response",
+    "invalidate_response_generation",
+    "invalidate_post_responses",
+    "invalidate_keys",
+    "afill",
+]
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_TIMEOUT = 60 * 60 * 24  # 1 day, invalidated by the signals anyway
+
+_CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+@functools.cache
+def _schema_version(schema: type[BaseModel]) -> str:
+    schema_json = json.dumps(schema.model_json_schema(), sort_keys=True)
+    return calculate_blake3_hash(schema_json)[:12]
+
+
+def _params_key(params: dict) -> str:
+    return ",".join(f"{name}={value}" for name, value in sorted(params.items()))
+
+
+def _detail_key(endpoint: str, params: dict) -> str:
+    return f"response:{endpoint}:{_params_key(params)}"
+
+
+def _generation_key(endpoint: str) -> str:
+    return f"response:generation:{endpoint}"
+
+
+def invalidate_keys(keys: Iterable[str], timeout: int = RESPONSE_TIMEOUT) -> None:
+    """replace the cached values by a tombstone, see `afill`"""
+    tombstone = {"invalidated_at": time.time_ns()}
+    cache.set_many(dict.fromkeys(keys, tombstone), timeout=timeout)
+
+
+async def afill(key: str, seen, value, timeout: int = RESPONSE_TIMEOUT) -> bool:
+    """
+    cache the rendered value, unless the key changed since `seen` was read
+    before rendering, e.g. invalidated by a commit while the old rows were read.
+
+    Not atomic, but the window is between the two calls, not the whole render.
+    """
+    if await cache.aget(key) != seen:
+        return False
+    await cache.aset(key, value, timeout=timeout)
+    return True
+
+
+def invalidate_response(endpoint: str, **params) -> None:
+    """invalidate the cached response of the path params, e.g. `post_id=1`"""
+    invalidate_keys([_detail_key(endpoint, params)])
+
+
+def invalidate_response_generation(*endpoints: str) -> None:
+    """drop all the cached pages of the listing endpoints"""
+    generation = time.time_ns()
+    cache.set_many({_generation_key(e): generation for e in endpoints}, timeout=None)
+
+
+def invalidate_post_responses(posts: Iterable[tuple]) -> None:
+    """the detail of the posts `[(id, slug, old slug), ...]` and the listings"""
+    for post_id, *slugs in posts:
+        invalidate_response("post", post_id=post_id)
+        for slug in set(slugs) - {None}:
+            invalidate_response("post", post_slug=slug)
+    invalidate_response_generation("post-cards")
+    invalidate_response("post-sitemap")
+
+
+async def get_cached_responses(
+    endpoint: str, schema: type[BaseModel], param: str, values: list
+) -> dict:
+    """the cached bodies of the detail responses, e.g. `post_id` of the ids"""
+    keys = {_detail_key(endpoint, {param: value}): value for value in values}
+    try:
+        entries = await cache.aget_many(keys)
+    except Exception as e:
+        logger.warning(f"Failed get cached responses of {endpoint}: {e}")
+        return {}
+
+    version = _schema_version(schema)
+    # a tombstone has no version
+    return {
+        keys[key]: entry["body"]
+        for key, entry in entries.items()
+        if entry.get("version") == version
+    }
+
+
+def _from_cache(request: HttpRequest, entry: dict) -> HttpResponse:
+    response = HttpResponse(entry["body"])
+    for header, value in entry["headers"].items():
+        response.headers[header] = value
+
+    last_modified = entry["headers"].get("Last-Modified")
+    return get_conditional_response(
+        request,
+        etag=entry["headers"].get("ETag"),
+        last_modified=last_modified and parse_http_date_safe(last_modified),
+        response=response,
+    )
+
+
+def cache_response(
+    endpoint: str,
+    schema: type[BaseModel],
+    *,
+    vary_on_query: bool = False,
+    timeout: int = RESPONSE_TIMEOUT,
+) -> Callable:
+    """
+    cache the `200` responses of an async operation.
+
+    :param endpoint: the name used by the invalidation
+    :param schema: the `200` response schema, the entries of another version
+        are ignored
+    :param vary_on_query: a listing, the query string is a part of the key and
+        it's invalidated by `invalidate_response_generation`
+    """
+
+    def decorator(run: Callable) -> Callable:
+        @functools.wraps(run)
+        async def wrapper(request: HttpRequest, *args, **kwargs):
+            # the detail key is the path params only, the variants of the query
+            # string (e.g. the sparse fieldsets) are not cached
+            if request.method != "GET" or (request.GET and not vary_on_query):
+                return await run(request, *args, **kwargs)
+
+            version = _schema_version(schema)
+            if vary_on_query:
+                generation = await cache.aget(_generation_key(endpoint), 0)
+                query = request.GET.urlencode()
+                key = f"response:{endpoint}:{generation}:{calculate_blake3_hash(query)}"
+            else:
+                key = _detail_key(endpoint, kwargs)
+
+            seen = None
+
+            async def cached_entry() -> dict | None:
+                nonlocal seen
+                seen = await cache.aget(key)
+                if seen is not None and seen.get("version") == version:
+                    return seen
+                return None
+
+            if (entry := await cached_entry()) is not None:
+                return _from_cache(request, entry)
+
+            leader_response = None
+
+            async def render() -> dict | None:
+                nonlocal leader_response
+                # read before the rows, an invalidation after it is seen by `afill`
+                before = seen
+                leader_response = await run(request, *args, **kwargs)
+                if leader_response.status_code != 200 or leader_response.cookies:
+                    return None
+
+                entry = {
+                    "version": version,
+                    "body": leader_response.content,
+                    "headers": {
+                        header: leader_response.headers[header]
+                        for header in _CACHED_HEADERS
+                        if header in leader_response.headers
+                    },
+                }
+                try:
+                    await afill(key, before, entry, timeout=timeout)
+                except Exception as e:
+                    logger.warning(f"Failed cache response {key}: {e}")
+                return entry
+
+            # the concurrent misses (e.g. after an edit) render it once
+            entry = await single_flight(key, render, check=cached_entry)
+            if leader_response is not None:
+                return leader_response
+            if entry is not None:
+                return _from_cache(request, entry)
+            # the leader's response is not cacheable, e.g. `304` or `404`
+            return await run(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,32 +1,38 @@
+from typing import Optional
+
 from ninja import Router
 from pydantic import PositiveInt
 
 from api.models import Anime
+from api.pagination import Pagination
 from api.schemas import AnimeIds, AnimeSchema, MessageSchema
 
 router = Router()
 
 
 @router.get("/ids", response={200: AnimeIds, 400: MessageSchema, 404: MessageSchema})
-async def get_all_anime_ids(request, page: PositiveInt = 1, size: PositiveInt = 10):
-    offset = (page - 1) * size
-    total = await Anime.objects.acount()
-
+async def get_all_anime_ids(
+    request,
+    page: PositiveInt = 1,
+    size: PositiveInt = 10,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+):
+    # the out of range check below uses the clamped size too
+    size = min(size, 100)
+    pagination = Pagination.Input(page=page, size=size, after=after, before=before)
+    result = await Pagination().apaginate_queryset(
+        Anime.objects.all(), pagination, request
+    )
+
+    total = result["pagination"]["total"]
     if total == 0:
         return 404, {"message": "Empty"}
 
-    if offset >= total:
+    if total is not None and (page - 1) * size >= total:
         return 400, {"message": "Out of range"}
 
-    anime = [a async for a in Anime.objects.all()[offset : offset + size]]
-    return 200, {
-        "ids": anime,
-        "pagination": {
-            "total": total,
-            "page": page,
-            "size": size,
-        },
-    }
+    return 200, {"ids": result["result"], "pagination": result["pagination"]}
 
 
 @router.get("/{int:anime_id}", response={200: AnimeSchema, 404: MessageSchema})
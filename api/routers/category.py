@@ -1,7 +1,10 @@
+from typing import Optional
+
 from ninja import Router
 from pydantic import PositiveInt
 
 from api.models import Category, Post
+from api.pagination import Pagination
 from api.schemas import CategoryResponseSchema, MessageSchema
 
 router = Router()
@@ -12,25 +15,29 @@ router = Router()
     response={200: CategoryResponseSchema, 400: MessageSchema, 404: MessageSchema},
 )
 async def category_get_post(
-    request, category_id: int, page: PositiveInt = 1, size: PositiveInt = 10
+    request,
+    category_id: int,
+    page: PositiveInt = 1,
+    size: PositiveInt = 10,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
 ):
     try:
         category = await Category.objects.aget(pk=category_id)
-        posts_qs = Post.objects.filter(category=category)
+        posts_qs = Post.objects.cards().filter(category=category)
 
-        offset = (page - 1) * size
-        total = await posts_qs.acount()
+        # the out of range check below uses the clamped size too
+        size = min(size, 100)
+        pagination = Pagination.Input(page=page, size=size, after=after, before=before)
+        result = await Pagination().apaginate_queryset(posts_qs, pagination, request)
 
-        if 0 < total <= offset:
+        total = result["pagination"]["total"]
+        if total is not None and 0 < total <= (page - 1) * size:
             return 400, {"message": "Out of range"}
 
         return 200, {
-            "posts": [p async for p in posts_qs[offset : offset + size]],
-            "pagination": {
-                "total": total,
-                "page": page,
-                "size": size,
-            },
+            "posts": result["result"],
+            "pagination": result["pagination"],
             "name": category.name,
         }
     except Category.DoesNotExist:
@@ -0,0 +1,50 @@
+"""
+Incremental changes feed, the frontend revalidates only the changed objects
+instead of scanning `/post/ids` or `/post/sitemap`:
+
+    GET /changes            the current cursor, start following after a full build
+    GET /changes?since=42   the changes after the cursor, in order
+
+The cursor is `Change.cursor`, numbered after the commit of the write in the
+order of the commits (see `Change.assign_cursors`), so a transaction committing
+later never adds a change before a served cursor. The log is pruned by
+`prune_changes_task` (see 'api/tasks.py'), an older cursor gets `410` and the
+client rebuilds everything.
+"""
+
+from ninja import Query, Router
+
+from api.models import Change
+from api.schemas import ChangesSchema, MessageSchema
+
+router = Router()
+
+CHANGES_MAX_LIMIT = 1000
+
+
+@router.get("/", response={200: ChangesSchema, 410: MessageSchema})
+async def get_changes(
+    request, since: int = None, limit: int = Query(500, ge=1, le=CHANGES_MAX_LIMIT)
+):
+    changes = Change.objects.filter(cursor__isnull=False)
+
+    if since is None:
+        latest = (
+            await changes.order_by("-cursor").values_list("cursor", flat=True).afirst()
+        )
+        return {"changes": [], "cursor": latest or 0, "has_more": False}
+
+    # the changes after the cursor are pruned
+    oldest = await changes.order_by("cursor").values_list("cursor", flat=True).afirst()
+    if oldest is not None and since < oldest - 1:
+        return 410, {"message": "Cursor expired"}
+
+    page = changes.filter(cursor__gt=since).order_by("cursor")[: limit + 1]
+    rows = [change async for change in page]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "changes": rows,
+        "cursor": rows[-1].cursor if rows else since,
+        "has_more": has_more,
+    }
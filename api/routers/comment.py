@@ -1,8 +1,10 @@
 import logging
+from typing import List
 
 from ninja import Router
 
 from api.auth import AsyncTimeBaseAuth
+from api.batch import batch_response, parse_ids
 from api.models import Comment, Guest, Post
 from api.schemas import (
     CommentIdsSchema,
@@ -32,6 +34,12 @@ async def get_comment(request, comment_id: int):
         return 500, {"message": "Internal Server Error"}
 
 
+@router.get("/batch", response=List[CommentSchema])
+async def get_comments_batch(request, ids: str):
+    queryset = Comment.objects.select_related("guest")
+    return await batch_response(request, parse_ids(ids), queryset, CommentSchema)
+
+
 # get comment ids from post id
 @router.get(
     "/post/{int:post_id}/ids",
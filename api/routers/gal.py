@@ -1,11 +1,16 @@
 from typing import List
 
+from django.http import HttpResponse
 from ninja import Router
+from ninja.decorators import decorate_view
 from ninja.pagination import paginate
 
 from api.auth import AsyncTimeBaseAuth
+from api.batch import batch_response, parse_ids
+from api.conditional import build_etag, check_not_modified
 from api.models import Gal
 from api.pagination import paginate_as
+from api.response_cache import cache_response
 from api.schemas import (
     GalSchema,
     GalUpdateSchema,
@@ -13,6 +18,7 @@ from api.schemas import (
     IdsSchema,
     MessageSchema,
 )
+from api.streaming import stream_json
 
 router = Router()
 
@@ -27,13 +33,29 @@ async def get_all_gal(request):
 
 @router.get("/ids", response=IdsSchema)
 async def get_gal_ids(request):
-    return {
-        "ids": [i async for i in Gal.objects.values_list("id", flat=True)],
-    }
+    return stream_json(Gal.objects.values_list("id", flat=True), key="ids")
+
+
+@router.get("/batch", response=List[GalSchema])
+async def get_gals_batch(request, ids: str):
+    return await batch_response(
+        request, parse_ids(ids), Gal.objects.all(), GalSchema, cached=("gal", "gal_id")
+    )
 
 
 @router.get("/{int:gal_id}", response={200: GalSchema, 404: MessageSchema})
-async def get_gal_from_id(request, gal_id: int):
+@decorate_view(cache_response("gal", GalSchema))
+async def get_gal_from_id(request, response: HttpResponse, gal_id: int):
+    validators = await Gal.objects.filter(pk=gal_id).values("pk", "updated_at").afirst()
+    if validators is None:
+        return 404, {"message": "not found"}
+
+    etag = build_etag(*validators.values())
+    if not_modified := check_not_modified(
+        request, response, etag, validators["updated_at"]
+    ):
+        return not_modified
+
     try:
         return 200, await Gal.objects.aget(pk=gal_id)
     except Gal.DoesNotExist:
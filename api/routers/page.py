@@ -1,16 +1,53 @@
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Max
+from django.http import HttpResponse
 from ninja import Router
 
+from api.conditional import build_etag, check_not_modified
 from api.models import Page
-from api.schemas import IdsSchema
+from api.schemas import IdsSchema, MessageSchema, PageSchema
+from api.streaming import stream_json
 
 router = Router()
 
 
 @router.get("/ids", response=IdsSchema)
-def get_all_page_ids(request):
-    return {"ids": list(Page.objects.values_list("id", flat=True))}
+async def get_all_page_ids(request):
+    return stream_json(Page.objects.values_list("id", flat=True), key="ids")
 
 
-@router.get("/{int:page_id}")
-def get_page_by_id(request, page_id: int):
-    pass
+@router.get("/{int:page_id}", response={200: PageSchema, 404: MessageSchema})
+async def get_page_by_id(request, response: HttpResponse, page_id: int):
+    row = await (
+        Page.objects.filter(pk=page_id)
+        .values("pk", "updated_at", "category__updated_at")
+        # the page has no search version, the tag ids tell the m2m changes
+        .annotate(
+            tag_ids=ArrayAgg("tags__id", order_by="tags__id", default=[]),
+            tags_updated_at=Max("tags__updated_at"),
+        )
+        .afirst()
+    )
+    if row is None:
+        return 404, {"message": "Not found"}
+
+    last_modified = max(
+        value
+        for value in (
+            row["updated_at"],
+            row["category__updated_at"],
+            row["tags_updated_at"],
+        )
+        if value is not None
+    )
+    if not_modified := check_not_modified(
+        request, response, build_etag(*row.values()), last_modified
+    ):
+        return not_modified
+
+    try:
+        return 200, await Page.objects.select_related("category").prefetch_related(
+            "tags"
+        ).aget(pk=page_id)
+    except Page.DoesNotExist:
+        return 404, {"message": "Not found"}
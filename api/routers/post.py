@@ -1,20 +1,27 @@
+import functools
 import logging
+from datetime import datetime
 from typing import Any, List, Tuple
 
 import blake3
 from asgiref.sync import sync_to_async
-from django.core.cache import cache
-from django.http import HttpRequest
+from django.db.models import Max
+from django.http import HttpRequest, HttpResponse
 from django.views.decorators.cache import cache_page
 from ninja import Field, Router, Schema
 from ninja.decorators import decorate_view
 from ninja.errors import HttpError
 from ninja.pagination import paginate
 
+from api.batch import batch_response, parse_ids
+from api.conditional import build_etag, check_not_modified
+from api.fieldsets import parse_fieldset
 from api.models import Post
 from api.pagination import Pagination, paginate_as
 from api.post_search import post_search
 from api.rate_limit import rate_limit
+from api.renderers import dumps
+from api.response_cache import cache_response
 from api.schemas import (
     IdsSchema,
     MessageSchema,
@@ -23,31 +30,52 @@ from api.schemas import (
     PostCardWithSimilarity,
     PostIdsForSitemap,
     PostSchema,
-    PostSitemapSchema,
 )
+from api.single_flight import cached_single_flight
+from api.streaming import stream_json
 
 router = Router()
 
 
 @router.get("/", response=List[PostCardSchema])
+@decorate_view(cache_response("post-cards", PostCardSchema, vary_on_query=True))
 @paginate(paginate_as("posts", PostCardSchema))
-async def get_all_posts(request):
-    return Post.objects.select_related("category").prefetch_related("tags").all()
+async def get_all_posts(request, fields: str = None, exclude: str = None):
+    if fieldset := parse_fieldset(request, PostCardSchema, fields, exclude):
+        # the ordering columns for the cursor
+        return Post.objects.project(fieldset, "order", "created_at")
+    return Post.objects.cards()
 
 
 @router.get("/ids", response=IdsSchema)
 async def get_all_post_ids(request):
-    return {
-        "ids": [i async for i in Post.objects.values_list("id", flat=True)],
-    }
+    return stream_json(Post.objects.values_list("id", flat=True), key="ids")
 
 
 @router.get("/sitemap", response=PostIdsForSitemap)
+@decorate_view(cache_response("post-sitemap", PostIdsForSitemap))
 async def get_all_post_ids_for_sitemap(request):
-    posts = Post.objects.values("id", "slug", "content_update_at")
-    # transform to Pydantic model
-    post_schemas = [PostSitemapSchema(**post) async for post in posts]
-    return PostIdsForSitemap(root=post_schemas)
+    # rendered from the rows, without a model per post, the sharded sitemap of
+    # all the objects is '/sitemap' (see 'api/sitemap.py')
+    posts = Post.objects.values_list("id", "slug", "content_update_at")
+    body = dumps(
+        [
+            {"id": post_id, "slug": slug, "updated_at": updated_at}
+            async for post_id, slug, updated_at in posts
+        ]
+    )
+    return HttpResponse(body, content_type="application/json")
+
+
+@router.get("/batch", response=List[PostSchema])
+async def get_posts_batch(request, ids: str):
+    return await batch_response(
+        request,
+        parse_ids(ids),
+        Post.objects.select_related("category").prefetch_related("tags"),
+        PostSchema,
+        cached=("post", "post_id"),
+    )
 
 
 class PostSimilarityPagination(Pagination):
@@ -103,25 +131,21 @@ async def get_post_cards_from_query(request, q: str):
         # use an error to passby paginate decorator
         raise HttpError(400, "Query too long")
 
-    # caching
+    # caching, the concurrent misses run the search (and the model) once
     hashed_query = blake3.blake3().update(q.encode()).hexdigest()
-    cache_key = f"post_search:{hashed_query}"
-    if not (result := await cache.aget(cache_key, False)):
-        # query the search
-        result = await sync_to_async(post_search)(q)
-        await cache.aset(cache_key, result, timeout=7200)  # 2h
+    result = await cached_single_flight(
+        f"post_search:swr:{hashed_query}",
+        sync_to_async(functools.partial(post_search, q)),
+        timeout=7200,  # 2h
+        stale_timeout=3600,  # served while refreshing
+    )
 
     # map the relation
     similarities_map = {r["id"]: r["hybrid_score"] for r in result}
     post_ids = [r["id"] for r in result]
 
     # query from db, maybe disordered
-    posts_dict = {
-        p.id: p
-        async for p in Post.objects.filter(id__in=post_ids)
-        .select_related("category")
-        .prefetch_related("tags")
-    }
+    posts_dict = {p.id: p async for p in Post.objects.cards().filter(id__in=post_ids)}
 
     # recover the relation
     ordered_posts = []
@@ -135,17 +159,60 @@ async def get_post_cards_from_query(request, q: str):
     return ordered_posts, ordered_similarities
 
 
+async def _post_validators(
+    fieldset: frozenset[str] | None, **lookup
+) -> tuple[str, datetime] | None:
+    """ETag and Last-Modified of a post, the category and tags are in the body"""
+    row = await (
+        Post.objects.filter(**lookup)
+        .values("pk", "updated_at", "search_version", "category__updated_at")
+        # the tags changes increase `search_version`, the renames update the tags
+        .annotate(tags_updated_at=Max("tags__updated_at"))
+        .afirst()
+    )
+    if row is None:
+        return None
+
+    last_modified = max(
+        value
+        for value in (
+            row["updated_at"],
+            row["category__updated_at"],
+            row["tags_updated_at"],
+        )
+        if value is not None
+    )
+    # a sparse representation has its own tag
+    return build_etag(*row.values(), *sorted(fieldset or ())), last_modified
+
+
+def _post_detail(fieldset: frozenset[str] | None):
+    if fieldset is None:
+        return Post.objects.select_related("category").prefetch_related("tags")
+    return Post.objects.project(fieldset)
+
+
 @router.get(
     "/{int:post_id}",
     response={200: PostSchema, 404: MessageSchema, 500: MessageSchema},
 )
-async def get_post(request, post_id: int):
+@decorate_view(cache_response("post", PostSchema))
+async def get_post(
+    request,
+    response: HttpResponse,
+    post_id: int,
+    fields: str = None,
+    exclude: str = None,
+):
+    fieldset = parse_fieldset(request, PostSchema, fields, exclude)
     try:
-        return (
-            await Post.objects.select_related("category")
-            .prefetch_related("tags")
-            .aget(pk=post_id)
-        )
+        validators = await _post_validators(fieldset, pk=post_id)
+        if validators is None:
+            return 404, {"message": "Not found"}
+        if not_modified := check_not_modified(request, response, *validators):
+            return not_modified
+
+        return await _post_detail(fieldset).aget(pk=post_id)
     except Post.DoesNotExist:
         return 404, {"message": "Not found"}
     except Exception as e:
@@ -161,13 +228,23 @@ async def get_post(request, post_id: int):
     "/{str:post_slug}",
     response={200: PostSchema, 404: MessageSchema, 500: MessageSchema},
 )
-async def get_post_from_slug(request, post_slug: str):
+@decorate_view(cache_response("post", PostSchema))
+async def get_post_from_slug(
+    request,
+    response: HttpResponse,
+    post_slug: str,
+    fields: str = None,
+    exclude: str = None,
+):
+    fieldset = parse_fieldset(request, PostSchema, fields, exclude)
     try:
-        return (
-            await Post.objects.select_related("category")
-            .prefetch_related("tags")
-            .aget(slug=post_slug)
-        )
+        validators = await _post_validators(fieldset, slug=post_slug)
+        if validators is None:
+            return 404, {"message": "Not found"}
+        if not_modified := check_not_modified(request, response, *validators):
+            return not_modified
+
+        return await _post_detail(fieldset).aget(slug=post_slug)
     except Post.DoesNotExist:
         return 404, {"message": "Not found"}
     except Exception as e:
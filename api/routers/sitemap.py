@@ -0,0 +1,28 @@
+from typing import List
+
+from ninja import Router
+
+from api.schemas import MessageSchema, SitemapEntrySchema, SitemapIndexSchema
+from api.sitemap import (
+    SITEMAP_SOURCES,
+    sitemap_index_response,
+    sitemap_shard_response,
+)
+
+router = Router()
+
+
+# the responses are the cached JSON, the schemas are for the docs
+@router.get("/", response=SitemapIndexSchema)
+async def get_sitemap_index(request):
+    return await sitemap_index_response()
+
+
+@router.get(
+    "/{str:model}/{int:shard}",
+    response={200: List[SitemapEntrySchema], 404: MessageSchema},
+)
+async def get_sitemap_shard(request, model: str, shard: int):
+    if model not in SITEMAP_SOURCES:
+        return 404, {"message": "Not found"}
+    return await sitemap_shard_response(model, shard)
@@ -27,12 +27,16 @@ from .base import (
     IdsSchema,
     MessageSchema,
     PaginationSchema,
+    SparseSchema,
     TagsSchema,
 )
 
 # Category schemas
 from .category import CategoryResponseSchema
 
+# Changes feed schemas
+from .change import ChangeSchema, ChangesSchema
+
 # Comment schemas
 from .comment import (
     CommentIdsSchema,
@@ -53,6 +57,9 @@ from .gal import (
 # Image
 from .image import ImageUploadRequestSchema, ImageUploadResponseSchema
 
+# Page schemas
+from .page import PageSchema
+
 # Post schemas
 from .post import (
     PostCardSchema,
@@ -64,7 +71,13 @@ from .post import (
 )
 
 # Sitemap schemas
-from .sitemap import PostIdsForSitemap, PostSitemapSchema
+from .sitemap import (
+    PostIdsForSitemap,
+    PostSitemapSchema,
+    SitemapEntrySchema,
+    SitemapIndexSchema,
+    SitemapShardSchema,
+)
 
 # System and health check schemas
 from .system import (
@@ -76,6 +89,7 @@ from .system import (
 __all__ = [
     # Base
     "PaginationSchema",
+    "SparseSchema",
     "MessageSchema",
     "IdSchema",
     "IdsSchema",
@@ -84,6 +98,9 @@ __all__ = [
     # Category & Tags
     "CategorySchema",
     "TagsSchema",
+    # Changes feed
+    "ChangeSchema",
+    "ChangesSchema",
     # Comments
     "CommentSchema",
     "CommentPaginationResponse",
@@ -99,6 +116,8 @@ __all__ = [
     "PostRenderedSchema",
     "PostCardWithSimilarity",
     "PostCardsWithSimilaritySchema",
+    # Pages
+    "PageSchema",
     # Auth
     "LoginSchema",
     "TokenSchema",
@@ -107,6 +126,9 @@ __all__ = [
     # Sitemap
     "PostSitemapSchema",
     "PostIdsForSitemap",
+    "SitemapIndexSchema",
+    "SitemapShardSchema",
+    "SitemapEntrySchema",
     # Gal
     "GalSchema",
     "GalPaginationResponse",
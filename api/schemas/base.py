@@ -1,14 +1,48 @@
 """Base schemas for API responses."""
 
-from typing import List
+from typing import Any, List, Optional
 
 from ninja.schema import Schema
+from pydantic import ModelWrapValidatorHandler, ValidationInfo, model_validator
+
+from api.fieldsets import get_fieldset, sparse_model
+
+
+class SparseSchema(Schema):
+    """
+    Response schema supporting the sparse fieldsets (see 'api/fieldsets.py').
+
+    Only the requested fields are read from the object, the others are unset
+    and not dumped.
+    """
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def _sparse_validator(
+        cls, values: Any, handler: ModelWrapValidatorHandler, info: ValidationInfo
+    ) -> Any:
+        fieldset = get_fieldset(info.context, cls)
+        if fieldset is None or isinstance(values, cls):
+            return handler(values)
+
+        partial = sparse_model(cls, fieldset).model_validate(
+            values, context=info.context
+        )
+        instance = cls.model_construct(_fields_set=set(fieldset), **dict(partial))
+        # `model_construct` sets the defaults, they are not requested either
+        for name in cls.model_fields.keys() - fieldset:
+            instance.__dict__.pop(name, None)
+        return instance
 
 
 class PaginationSchema(Schema):
-    page: int
+    # `page` and `total` are None in the keyset (cursor) mode
+    page: Optional[int]
     size: int
-    total: int
+    total: Optional[int]
+    # opaque tokens of `Pagination`, pass as `after` / `before`
+    next: Optional[str] = None
+    previous: Optional[str] = None
 
 
 class MessageSchema(Schema):
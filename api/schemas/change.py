@@ -0,0 +1,24 @@
+"""Changes feed schemas."""
+
+import datetime
+from typing import List, Literal
+
+from ninja.schema import Schema
+from pydantic import Field
+
+
+class ChangeSchema(Schema):
+    model: str
+    id: int = Field(alias="object_id")
+    action: Literal["created", "updated", "deleted"]
+    changed_at: datetime.datetime = Field(alias="created_at")
+
+    class Config:
+        populate_by_name = True
+
+
+class ChangesSchema(Schema):
+    changes: List[ChangeSchema]
+    # pass it as `since` of the next request
+    cursor: int
+    has_more: bool
@@ -0,0 +1,27 @@
+"""Page schemas."""
+
+import datetime
+from typing import List, Optional
+
+from ninja.schema import Schema
+
+from .base import CategorySchema, TagsSchema
+
+
+class PageSchema(Schema):
+    id: int
+    category: Optional[CategorySchema] = None
+    content: str
+    content_html: Optional[str]
+    cover_image: Optional[str]
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    header_image: Optional[str]
+    meta_description: str
+    keywords: Optional[str] = None
+    order: int
+    slug: str
+    status: str
+    tags: Optional[List[TagsSchema]] = None
+    title: str
+    view_count: int
@@ -5,10 +5,10 @@ from typing import List, Optional
 
 from ninja.schema import Schema
 
-from .base import CategorySchema, PaginationSchema, TagsSchema
+from .base import CategorySchema, PaginationSchema, SparseSchema, TagsSchema
 
 
-class PostSchema(Schema):
+class PostSchema(SparseSchema):
     id: int
     category: Optional[CategorySchema] = None
     content: str
@@ -28,7 +28,7 @@ class PostSchema(Schema):
     view_count: int
 
 
-class PostCardSchema(Schema):
+class PostCardSchema(SparseSchema):
     id: int
     title: str
     slug: str
@@ -1,7 +1,7 @@
 """Sitemap schemas."""
 
 import datetime
-from typing import List
+from typing import List, Optional
 
 from ninja.schema import Schema
 from pydantic import Field, RootModel
@@ -21,3 +21,22 @@ class PostIdsForSitemap(RootModel):
 
     class Config:
         from_attributes = True
+
+
+class SitemapShardSchema(Schema):
+    model: str
+    shard: int
+    count: int
+    updated_at: Optional[datetime.datetime] = None
+
+
+class SitemapIndexSchema(Schema):
+    # the shard `n` is the objects with `n * shard_size <= id < (n + 1) * shard_size`
+    shard_size: int
+    sitemaps: List[SitemapShardSchema]
+
+
+class SitemapEntrySchema(Schema):
+    id: int
+    slug: Optional[str] = None
+    updated_at: datetime.datetime
@@ -0,0 +1,103 @@
+"""
+PG full-text search index of the posts.
+
+`Post.save` only increases `search_version`, the search vector is built by
+`api.tasks.update_post_search_vector_task` after the transaction commits, so
+the admin won't wait for jieba. The vector records the version it was built
+from (`search_indexed_version`), a post is stale while it's behind:
+
+    title       weight A
+    keywords    weight B
+    tags        weight B
+    body        weight D
+"""
+
+import logging
+
+from django.contrib.postgres.search import SearchVector
+from django.db.models import F, Value
+
+from api.content_analysis import analyze_content
+from api.models import Post
+
+__all__ = [
+    "tokenize",
+    "build_search_vector",
+    "update_search_vector",
+    "get_stale_posts",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text: str) -> str:
+    """cut by jieba, the same as the search query"""
+    import jieba
+
+    return " ".join(jieba.lcut(text, cut_all=True))
+
+
+def build_search_vector(
+    title: str, keywords: str, tags: list[str], body: str
+) -> SearchVector:
+    def weighted(text: str, weight: str) -> SearchVector:
+        return SearchVector(Value(text), weight=weight, config="simple")
+
+    return (
+        weighted(tokenize(title), "A")
+        + weighted(tokenize(keywords.replace(",", " ")), "B")
+        + weighted(tokenize(" ".join(tags)), "B")
+        + weighted(body, "D")
+    )
+
+
+def update_search_vector(post_id: int) -> bool:
+    """
+    build the search vector from the current post.
+
+    :return: False if the post is deleted, already up to date, or saved again
+        while building (the newer task will do it)
+    """
+
+    post = (
+        Post.objects.filter(pk=post_id)
+        .only(
+            "title",
+            "keywords",
+            "content_hash",
+            "tokenized_content",
+            "search_content_hash",
+            "search_version",
+            "search_indexed_version",
+        )
+        .first()
+    )
+    if post is None or post.search_indexed_version >= post.search_version:
+        return False
+
+    version = post.search_version
+    content_hash = post.search_content_hash
+    body = post.tokenized_content or ""
+    # only the title, keywords or tags changed, don't cut the body again
+    if not content_hash or content_hash != post.content_hash:
+        analysis = analyze_content(post.content)
+        body = analysis.tokenized
+        content_hash = analysis.content_hash
+    tags = list(post.tags.values_list("name", flat=True))
+
+    updated = Post.objects.filter(pk=post_id, search_version=version).update(
+        tokenized_content=body,
+        search_content_hash=content_hash,
+        pg_gin_search_vector=build_search_vector(
+            post.title, post.keywords or "", tags, body
+        ),
+        search_indexed_version=version,
+    )
+    if not updated:
+        logger.info(f"文章在索引时被修改, 跳过: post {post_id} v{version}")
+    return bool(updated)
+
+
+def get_stale_posts():
+    """the posts whose search vector is behind (e.g. the task failed)"""
+    return Post.objects.filter(search_indexed_version__lt=F("search_version"))
@@ -1,12 +1,17 @@
 import logging
 
 from django.db import transaction
-from django.db.models.signals import post_save, pre_save
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
-from django.utils import timezone
 
-from .markdown import markdown_to_html_frontend
-from .models import Anime, Gal, Post
+from .models import Anime, Category, Change, Comment, Gal, Page, Post, Tag
 
 logger = logging.getLogger(__name__)
 
@@ -73,50 +78,6 @@ def sync_with_jikan(sender, instance, **kwargs):
             logger.error(f"Failed to update Anime data({instance.mal_id}): {e}")
 
 
-@receiver(post_save, sender=Gal)
-def convert_gal_markdown_to_html(sender, instance, **kwargs):
-    try:
-        html = markdown_to_html_frontend(instance.review).html
-        instance.review_html = html
-        # Disconnect signal, avoid infinite loop
-        post_save.disconnect(convert_gal_markdown_to_html, sender=Gal)
-        instance.save(update_fields=["review_html"])
-        post_save.connect(
-            convert_gal_markdown_to_html, sender=Gal
-        )  # Reconnect after save
-    except Exception as e:
-        logger.error(f"Markdown conversion failed: {e}")
-
-
-@receiver(post_save, sender=Post)
-def convert_post_markdown_to_html(sender, instance, **kwargs):
-    try:
-        html = markdown_to_html_frontend(instance.content).html
-        post_save.disconnect(convert_post_markdown_to_html, sender=Post)
-        instance.content_html = html
-        instance.save(update_fields=["content_html"])
-        post_save.connect(convert_post_markdown_to_html, sender=Post)
-    except Exception as e:
-        logger.error(f"Markdown conversion failed: {e}")
-
-
-@receiver(pre_save, sender=Post)
-def update_content_update_at(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            old_instance = Post.objects.get(pk=instance.pk)
-            # content update
-            if old_instance.content != instance.content:
-                instance.content_update_at = timezone.now()
-            # 'content_update_at' not set
-            if instance.content_update_at is None:
-                instance.content_update_at = timezone.now()
-        except Post.DoesNotExist:
-            instance.content_update_at = timezone.now()
-    else:
-        instance.content_update_at = timezone.now()
-
-
 @receiver(post_save, sender=Post)
 def generate_post_embedding_async(sender, instance, created, **kwargs):
     from .tasks import generate_post_chunks_embedding_task
@@ -139,3 +100,249 @@ def generate_post_embedding_async(sender, instance, created, **kwargs):
         logger.error(
             f"Failed trigger embedding generate task, post ID {instance.pk}: {e}"
         )
+
+
+@receiver(post_save, sender=Post)
+def update_post_search_vector_async(sender, instance, **kwargs):
+    from .tasks import update_post_search_vector_task
+
+    # `Post.save` increases the version only if the search fields changed
+    if instance.search_indexed_version >= instance.search_version:
+        return
+
+    try:
+        transaction.on_commit(lambda: update_post_search_vector_task.delay(instance.pk))
+    except Exception as e:
+        logger.error(f"Failed trigger search vector task, post ID {instance.pk}: {e}")
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_post_search_vector_on_tags(sender, instance, action, reverse, **kwargs):
+    # the tags are weighted in the vector, 'reverse' is `tag.posts.add()`
+    if reverse or action not in ("post_add", "post_remove", "post_clear"):
+        return
+    # `tags.set()` sends the signals even if nothing changed
+    if action != "post_clear" and not kwargs.get("pk_set"):
+        return
+
+    _reindex_posts([instance.pk])
+    instance.refresh_from_db(fields=["search_version"])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def update_post_search_vector_on_tag(sender, instance, created=False, **kwargs):
+    # the name is in the vectors of the posts, before deleting the relations
+    # are still there, the task runs after they're gone
+    if created:
+        return
+    _reindex_posts(list(instance.posts.values_list("pk", flat=True)))
+
+
+def _reindex_posts(post_ids: list[int]) -> None:
+    """mark the vectors stale, and rebuild them after the commit"""
+    from .tasks import update_post_search_vector_task
+
+    if not post_ids:
+        return
+    Post.objects.filter(pk__in=post_ids).update(search_version=F("search_version") + 1)
+
+    def reindex():
+        for post_id in post_ids:
+            update_post_search_vector_task.delay(post_id)
+
+    transaction.on_commit(reindex)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Page)
+def refresh_keyword_idf(sender, instance, **kwargs):
+    from .tasks import schedule_keyword_idf_refresh
+
+    # e.g. `save(update_fields=["view_count"])`, the content is not changed
+    update_fields = kwargs.get("update_fields")
+    if update_fields and "content" not in update_fields:
+        return
+
+    try:
+        transaction.on_commit(schedule_keyword_idf_refresh)
+    except Exception as e:
+        logger.error(f"Failed schedule keyword IDF refresh: {e}")
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Gal)
+@receiver(post_save, sender=Anime)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Gal)
+@receiver(post_delete, sender=Anime)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Tag)
+def invalidate_pagination_counts(sender, **kwargs):
+    _invalidate_counts_on_commit(sender)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_pagination_counts_on_tags(sender, action, **kwargs):
+    # e.g. the count of the posts filtered by a tag
+    if action in ("post_add", "post_remove", "post_clear"):
+        _invalidate_counts_on_commit(Post, sender)
+
+
+def _invalidate_counts_on_commit(*models) -> None:
+    from .count_cache import invalidate_counts
+
+    def invalidate():
+        try:
+            invalidate_counts(*models)
+        except Exception as e:
+            names = ", ".join(model.__name__ for model in models)
+            logger.error(f"Failed invalidate counts of {names}: {e}")
+
+    # a count between the write and the commit is the old one, cached again
+    transaction.on_commit(invalidate)
+
+
+def _invalidate_post_responses(posts) -> None:
+    """the detail of the posts `[(id, slug), ...]` and the listings"""
+    from .response_cache import invalidate_post_responses
+
+    posts = list(posts)
+
+    def invalidate():
+        try:
+            invalidate_post_responses(posts)
+        except Exception as e:
+            logger.error(f"Failed invalidate post responses: {e}")
+
+    # a request between the write and the commit caches the old one again
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_response(sender, instance, **kwargs):
+    # the old slug if it's changed
+    _invalidate_post_responses(
+        [(instance.pk, instance.slug, instance.get_loaded_value("slug"))]
+    )
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_post_response_on_tags(sender, instance, action, reverse, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        _invalidate_post_responses([(instance.pk, instance.slug)])
+    elif pk_set := kwargs.get("pk_set"):
+        # `tag.posts.add()`
+        _invalidate_post_responses(
+            Post.objects.filter(pk__in=pk_set).values_list("pk", "slug")
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def invalidate_post_response_on_relations(sender, instance, **kwargs):
+    # before deleting, the relations are still there
+    if kwargs.get("created"):
+        return
+    _invalidate_post_responses(instance.posts.values_list("pk", "slug"))
+
+
+@receiver(post_save, sender=Gal)
+@receiver(post_delete, sender=Gal)
+def invalidate_gal_response(sender, instance, **kwargs):
+    from .response_cache import invalidate_response
+
+    gal_id = instance.pk
+
+    def invalidate():
+        try:
+            invalidate_response("gal", gal_id=gal_id)
+        except Exception as e:
+            logger.error(f"Failed invalidate gal response, gal ID {gal_id}: {e}")
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Page)
+@receiver(post_save, sender=Gal)
+@receiver(post_save, sender=Anime)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Page)
+@receiver(post_delete, sender=Gal)
+@receiver(post_delete, sender=Anime)
+def invalidate_sitemap_shard(sender, instance, **kwargs):
+    from .sitemap import invalidate_sitemap
+
+    pk = instance.pk
+
+    def invalidate():
+        try:
+            invalidate_sitemap(sender, pk)
+        except Exception as e:
+            logger.error(f"Failed invalidate sitemap of {sender.__name__} {pk}: {e}")
+
+    transaction.on_commit(invalidate)
+
+
+# === changes feed, in the transaction of the write ===
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Page)
+@receiver(post_save, sender=Gal)
+@receiver(post_save, sender=Anime)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Page)
+@receiver(post_delete, sender=Gal)
+@receiver(post_delete, sender=Anime)
+@receiver(post_delete, sender=Comment)
+def record_change(sender, instance, signal, created=False, **kwargs):
+    if signal is post_delete:
+        action = Change.Action.DELETED
+    else:
+        action = Change.Action.CREATED if created else Change.Action.UPDATED
+    Change.record(sender, [instance.pk], action)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+@receiver(m2m_changed, sender=Page.tags.through)
+def record_change_on_tags(sender, instance, action, reverse, model, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    # `tags.set()` sends the signals even if nothing changed
+    if action != "post_clear" and not kwargs.get("pk_set"):
+        return
+
+    if not reverse:
+        Change.record(type(instance), [instance.pk], Change.Action.UPDATED)
+    elif action != "post_clear":
+        # `tag.posts.add()`, the model is the posts or pages
+        Change.record(model, kwargs["pk_set"], Change.Action.UPDATED)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def record_change_on_relations(sender, instance, **kwargs):
+    # the name is in the posts and pages, before deleting the relations are there
+    if kwargs.get("created"):
+        return
+    for related in (instance.posts, instance.pages):
+        Change.record(
+            related.model, related.values_list("pk", flat=True), Change.Action.UPDATED
+        )
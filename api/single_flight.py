@@ -0,0 +1,163 @@
+"""
+Coalesce the concurrent cache misses of the same key.
+
+In a worker, the callers of a key in flight await the same future. Across the
+workers, a Redis lock (`cache.add`) elects the one which computes, the others
+poll `check` (usually reading the cache the leader writes) until the value is
+there or the lock is released:
+
+    value = await single_flight(key, compute, check=read_cache)
+
+`cached_single_flight` is a get-or-compute on top of it, an expired value is
+still returned within the stale window while one caller refreshes it in the
+background (stale-while-revalidate).
+"""
+
+import asyncio
+import contextlib
+import logging
+import secrets
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
+
+from django.core.cache import cache
+
+__all__ = ["single_flight", "cached_single_flight"]
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LOCK_TIMEOUT = 30  # seconds, longer than the slowest computation
+POLL_INTERVAL = 0.05
+
+_in_flight: dict[str, asyncio.Task] = {}
+_refreshing: set[str] = set()
+# keep a reference, the event loop only keeps a weak one
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _lock_key(key: str) -> str:
+    return f"single_flight:{key}"
+
+
+async def _wait_for_leader(
+    key: str, check: Callable[[], Awaitable[Any]], deadline: float
+) -> Any:
+    """the value of `check`, or None if the lock is released or timed out"""
+    while time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        if (value := await check()) is not None:
+            return value
+        if not await cache.ahas_key(_lock_key(key)):
+            return None
+    return None
+
+
+@contextlib.asynccontextmanager
+async def _redis_lock(key: str, timeout: int):
+    """try to take the lock of the key across the workers, yield if it's taken"""
+    lock_key = _lock_key(key)
+    token = secrets.token_hex(8)
+    acquired = await cache.aadd(lock_key, token, timeout=timeout)
+    try:
+        yield acquired
+    finally:
+        # not atomic, at worst the lock of the next leader is released early
+        if acquired and await cache.aget(lock_key) == token:
+            await cache.adelete(lock_key)
+
+
+async def _lead(
+    key: str,
+    compute: Callable[[], Awaitable[T]],
+    check: Callable[[], Awaitable[T | None]] | None,
+    lock_timeout: int,
+) -> T:
+    deadline = time.monotonic() + lock_timeout
+    while True:
+        async with _redis_lock(key, lock_timeout) as acquired:
+            if acquired:
+                return await compute()
+
+        if check is None:
+            return await compute()
+        if time.monotonic() >= deadline:
+            # the leader is gone or too slow
+            logger.warning(f"Single flight wait timeout: {key}")
+            return await compute()
+        # another worker is computing it
+        if (value := await _wait_for_leader(key, check, deadline)) is not None:
+            return value
+        # released without a value, e.g. it failed, try to take it
+
+
+async def _refresh(key: str, refresh: Callable[[], Awaitable[Any]]) -> None:
+    """refresh in the background, skip if any worker is refreshing it"""
+    try:
+        async with _redis_lock(key, LOCK_TIMEOUT) as acquired:
+            if acquired:
+                await refresh()
+    except Exception as e:
+        logger.error(f"Failed refresh {key}: {e}")
+    finally:
+        _refreshing.discard(key)
+
+
+async def single_flight(
+    key: str,
+    compute: Callable[[], Awaitable[T]],
+    *,
+    check: Callable[[], Awaitable[T | None]] | None = None,
+    lock_timeout: int = LOCK_TIMEOUT,
+) -> T:
+    """
+    run `compute` once for the concurrent callers of the key.
+
+    :param compute: stores the value where `check` reads it, if any
+    :param check: read the value computed by another worker, None if not yet.
+        Without it, the callers in other workers compute it themselves.
+    """
+
+    if (task := _in_flight.get(key)) is None:
+        # a task of its own, a caller (e.g. the client disconnects) cancelled
+        # doesn't cancel the others
+        task = asyncio.ensure_future(_lead(key, compute, check, lock_timeout))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def cached_single_flight(
+    key: str,
+    compute: Callable[[], Awaitable[T]],
+    *,
+    timeout: int,
+    stale_timeout: int = 0,
+) -> T:
+    """
+    get the value from the cache, or compute it once.
+
+    :param timeout: the value is fresh in the seconds
+    :param stale_timeout: the value is still returned in the seconds after it
+        expired, and refreshed in the background
+    """
+
+    async def read() -> dict | None:
+        return await cache.aget(key)
+
+    async def refresh() -> dict:
+        entry = {"value": await compute(), "fresh_until": time.time() + timeout}
+        await cache.aset(key, entry, timeout=timeout + stale_timeout)
+        return entry
+
+    entry = await read()
+    if entry is None:
+        entry = await single_flight(key, refresh, check=read)
+    elif entry["fresh_until"] < time.time() and key not in _refreshing:
+        _refreshing.add(key)
+        task = asyncio.create_task(_refresh(key, refresh))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return entry["value"]
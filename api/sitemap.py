@@ -0,0 +1,141 @@
+"""
+Sitemap data of the posts, pages, gals and anime, sharded by the id:
+
+    index   {"shard_size": 5000, "sitemaps": [{"model", "shard", "count", ...}]}
+    shard   [{"id": 1, "slug": "hello", "updated_at": "..."}, ...]
+
+The shard `n` of a model is the objects with `n * size <= id < (n + 1) * size`
+(`SITEMAP_SHARD_SIZE` in the settings), a save only changes its own shard. The
+rendered JSON is cached and invalidated by the save and delete signals (see
+'api/signals.py'). A missed shard is streamed while it's read from the
+database, and cached once it's complete, unless it was invalidated meanwhile
+(see `api.response_cache.afill`).
+"""
+
+from collections.abc import AsyncIterator
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.models import Count, F, Max
+from django.http import HttpResponse, StreamingHttpResponse
+
+from api.models import Anime, Gal, Page, Post
+from api.renderers import dumps
+from api.response_cache import afill, invalidate_keys
+from api.streaming import STREAM_CHUNK_SIZE, iter_json_array
+
+__all__ = [
+    "SITEMAP_SOURCES",
+    "sitemap_index_response",
+    "sitemap_shard_response",
+    "invalidate_sitemap",
+]
+
+SITEMAP_TIMEOUT = 60 * 60 * 24  # 1 day, invalidated by the signals anyway
+
+
+class SitemapSource(NamedTuple):
+    model: type[models.Model]
+    # the field of `updated_at`, e.g. a post is only updated by the content
+    lastmod: str
+    fields: tuple[str, ...] = ()
+
+
+SITEMAP_SOURCES: dict[str, SitemapSource] = {
+    "post": SitemapSource(Post, "content_update_at", ("slug",)),
+    "page": SitemapSource(Page, "updated_at", ("slug",)),
+    "gal": SitemapSource(Gal, "updated_at"),
+    "anime": SitemapSource(Anime, "updated_at"),
+}
+
+
+def _shard_size() -> int:
+    return settings.SITEMAP_SHARD_SIZE
+
+
+def _index_key() -> str:
+    return f"sitemap:{_shard_size()}:index"
+
+
+def _shard_key(name: str, shard: int) -> str:
+    return f"sitemap:{_shard_size()}:{name}:{shard}"
+
+
+def invalidate_sitemap(model: type[models.Model], pk: int) -> None:
+    """invalidate the shard of the object and the index"""
+    name = model._meta.model_name
+    invalidate_keys(
+        [_index_key(), _shard_key(name, pk // _shard_size())], timeout=SITEMAP_TIMEOUT
+    )
+
+
+def _json_response(body: bytes) -> HttpResponse:
+    return HttpResponse(body, content_type="application/json")
+
+
+async def sitemap_index_response() -> HttpResponse:
+    # bytes, or a tombstone of the invalidation
+    if isinstance(seen := await cache.aget(_index_key()), bytes):
+        return _json_response(seen)
+
+    size, sitemaps = _shard_size(), []
+    for name, source in SITEMAP_SOURCES.items():
+        shards = (
+            source.model.objects.annotate(shard=F("id") / size)
+            .values("shard")
+            .annotate(count=Count("id"), lastmod=Max(source.lastmod))
+            .order_by("shard")
+            .values_list("shard", "count", "lastmod")
+        )
+        sitemaps += [
+            {"model": name, "shard": shard, "count": count, "updated_at": lastmod}
+            async for shard, count, lastmod in shards
+        ]
+
+    body = dumps({"shard_size": size, "sitemaps": sitemaps})
+    await afill(_index_key(), seen, body, timeout=SITEMAP_TIMEOUT)
+    return _json_response(body)
+
+
+def _shard_rows(source: SitemapSource, shard: int):
+    size = _shard_size()
+    return (
+        source.model.objects.filter(id__gte=shard * size, id__lt=(shard + 1) * size)
+        .order_by("id")
+        # named, the plain tuples of `aiterator` run the query in the event loop
+        .values_list("id", *source.fields, source.lastmod, named=True)
+    )
+
+
+async def _stream_shard(
+    key: str, seen, names: tuple[str, ...], rows
+) -> AsyncIterator[bytes]:
+    entries = (
+        dict(zip(names, row))
+        async for row in rows.aiterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+    parts = []
+    async for part in iter_json_array(entries):
+        parts.append(part)
+        yield part
+
+    # complete, a disconnected client closes the generator before here
+    await afill(key, seen, b"".join(parts), timeout=SITEMAP_TIMEOUT)
+
+
+async def sitemap_shard_response(
+    name: str, shard: int
+) -> HttpResponse | StreamingHttpResponse:
+    key = _shard_key(name, shard)
+    if isinstance(seen := await cache.aget(key), bytes):
+        return _json_response(seen)
+
+    source = SITEMAP_SOURCES[name]
+    # `lastmod` is renamed, e.g. `values(updated_at=F(...))` can't shadow a field
+    names = ("id", *source.fields, "updated_at")
+    return StreamingHttpResponse(
+        _stream_shard(key, seen, names, _shard_rows(source, shard)),
+        content_type="application/json",
+    )
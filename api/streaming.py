@@ -0,0 +1,61 @@
+"""
+Streamed JSON of the large listings, e.g. all the ids.
+
+The rows are read with a server-side cursor (`aiterator`) and rendered chunk
+by chunk, the memory of a request doesn't grow with the table and the first
+bytes are sent before the last rows are read.
+"""
+
+from collections.abc import AsyncIterable, AsyncIterator
+
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+
+from api.renderers import dumps
+
+__all__ = ["STREAM_CHUNK_SIZE", "iter_json_array", "stream_json"]
+
+# the rows fetched from the cursor and rendered at once
+STREAM_CHUNK_SIZE = 2000
+
+
+async def iter_json_array(
+    rows: AsyncIterable, chunk_size: int = STREAM_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """the JSON array of the rows, in parts of `chunk_size` rows"""
+    chunk, separator = [], b""
+
+    yield b"["
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            # the items of the rendered list, without the brackets
+            yield separator + dumps(chunk)[1:-1]
+            chunk.clear()
+            separator = b","
+    if chunk:
+        yield separator + dumps(chunk)[1:-1]
+    yield b"]"
+
+
+async def _wrap(prefix: bytes, parts: AsyncIterator[bytes], suffix: bytes):
+    yield prefix
+    async for part in parts:
+        yield part
+    yield suffix
+
+
+def stream_json(
+    queryset: QuerySet, key: str | None = None, chunk_size: int = STREAM_CHUNK_SIZE
+) -> StreamingHttpResponse:
+    """
+    stream the rows of the queryset, e.g. `values_list("id", flat=True)`.
+
+    :param key: the array is the value of the key in an object, e.g.
+        `{"ids": [...]}`, or the body itself
+    """
+
+    parts = iter_json_array(queryset.aiterator(chunk_size=chunk_size), chunk_size)
+    if key is not None:
+        parts = _wrap(b"{" + dumps(key) + b":", parts, b"}")
+    return StreamingHttpResponse(parts, content_type="application/json")
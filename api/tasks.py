@@ -1,19 +1,30 @@
 import logging
+from datetime import timedelta
 
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import mail_admins
 from django.db import transaction
 from django.utils import timezone
 
-from .ml_model import get_ml_model
-from .models import Gal, Post, PostChunk
-from .text_chunking import chunk_text
+from .content_analysis import analyze_content
+from .ml_model import get_embedding_model_name, get_ml_model
+from .models import Change, EmbeddingIndex, Gal, Post, PostChunk
+from .text_chunking import Chunker, ChunkingConfig, TextChunker, TokenChunker
 from .vndb import query_vn
 
 logger = logging.getLogger(__name__)
 
 
 UPDATE_VNDB_INTERVAL: int = 60 * 60 * 24 * 7  # Updated every 7 days
+# keep the retired vectors for a while after cutover, the searches started
+# before it still read them
+PRUNE_EMBEDDING_DELAY: int = 60 * 60 * 24  # 1 day
+# batch the saves in a short time into one refresh
+KEYWORD_IDF_REFRESH_DELAY: int = 60
+# the changes feed serves the cursors in it, the older ones rebuild everything
+CHANGES_RETENTION: int = 60 * 60 * 24 * 30  # 30 days
 
 
 # TODO: updated field configable
@@ -69,30 +80,98 @@ def mail_admins_task(subject: str, message: str):
         logging.warning(f"Mail admin failed: {e}")
 
 
+# token chunkers keep the per-sentence token counts, reuse them between posts
+_token_chunkers: dict[str, TokenChunker] = {}
+
+
+def _get_chunker(embedding_model: str, chunker: str = None) -> Chunker:
+    """
+    :param chunker: "text" counts characters, "token" fills the context window
+        of the model. `settings.EMBEDDING_CHUNKER` by default
+    """
+    chunker = chunker or settings.EMBEDDING_CHUNKER
+    if chunker == "text":
+        return TextChunker()
+    if chunker != "token":
+        raise ValueError(f"Unknown chunker: {chunker}")
+
+    if (token_chunker := _token_chunkers.get(embedding_model)) is None:
+        tokenizer = get_ml_model(embedding_model).get_tokenizer()
+        size = tokenizer.max_tokens
+        token_chunker = TokenChunker(
+            tokenizer, ChunkingConfig(size=size, overlap=size // 10)
+        )
+        _token_chunkers[embedding_model] = token_chunker
+    return token_chunker
+
+
 @shared_task
-@transaction.atomic
-def generate_post_chunks_embedding_task(post_id: int):
-    post = Post.objects.get(id=post_id)
+def generate_post_chunks_embedding_task(
+    post_id: int, embedding_model: str = None, chunker: str = None
+):
+    """
+    Generate the chunk embeddings of a post.
+
+    Write all the models which are in use (serving and shadow) by default,
+    so the shadow index won't fall behind while it's building.
+    """
+    from .embedding_index import ensure_serving_index, get_writing_models
+
+    # the content is only loaded if the chunks need to rebuild
+    post = Post.objects.defer("content", "content_html", "tokenized_content").get(
+        id=post_id
+    )
+
+    if embedding_model:
+        models = [embedding_model]
+    else:
+        # the first embedding of a fresh database starts serving the search
+        ensure_serving_index()
+        models = get_writing_models()
+    for model_name in models:
+        # an explicit chunker always rebuilds, e.g. switching the chunker
+        if chunker is None and _chunks_up_to_date(post, model_name):
+            logger.info(f"跳过未修改的文章: post {post_id}, {model_name}")
+            continue
+        _replace_post_chunks(post, model_name, chunker)
+
+
+def _chunks_up_to_date(post: Post, embedding_model: str) -> bool:
+    """all chunks of the model are built from the current content"""
+    built_from = set(
+        post.chunks.filter(embedding_model=embedding_model)
+        .values_list("post_content_hash", flat=True)
+        .distinct()
+    )
+    return bool(post.content_hash) and built_from == {post.content_hash}
 
-    # clean old chunk
-    post.chunks.all().delete()
 
-    text_chunks = chunk_text(post.content)
+@transaction.atomic
+def _replace_post_chunks(post: Post, embedding_model: str, chunker: str = None):
+    # clean old chunk
+    post.chunks.filter(embedding_model=embedding_model).delete()
 
+    analysis = analyze_content(post.content)
+    text_chunks = _get_chunker(embedding_model, chunker).chunk_normalized(
+        analysis.sections
+    )
     if not text_chunks:
         return
 
-    model = get_ml_model()
-    vectors = model.embed_documents(text_chunks)
+    model = get_ml_model(embedding_model)
+    vectors = model.embed_documents([chunk.text for chunk in text_chunks])
 
     new_chunks = []
-    for i, (content, vector) in enumerate(zip(text_chunks, vectors, strict=True)):
+    for i, (chunk, vector) in enumerate(zip(text_chunks, vectors, strict=True)):
         new_chunks.append(
             PostChunk(
                 post=post,
-                content=content,
+                content=chunk.text,
                 embedding=vector,
+                embedding_model=embedding_model,
                 chunk_index=i,
+                heading_path=list(chunk.heading_path),
+                post_content_hash=analysis.content_hash,
             )
         )
 
@@ -100,12 +179,146 @@ def generate_post_chunks_embedding_task(post_id: int):
 
 
 @shared_task
-def generate_search_embedding_task(query: str):
+def build_embedding_index_task(embedding_model: str = None):
+    """
+    Build a shadow embedding index in the background.
+
+    The serving index keeps working until `api.embedding_index.cutover`.
+    """
+    from .embedding_index import create_vector_index
+
+    embedding_model = embedding_model or get_embedding_model_name()
+    index, _ = EmbeddingIndex.objects.get_or_create(embedding_model=embedding_model)
+    if index.status == "retired":
+        index.status = "building"
+        index.retired_at = None
+        index.save(update_fields=["status", "retired_at", "updated_at"])
+
+    # resumable, skip the posts which already have chunks of this model
+    post_ids = Post.objects.exclude(
+        chunks__embedding_model=embedding_model
+    ).values_list("id", flat=True)
+    for post_id in post_ids.iterator():
+        try:
+            post = Post.objects.get(id=post_id)
+            _replace_post_chunks(post, embedding_model)
+        except Exception as e:
+            logger.error(f"构建嵌入索引失败: post {post_id}, {embedding_model}: {e}")
+            raise
+
+    chunk = PostChunk.objects.filter(embedding_model=embedding_model).first()
+    if chunk is None:
+        logger.warning(f"没有可索引的文章: {embedding_model}")
+        return
+
+    index.dimensions = len(chunk.embedding)
+    create_vector_index(embedding_model, index.dimensions)
+
+    if index.status == "building":
+        index.status = "ready"
+    index.save(update_fields=["dimensions", "status", "updated_at"])
+    logger.info(f"嵌入索引构建完成: {embedding_model}")
+
+
+@shared_task
+def prune_embedding_models_task():
+    """
+    Celery task to delete vectors of the embedding models retired longer than
+    `PRUNE_EMBEDDING_DELAY`. Run by the beat hourly (registered by the
+    migration 0062).
+    """
+    from .embedding_index import prune_retired_models
+
+    return prune_retired_models(
+        timezone.now() - timedelta(seconds=PRUNE_EMBEDDING_DELAY)
+    )
+
+
+@shared_task
+def prune_changes_task():
+    """
+    Celery task to delete the changes feed log older than `CHANGES_RETENTION`.
+    Run by the beat daily (registered by the migration 0059).
+    """
+    expired = timezone.now() - timedelta(seconds=CHANGES_RETENTION)
+    expired_changes = Change.objects.filter(created_at__lt=expired)
+    # the latest one is kept, an empty log would serve the cursor `0` and the
+    # next change would expire it
+    latest = Change.objects.filter(cursor__isnull=False).order_by("-cursor").first()
+    if latest is not None:
+        expired_changes = expired_changes.exclude(pk=latest.pk)
+    deleted, _ = expired_changes.delete()
+    logger.info(f"清理变更记录: {deleted} 条")
+    return deleted
+
+
+@shared_task
+def assign_change_cursors_task():
+    """
+    Celery task to number the changes missed after the commit of the write,
+    e.g. the worker was killed. Run by the beat every minute (registered by the
+    migration 0060).
+    """
+    Change.assign_cursors()
+
+
+def schedule_keyword_idf_refresh():
+    """debounced, only one refresh is scheduled in `KEYWORD_IDF_REFRESH_DELAY`"""
+    if cache.add("keyword_idf:scheduled", 1, timeout=KEYWORD_IDF_REFRESH_DELAY):
+        refresh_keyword_idf_task.apply_async(countdown=KEYWORD_IDF_REFRESH_DELAY)
+
+
+@shared_task
+def refresh_keyword_idf_task():
+    """
+    Celery task to refresh the keyword IDF table with the changed posts.
+    """
+    from .keywords import refresh_idf_table
+
+    # the table version must be increased one by one
+    if not cache.add("keyword_idf:lock", 1, timeout=60 * 10):
+        # the running one may have read the documents before the change
+        logger.info("IDF 表正在更新, 稍后重试")
+        schedule_keyword_idf_refresh()
+        return False
+    try:
+        return refresh_idf_table()
+    finally:
+        cache.delete("keyword_idf:lock")
+
+
+@shared_task
+def update_post_search_vector_task(post_id: int):
+    """
+    Celery task to build the PG full-text search vector of a post.
+    """
+    from .search_index import update_search_vector
+
+    return update_search_vector(post_id)
+
+
+@shared_task
+def reindex_stale_search_vectors_task():
+    """
+    Celery task to rebuild the search vectors which are behind the posts,
+    e.g. the worker was down while saving. Run by the beat every 10 minutes
+    (registered by the migration 0058).
+    """
+    from .search_index import get_stale_posts, update_search_vector
+
+    post_ids = get_stale_posts().values_list("id", flat=True)
+    count = sum(update_search_vector(post_id) for post_id in post_ids.iterator())
+    logger.info(f"重建全文搜索索引: {count} 篇文章")
+    return count
+
+
+@shared_task
+def generate_search_embedding_task(query: str, embedding_model: str = None):
     """
     Celery task to generate embedding for search query.
     """
     try:
-        model = get_ml_model()
+        model = get_ml_model(embedding_model)
         return model.embed_query(query)
     except Exception as e:
         logger.error(f"生成搜索 embedding 失败: {query[:50]}, 错误: {e}")
@@ -1,8 +1,9 @@
-import json
+from unittest.mock import patch
 
+from django.core.cache import cache
 from django.test import AsyncClient, TestCase, override_settings
 
-from api.auth import TimeBaseAuth
+from api.auth import AsyncTimeBaseAuth, SyncTimeBaseAuth, TimeBaseAuth, get_keyring
 
 
 @override_settings(SECURE_SSL_REDIRECT=False)
@@ -19,9 +20,8 @@ class TestAuth(TestCase):
             "/api/auth/me",
             HTTP_AUTHORIZATION=f"Bearer {token}",
         )
-        self.assertContains(
-            response, json.dumps({"client_id": "test_client_114"}), status_code=200
-        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"client_id": "test_client_114"})
 
     async def test_async_auth(self):
         async_client = AsyncClient()
@@ -35,3 +35,63 @@ class TestAuth(TestCase):
             headers={"Authorization": f"Bearer {token}"},
         )
         self.assertEqual(response.status_code, 200)
+
+
+@override_settings(
+    API_KEY="shared",
+    API_KEY_FALLBACKS=["old shared"],
+    API_CLIENT_KEYS={"worker": ["new", "old"]},
+)
+class TestKeyring(TestCase):
+    def test_shared_key(self):
+        token = TimeBaseAuth.create_token("frontend", "n1")
+        self.assertEqual(TimeBaseAuth.decrypt_token(token), ("frontend", "n1"))
+
+    def test_client_keys_and_rotation(self):
+        token = TimeBaseAuth.create_token("worker", "n1")
+        self.assertTrue(token.startswith("worker."))
+        self.assertEqual(TimeBaseAuth.decrypt_token(token), ("worker", "n1"))
+
+        # signed by the old key of the client
+        with override_settings(API_CLIENT_KEYS={"worker": ["old"]}):
+            old_token = TimeBaseAuth.create_token("worker", "n2")
+        self.assertEqual(TimeBaseAuth.decrypt_token(old_token), ("worker", "n2"))
+
+        # and by the old shared key
+        with override_settings(API_KEY="old shared"):
+            old_token = TimeBaseAuth.create_token("frontend", "n3")
+        self.assertEqual(TimeBaseAuth.decrypt_token(old_token), ("frontend", "n3"))
+
+    def test_impersonation_rejected(self):
+        # the shared key can't sign for a client with its own keys
+        with override_settings(API_CLIENT_KEYS={}):
+            token = TimeBaseAuth.create_token("worker", "n1")
+        self.assertIsNone(TimeBaseAuth.decrypt_token(token))
+
+        # the prefix must match the payload
+        token = TimeBaseAuth.create_token("worker", "n1")
+        self.assertIsNone(TimeBaseAuth.decrypt_token("other" + token[len("worker") :]))
+
+    def test_keyring_loaded_once(self):
+        self.assertIs(get_keyring(), get_keyring())
+
+    def test_replay_rejected(self):
+        token = TimeBaseAuth.create_token("worker")
+        self.assertEqual(SyncTimeBaseAuth().authenticate(None, token), "worker")
+        self.assertIsNone(SyncTimeBaseAuth().authenticate(None, token))
+
+    async def test_async_replay_rejected(self):
+        token = TimeBaseAuth.create_token("worker")
+        self.assertEqual(await AsyncTimeBaseAuth.authenticate(None, token), "worker")
+        self.assertIsNone(await AsyncTimeBaseAuth.authenticate(None, token))
+
+    @patch("api.auth.MAX_NONCES_PER_CLIENT", 1)
+    def test_too_many_nonces_rejected(self):
+        cache.delete("auth_nonce:busy")
+        self.addCleanup(cache.delete, "auth_nonce:busy")
+        self.assertIsNotNone(
+            SyncTimeBaseAuth().authenticate(None, TimeBaseAuth.create_token("busy"))
+        )
+        self.assertIsNone(
+            SyncTimeBaseAuth().authenticate(None, TimeBaseAuth.create_token("busy"))
+        )
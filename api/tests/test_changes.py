@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.models import Category, Change, Page, Post
+from api.tasks import prune_changes_task
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ChangesFeedTest(TestCase):
+    def setUp(self):
+        # the sequence isn't reset between the tests, start after a change
+        with self.captureOnCommitCallbacks(execute=True):
+            Page.objects.create(title="start", content="content")
+        self.cursor = self.client.get("/api/changes/").json()["cursor"]
+
+    def changes(self, since=None, **params):
+        # the on commit hook of the writes, a `TestCase` never commits
+        Change.assign_cursors()
+        response = self.client.get(
+            "/api/changes/",
+            {"since": self.cursor if since is None else since, **params},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_created_updated_deleted(self):
+        post = Post.objects.create(title="feed", content="content", slug="feed-post")
+        post.title = "renamed"
+        post.save()
+        page = Page.objects.create(title="page", content="content")
+        post_id = post.pk
+        post.delete()
+
+        data = self.changes()
+        self.assertEqual(
+            [(c["model"], c["id"], c["action"]) for c in data["changes"]],
+            [
+                ("post", post_id, "created"),
+                ("post", post_id, "updated"),
+                ("page", page.pk, "created"),
+                ("post", post_id, "deleted"),
+            ],
+        )
+        self.assertFalse(data["has_more"])
+        # nothing after the returned cursor
+        self.assertEqual(self.changes(data["cursor"])["changes"], [])
+
+    def test_category_rename_updates_posts(self):
+        category = Category.objects.create(name="feed")
+        post = Post.objects.create(
+            title="feed", content="content", slug="feed-post", category=category
+        )
+        cursor = self.changes()["cursor"]
+
+        category.name = "renamed"
+        category.save()
+        changes = self.changes(cursor)["changes"]
+        self.assertEqual([(c["model"], c["id"]) for c in changes], [("post", post.pk)])
+
+    def test_numbered_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            page = Page.objects.create(title="committed", content="content")
+        Page.objects.create(title="pending", content="content")
+
+        # the feed doesn't number the pending one
+        response = self.client.get("/api/changes/", {"since": self.cursor})
+        self.assertEqual([c["id"] for c in response.json()["changes"]], [page.pk])
+
+    def test_limit(self):
+        for i in range(3):
+            Page.objects.create(title=f"page {i}", content="content")
+
+        first = self.changes(limit=2)
+        self.assertEqual(len(first["changes"]), 2)
+        self.assertTrue(first["has_more"])
+        second = self.changes(first["cursor"], limit=2)
+        self.assertEqual(len(second["changes"]), 1)
+        self.assertFalse(second["has_more"])
+
+    def test_cursor_in_commit_order(self):
+        page = Page.objects.create(title="first", content="content")
+        cursor = self.changes()["cursor"]
+
+        # a slower transaction with a smaller id, committed after the cursor
+        late = Change.objects.order_by("id").first().id - 1
+        Change.objects.create(
+            id=late, model="page", object_id=page.pk, action="updated"
+        )
+        changes = self.changes(cursor)["changes"]
+        self.assertEqual(
+            [(c["id"], c["action"]) for c in changes], [(page.pk, "updated")]
+        )
+
+    def test_expired_cursor(self):
+        Page.objects.create(title="new", content="content")
+        Change.assign_cursors()
+        # the page of `setUp`
+        old = Change.objects.order_by("cursor").first()
+        Change.objects.filter(pk=old.pk).update(
+            created_at=old.created_at - timedelta(days=31)
+        )
+        self.assertEqual(prune_changes_task(), 1)
+
+        response = self.client.get("/api/changes/", {"since": old.cursor - 1})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(len(self.changes(old.cursor)["changes"]), 1)
+
+    def test_cursor_without_gap(self):
+        # consecutive, a cursor is expired by the one before the oldest kept
+        for title in ("first", "second"):
+            Page.objects.create(title=title, content="content")
+            Change.assign_cursors()
+        cursors = list(
+            Change.objects.order_by("cursor").values_list("cursor", flat=True)
+        )
+        self.assertEqual(cursors, list(range(cursors[0], cursors[0] + 3)))
+
+    def test_prune_keeps_latest(self):
+        Change.objects.update(created_at=timezone.now() - timedelta(days=31))
+        prune_changes_task()
+
+        # an empty log would serve the cursor `0`
+        self.assertEqual(self.changes()["cursor"], self.cursor)
+        self.assertEqual(Change.objects.count(), 1)
@@ -79,3 +79,20 @@ class TestComment(TestCase):
 
         response = self.client.get("/api/comment/post/99999/ids")
         self.assertEqual(response.status_code, 404)
+
+    def test_comments_batch(self):
+        post = Post.objects.get(title="comment test")
+        guest = Guest.objects.get(unique_id="myself-114514")
+        first, second = (
+            Comment.objects.create(content=f"batch {i}", post=post, guest=guest)
+            for i in range(2)
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/comment/batch", {"ids": f"{second.pk},{first.pk}"}
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([c["id"] for c in data], [second.pk, first.pk])
+        self.assertEqual(data[0]["guest_name"], "test-user")
@@ -0,0 +1,76 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from api import content_analysis
+from api.content_analysis import analyze_content
+from api.utils import extract_metadata
+
+CONTENT = """
+---
+title: Test Post
+tags: [python, django]
+---
+
+# 安装
+
+some **bold** text and [link](https://example.com)
+
+```python
+print("ciallo")
+```
+"""
+
+
+class ContentAnalysisTest(TestCase):
+    def setUp(self):
+        content_analysis._cache.clear()
+
+    def test_analyze_content(self):
+        analysis = analyze_content(CONTENT)
+
+        self.assertEqual(analysis.front_matter["title"], "Test Post")
+        self.assertIn("<strong>bold</strong>", analysis.html)
+        self.assertNotIn("title:", analysis.html)
+        self.assertEqual(analysis.text, "安装\n\nsome bold text and link")
+        self.assertEqual(analysis.sections[0].heading_path, ("安装",))
+        self.assertNotIn("print", analysis.tokenized)
+
+        metadata = analysis.metadata()
+        self.assertEqual(metadata["title"], "Test Post")
+        self.assertEqual(metadata["tags"], ["python", "django"])
+
+    def test_parse_once(self):
+        with patch.object(
+            content_analysis, "_analyze", wraps=content_analysis._analyze
+        ) as analyze:
+            # admin form, `Post.save` and the signals
+            extract_metadata(CONTENT)
+            extract_metadata(CONTENT)
+            analyze_content(CONTENT).html
+
+        analyze.assert_called_once()
+
+    def test_evicts_least_recently_used(self):
+        with patch.object(content_analysis, "CACHE_SIZE", 2):
+            first = analyze_content("first")
+            second = analyze_content("second")
+            analyze_content("first")
+            third = analyze_content("third")
+
+        self.assertEqual(
+            list(content_analysis._cache), [first.content_hash, third.content_hash]
+        )
+        self.assertNotIn(second.content_hash, content_analysis._cache)
+
+    def test_metadata_does_not_share_tags(self):
+        analysis = analyze_content(CONTENT)
+        analysis.metadata()["tags"].append("changed")
+
+        self.assertEqual(analysis.metadata()["tags"], ["python", "django"])
+
+    def test_invalid_front_matter(self):
+        analysis = analyze_content("---\ninvalid: yaml: here\n---\ncontent")
+
+        self.assertEqual(analysis.front_matter, {})
+        self.assertEqual(analysis.text, "content")
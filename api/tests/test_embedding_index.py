@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.embedding_index import (
+    cutover,
+    ensure_serving_index,
+    get_serving_index,
+    get_writing_models,
+    prune_retired_models,
+)
+from api.models import EmbeddingIndex, Post, PostChunk
+
+CONFIGURED = "remote:configured-model"
+
+
+@override_settings(
+    USE_REMOTE_EMBEDDING=True, REMOTE_EMBEDDING_MODEL_NAME="configured-model"
+)
+class EmbeddingIndexTest(TestCase):
+    def setUp(self):
+        # the serving index of the migration 0063
+        EmbeddingIndex.objects.all().delete()
+        self.post = Post.objects.create(
+            title="embedding", content="embedding content", slug="embedding"
+        )
+
+    def _chunk(self, embedding_model: str, dimensions: int = 3):
+        return PostChunk.objects.create(
+            post=self.post,
+            content="embedding content",
+            embedding=[0.1] * dimensions,
+            embedding_model=embedding_model,
+            chunk_index=0,
+        )
+
+    def test_no_serving_index_before_first_embedding(self):
+        self.assertIsNone(get_serving_index())
+
+        ensure_serving_index()
+        index = get_serving_index()
+        self.assertEqual(index.embedding_model, CONFIGURED)
+        self.assertIsNotNone(index.pk)
+
+    @override_settings(REMOTE_EMBEDDING_MODEL_NAME="changed-model")
+    def test_changed_model_name_keeps_serving_index(self):
+        EmbeddingIndex.objects.create(embedding_model=CONFIGURED, status="serving")
+
+        ensure_serving_index()
+        self.assertEqual(get_serving_index().embedding_model, CONFIGURED)
+        self.assertEqual(EmbeddingIndex.objects.count(), 1)
+
+    def test_writing_models_include_shadow_and_configured(self):
+        EmbeddingIndex.objects.create(embedding_model="local:old", status="serving")
+        EmbeddingIndex.objects.create(embedding_model="local:new", status="building")
+        EmbeddingIndex.objects.create(embedding_model="local:gone", status="retired")
+
+        self.assertCountEqual(
+            get_writing_models(), ["local:old", "local:new", CONFIGURED]
+        )
+
+    def test_cutover_switches_serving_index(self):
+        EmbeddingIndex.objects.create(embedding_model="local:old", status="serving")
+        EmbeddingIndex.objects.create(
+            embedding_model="local:new", status="ready", dimensions=3
+        )
+
+        index = cutover("local:new")
+
+        self.assertEqual(index.status, "serving")
+        self.assertIsNotNone(index.activated_at)
+        self.assertEqual(get_serving_index().embedding_model, "local:new")
+        old = EmbeddingIndex.objects.get(embedding_model="local:old")
+        self.assertEqual(old.status, "retired")
+        self.assertIsNotNone(old.retired_at)
+
+    def test_cutover_rejects_unfinished_index(self):
+        EmbeddingIndex.objects.create(embedding_model="local:new", status="building")
+
+        with self.assertRaises(ValueError):
+            cutover("local:new")
+        self.assertFalse(EmbeddingIndex.objects.filter(status="serving").exists())
+
+    def test_prune_only_deletes_retired_vectors(self):
+        now = timezone.now()
+        EmbeddingIndex.objects.create(
+            embedding_model="local:old", status="retired", retired_at=now
+        )
+        EmbeddingIndex.objects.create(embedding_model="local:new", status="serving")
+        self._chunk("local:old", dimensions=3)
+        self._chunk("local:new", dimensions=5)
+
+        # retired too recently
+        self.assertEqual(prune_retired_models(now - timedelta(hours=1)), [])
+        self.assertEqual(prune_retired_models(now + timedelta(hours=1)), ["local:old"])
+        self.assertEqual(
+            list(PostChunk.objects.values_list("embedding_model", flat=True)),
+            ["local:new"],
+        )
+        self.assertFalse(
+            EmbeddingIndex.objects.filter(embedding_model="local:old").exists()
+        )
@@ -0,0 +1,126 @@
+import os
+import tempfile
+from collections import Counter
+from unittest.mock import patch
+
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from api import keywords
+from api.keywords import (
+    IdfTable,
+    extract_keywords,
+    get_idf_table,
+    refresh_idf_table,
+    write_idf_table,
+)
+from api.models import CorpusDocument, Post
+from api.tasks import refresh_keyword_idf_task
+
+
+class IdfTableTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def test_write_and_load(self):
+        write_idf_table(self.directory, Counter({"博客": 20, "量子": 1}), 20, 1)
+        table = IdfTable.load(self.directory)
+
+        self.assertEqual(table.version, 1)
+        self.assertEqual(table.documents, 20)
+        self.assertEqual(list(table.terms), ["博客", "量子"])
+        self.assertEqual(list(table.df), [20, 1])
+
+        idf = table.lookup(np.array(["量子", "博客", "未知"]))
+        self.assertGreater(idf[0], idf[1])
+        self.assertAlmostEqual(idf[2], table.median_idf)
+
+    def test_load_missing_table(self):
+        self.assertIsNone(IdfTable.load(self.directory))
+
+    def test_corpus_common_words_score_lower(self):
+        write_idf_table(self.directory, Counter({"博客": 20, "量子": 1}), 20, 1)
+        table = IdfTable.load(self.directory)
+
+        # "博客" appears in every post, more often but less important
+        keywords = table.extract("博客博客博客量子", top_k=2)
+        self.assertEqual(keywords, ["量子", "博客"])
+
+    def test_keeps_previous_version_only(self):
+        for version in range(1, 5):
+            write_idf_table(self.directory, Counter({"博客": version}), 20, version)
+
+        self.assertEqual(IdfTable.load(self.directory).version, 4)
+        self.assertFalse(os.path.exists(f"{self.directory}/terms.2.npy"))
+        self.assertTrue(os.path.exists(f"{self.directory}/terms.3.npy"))
+
+    def test_reloads_new_version(self):
+        with override_settings(KEYWORD_IDF_DIR=self.directory):
+            self.assertIsNone(get_idf_table())
+
+            write_idf_table(self.directory, Counter({"博客": 1}), 20, 1)
+            self.assertEqual(get_idf_table().version, 1)
+
+            write_idf_table(self.directory, Counter({"博客": 2}), 20, 2)
+            self.assertEqual(get_idf_table().version, 2)
+
+    def test_fallback_to_jieba_for_small_corpus(self):
+        write_idf_table(self.directory, Counter({"博客": 1}), 3, 1)
+
+        with (
+            override_settings(KEYWORD_IDF_DIR=self.directory),
+            patch("jieba.analyse.extract_tags", return_value=["jieba"]) as extract,
+        ):
+            self.assertEqual(extract_keywords("博客量子", top_k=2), ["jieba"])
+
+        extract.assert_called_once_with("博客量子", topK=2)
+
+
+class RefreshIdfTableTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(KEYWORD_IDF_DIR=self.directory)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.post = Post.objects.create(
+            title="keyword", content="量子计算的博客文章", slug="keyword"
+        )
+
+    def test_refresh_only_changed_documents(self):
+        self.assertTrue(refresh_idf_table())
+        self.assertEqual(IdfTable.load(self.directory).version, 1)
+        document = CorpusDocument.objects.get(source="post", object_id=self.post.pk)
+        self.assertIn("量子", document.terms)
+
+        # nothing changed
+        with patch.object(
+            keywords, "tokenize_terms", wraps=keywords.tokenize_terms
+        ) as tokenize:
+            self.assertFalse(refresh_idf_table())
+        tokenize.assert_not_called()
+
+        self.post.content = "另一篇文章"
+        self.post.save()
+        self.assertTrue(refresh_idf_table())
+        self.assertEqual(IdfTable.load(self.directory).version, 2)
+
+    def test_refresh_removes_deleted_documents(self):
+        refresh_idf_table()
+        self.post.delete()
+
+        self.assertTrue(refresh_idf_table())
+        self.assertFalse(CorpusDocument.objects.exists())
+        self.assertEqual(IdfTable.load(self.directory).documents, 0)
+
+    def test_locked_refresh_is_rescheduled(self):
+        cache.set("keyword_idf:lock", 1)
+        self.addCleanup(
+            cache.delete_many, ["keyword_idf:lock", "keyword_idf:scheduled"]
+        )
+        cache.delete("keyword_idf:scheduled")
+
+        with patch.object(refresh_keyword_idf_task, "apply_async") as apply_async:
+            self.assertFalse(refresh_keyword_idf_task())
+        apply_async.assert_called_once()
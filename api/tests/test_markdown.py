@@ -0,0 +1,94 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from api.markdown import Markdown
+from api.models import Change, Gal, Post
+
+
+class RenderCacheTest(SimpleTestCase):
+    def setUp(self):
+        Markdown._html_cache.clear()
+
+    def test_render_once(self):
+        markdown = Markdown(html=True)
+        with patch.object(Markdown, "render", wraps=markdown.render) as render:
+            first = markdown.render_cached("**bold**")
+            second = Markdown(html=True).render_cached("**bold**")
+
+        render.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertIn("<strong>bold</strong>", first)
+
+    def test_options_in_key(self):
+        escaped = Markdown(html=False).render_cached("<b>raw</b>")
+        raw = Markdown(html=True).render_cached("<b>raw</b>")
+
+        self.assertNotEqual(escaped, raw)
+        self.assertEqual(len(Markdown._html_cache), 2)
+
+
+@patch("api.vndb.query_vn", return_value={"results": []})
+class RenderSignalTest(TestCase):
+    def test_gal_review_rendered_locally(self, query_vn):
+        gal = Gal.objects.create(vndb_id="v17", title="test", review="*good*")
+
+        gal.refresh_from_db()
+        self.assertIn("<em>good</em>", gal.review_html)
+
+    def test_render_markdown_command(self, query_vn):
+        post = Post.objects.create(title="render", content="# Heading", slug="render")
+        gal = Gal.objects.create(vndb_id="v17", title="test", review="*good*")
+        Post.objects.filter(pk=post.pk).update(content_html="stale")
+        Gal.objects.filter(pk=gal.pk).update(review_html=None)
+
+        out = StringIO()
+        command = "api.management.commands.render_markdown"
+        with (
+            patch(f"{command}.invalidate_post_responses") as invalidate_posts,
+            patch(f"{command}.invalidate_response") as invalidate_gal,
+        ):
+            call_command("render_markdown", stdout=out)
+
+        self.assertIn("post: 1 updated", out.getvalue())
+        self.assertIn("gal: 1 updated", out.getvalue())
+        updated_at = post.updated_at
+        post.refresh_from_db()
+        self.assertIn("Heading</h1>", post.content_html)
+        self.assertGreater(post.updated_at, updated_at)
+        # `bulk_update` sends no signals
+        self.assertEqual(
+            list(invalidate_posts.call_args.args[0]), [(post.pk, "render")]
+        )
+        invalidate_gal.assert_called_once_with("gal", gal_id=gal.pk)
+        self.assertTrue(
+            Change.objects.filter(model="post", object_id=post.pk, action="updated")
+        )
+
+        # nothing changed
+        out = StringIO()
+        call_command("render_markdown", "gal", stdout=out)
+        self.assertIn("gal: 0 updated", out.getvalue())
+
+    def test_render_stale_only(self, query_vn):
+        stale = Gal.objects.create(vndb_id="v17", title="stale", review="*good*")
+        Gal.objects.create(vndb_id="v18", title="fresh", review="*good*")
+        # e.g. the rows before the hash markers
+        Gal.objects.filter(pk=stale.pk).update(review_html=None, review_html_hash="")
+
+        out = StringIO()
+        call_command("render_markdown", "gal", "--stale", stdout=out)
+
+        self.assertIn("gal: 1 updated", out.getvalue())
+        stale.refresh_from_db()
+        self.assertIn("<em>good</em>", stale.review_html)
+
+    def test_gal_render_only_if_review_changed(self, query_vn):
+        gal = Gal.objects.create(vndb_id="v17", title="test", review="*good*")
+
+        with patch("api.models.gal.render_review_html") as render:
+            gal.summary = "summary"
+            gal.save()
+        render.assert_not_called()
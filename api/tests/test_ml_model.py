@@ -5,7 +5,14 @@ from unittest.mock import patch
 from asgiref.sync import async_to_sync
 from django.test import SimpleTestCase, override_settings
 
-from api.ml_model import LocalEmbedding, RemoteEmbedding, get_ml_model
+from api.ml_model import (
+    FastTokenizer,
+    LocalEmbedding,
+    RemoteEmbedding,
+    _other_models,
+    get_embedding_model_name,
+    get_ml_model,
+)
 
 # this test wrote by LLM
 
@@ -80,9 +87,25 @@ class CreatedAsyncClient(CreatedClient):
     instances = []
 
 
+class FakeHFTokenizer:
+    """one character is a token"""
+
+    def __call__(self, texts, add_special_tokens=True, return_offsets_mapping=False):
+        if isinstance(texts, str):
+            return {
+                "input_ids": list(range(len(texts))),
+                "offset_mapping": [(i, i + 1) for i in range(len(texts))],
+            }
+        return {"input_ids": [list(range(len(text))) for text in texts]}
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+
 def _reset_all_singletons():
     LocalEmbedding._instance = None
     RemoteEmbedding._instance = None
+    _other_models.clear()
 
 
 def _patch_sentence_transformer():
@@ -185,6 +208,24 @@ class RemoteEmbeddingTest(_EmbeddingModelMixin, SimpleTestCase):
         self.assertEqual(first.api_key, "test-key")
         self.assertEqual(first.model_name, "test-embedding-model")
 
+    @override_settings(REMOTE_EMBEDDING_TOKENIZER="test-tokenizer")
+    def test_shadow_model_loads_own_tokenizer(self):
+        loaded = []
+
+        def from_pretrained(name, **kwargs):
+            loaded.append(name)
+            return FakeHFTokenizer()
+
+        transformers = SimpleNamespace(
+            AutoTokenizer=SimpleNamespace(from_pretrained=from_pretrained)
+        )
+        with patch.dict(sys.modules, {"transformers": transformers}):
+            RemoteEmbedding().get_tokenizer()
+            RemoteEmbedding.for_model("test-embedding-model").get_tokenizer()
+            RemoteEmbedding.for_model("org/new-model").get_tokenizer()
+
+        self.assertEqual(loaded, ["test-tokenizer", "test-tokenizer", "org/new-model"])
+
     def test_client_options_include_auth_and_timeout(self):
         model = RemoteEmbedding()
 
@@ -346,3 +387,50 @@ class GetMLModelTest(SimpleTestCase):
     )
     def test_returns_local_embedding_by_default(self):
         self.assertIsInstance(get_ml_model(), LocalEmbedding)
+
+    @override_settings(
+        USE_REMOTE_EMBEDDING=False,
+        MODEL_NAME="unit-test-model",
+        SENTENCE_TRANSFORMERS_HOME="/tmp/sentence-transformers",
+    )
+    def test_embedding_model_name_is_tagged_with_provider(self):
+        self.assertEqual(get_embedding_model_name(), "local:unit-test-model")
+        # the name doesn't load the model
+        self.assertEqual(FakeSentenceTransformer.instances, [])
+        self.assertEqual(get_ml_model().embedding_model, "local:unit-test-model")
+
+    @override_settings(
+        USE_REMOTE_EMBEDDING=False,
+        MODEL_NAME="unit-test-model",
+        SENTENCE_TRANSFORMERS_HOME="/tmp/sentence-transformers",
+        REMOTE_EMBEDDING_MODEL_NAME="test-embedding-model",
+    )
+    def test_returns_provider_of_other_model_without_touch_singleton(self):
+        remote = get_ml_model("remote:old-model")
+        self.assertIsInstance(remote, RemoteEmbedding)
+        self.assertEqual(remote.model_name, "old-model")
+        self.assertIsNone(RemoteEmbedding._instance)
+        self.assertIs(get_ml_model("remote:old-model"), remote)
+
+        local = get_ml_model("local:old-model")
+        self.assertIsInstance(local, LocalEmbedding)
+        self.assertIsNone(LocalEmbedding._instance)
+        self.assertEqual(FakeSentenceTransformer.instances[0].args, ("old-model",))
+
+        with self.assertRaises(ValueError):
+            get_ml_model("unknown:model")
+
+
+class FastTokenizerTest(SimpleTestCase):
+    def test_reserves_special_tokens(self):
+        tokenizer = FastTokenizer(FakeHFTokenizer(), 512)
+        self.assertEqual(tokenizer.max_tokens, 510)
+
+    def test_counts_in_batch(self):
+        tokenizer = FastTokenizer(FakeHFTokenizer(), 512)
+        self.assertEqual(tokenizer.count(["a", "bcd", ""]), [1, 3, 0])
+
+    def test_splits_at_token_boundaries(self):
+        tokenizer = FastTokenizer(FakeHFTokenizer(), 512)
+        self.assertEqual(tokenizer.split("abcdefg", 3), ["abc", "def", "g"])
+        self.assertEqual(tokenizer.split("", 3), [])
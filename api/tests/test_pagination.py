@@ -0,0 +1,132 @@
+import datetime
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from ninja.errors import HttpError
+
+from api.count_cache import count_queryset
+from api.models import Category, Post, Tag
+from api.pagination import KeysetCursor
+
+
+class KeysetCursorTest(SimpleTestCase):
+    def test_ordering_with_primary_key(self):
+        cursor = KeysetCursor(Post.objects.all())
+        self.assertEqual(cursor.ordering, ["-order", "-created_at", "-id"])
+
+        cursor = KeysetCursor(Post.objects.order_by("title"))
+        self.assertEqual(cursor.ordering, ["title", "id"])
+
+    def test_token_round_trip(self):
+        cursor = KeysetCursor(Post.objects.all())
+        created_at = datetime.datetime(2025, 1, 2, 3, 4, 5, tzinfo=datetime.UTC)
+        token = cursor.encode(Post(id=7, order=1, created_at=created_at))
+
+        self.assertEqual(cursor.decode(token), [1, created_at, 7])
+
+    def test_leading_bound(self):
+        cursor = KeysetCursor(Post.objects.all())
+        created_at = datetime.datetime(2025, 1, 2, tzinfo=datetime.UTC)
+
+        self.assertIn(("order__lte", 1), cursor._after([1, created_at, 7]).children)
+        self.assertIn(
+            ("order__gte", 1), cursor._after([1, created_at, 7], reverse=True).children
+        )
+
+    def test_invalid_token(self):
+        cursor = KeysetCursor(Post.objects.all())
+        for token in ("invalid", "WzFd", cursor.encode(Post(id=1, order=0))[:-2]):
+            with self.assertRaises(HttpError):
+                cursor.decode(token)
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(5):
+            Post.objects.create(title=f"cursor {i}", content="content", slug=f"c{i}")
+
+    def get_page(self, **params):
+        response = self.client.get("/api/post/", {"size": 2, **params})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [post["slug"] for post in data["posts"]], data["pagination"]
+
+    def test_walk_pages(self):
+        slugs, pagination = self.get_page()
+        self.assertEqual(slugs, ["c4", "c3"])
+        self.assertEqual(pagination["total"], 5)
+
+        slugs, pagination = self.get_page(after=pagination["next"])
+        self.assertEqual(slugs, ["c2", "c1"])
+        self.assertIsNone(pagination["total"])
+
+        # inserted rows won't shift the next pages
+        Post.objects.create(title="cursor new", content="content", slug="new")
+        last, last_pagination = self.get_page(after=pagination["next"])
+        self.assertEqual(last, ["c0"])
+        self.assertIsNone(last_pagination["next"])
+
+        slugs, _ = self.get_page(before=last_pagination["previous"])
+        self.assertEqual(slugs, ["c2", "c1"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/post/", {"after": "invalid"})
+        self.assertEqual(response.status_code, 400)
+
+
+class CountCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="count")
+        for i in range(2):
+            Post.objects.create(
+                title=f"count {i}",
+                content="content",
+                slug=f"count-{i}",
+                category=self.category,
+            )
+
+    def test_count_cached(self):
+        self.assertEqual(count_queryset(Post.objects.all()), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(count_queryset(Post.objects.all()), 2)
+
+        # filtered by a different signature
+        self.assertEqual(count_queryset(Post.objects.filter(slug="count-0")), 1)
+
+    def test_invalidated_by_signals(self):
+        self.assertEqual(count_queryset(Post.objects.all()), 2)
+
+        # invalidated after the commit, a request before it caches the old count
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(title="count 2", content="content", slug="count-2")
+        self.assertEqual(count_queryset(Post.objects.all()), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.get(slug="count-2").delete()
+        self.assertEqual(count_queryset(Post.objects.all()), 2)
+
+    def test_invalidated_by_related_model(self):
+        in_category = Post.objects.filter(category__isnull=False)
+        self.assertEqual(count_queryset(in_category), 2)
+
+        # `on_delete=SET_NULL` doesn't send the signals of `Post`
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.assertEqual(count_queryset(in_category), 0)
+
+    def test_invalidated_by_tags(self):
+        tag = Tag.objects.create(name="count")
+        tagged = Post.objects.filter(tags__name="count")
+        self.assertEqual(count_queryset(tagged), 0)
+
+        # `m2m_changed`, not a save of `Post`
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.get(slug="count-0").tags.add(tag)
+        self.assertEqual(count_queryset(tagged), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.name = "renamed"
+            tag.save()
+        self.assertEqual(count_queryset(tagged), 0)
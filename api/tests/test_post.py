@@ -1,10 +1,25 @@
-from django.contrib.postgres.search import SearchQuery
+import json
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
-from api.models import Post
+from api.models import Post, Tag
+from api.search_index import get_stale_posts, update_search_vector
 from api.tasks import generate_post_chunks_embedding_task as generate_post_embedding
+from core.hash import calculate_blake3_hash
+
+
+@async_to_sync
+async def read_stream(response) -> bytes:
+    # the async stream, the rows are read in this thread by `aiterator`
+    return b"".join([part async for part in response.streaming_content])
 
 
 @override_settings(
@@ -15,6 +30,7 @@ from api.tasks import generate_post_chunks_embedding_task as generate_post_embed
 )
 class TestPost(TestCase):
     def setUp(self):
+        cache.clear()
         post = Post.objects.create(
             title="test", content="test content", slug="test", status="published"
         )
@@ -26,6 +42,14 @@ class TestPost(TestCase):
         post = Post.objects.get(title="test")
         self.assertTrue(post.chunks.exists())
 
+    def test_skip_unchanged_chunks(self):
+        post = Post.objects.get(title="test")
+        self.assertEqual(post.chunks.first().post_content_hash, post.content_hash)
+
+        with patch("api.tasks._replace_post_chunks") as replace:
+            generate_post_embedding(post.id)
+        replace.assert_not_called()
+
     def test_post_api(self):
         post = Post.objects.get(title="test")
         self.assertEqual(post.content, "test content")
@@ -35,7 +59,8 @@ class TestPost(TestCase):
         self.assertContains(response, post.pk, status_code=200)
 
         response = self.client.get("/api/post/ids")
-        self.assertContains(response, post.pk, status_code=200)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(post.pk, json.loads(read_stream(response))["ids"])
 
         response = self.client.get(f"/api/post/{post.pk}")
         self.assertContains(response, "test content", status_code=200)
@@ -64,10 +89,21 @@ class TestPost(TestCase):
         for field in ("page", "size", "total"):
             self.assertIn(field, pagination)
 
+    def test_post_cards_skip_large_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/post/")
+        self.assertEqual(response.status_code, 200)
+
+        sql = "\n".join(query["sql"] for query in queries.captured_queries)
+        self.assertIn('"api_post"."title"', sql)
+        for column in ("content", "content_html", "tokenized_content"):
+            self.assertNotIn(f'"api_post"."{column}"', sql)
+
     def test_post_ids_structure(self):
         response = self.client.get("/api/post/ids")
         self.assertEqual(response.status_code, 200)
-        data = response.json()
+        # streamed
+        data = json.loads(read_stream(response))
         self.assertIn("ids", data)
         self.assertIsInstance(data["ids"], list)
         self.assertGreater(len(data["ids"]), 0)
@@ -99,6 +135,66 @@ class TestPost(TestCase):
         for field in ("id", "title", "content", "created_at"):
             self.assertIn(field, data)
 
+    def test_post_detail_not_modified(self):
+        post = Post.objects.get(title="test")
+        response = self.client.get(f"/api/post/{post.pk}")
+        etag = response.headers["ETag"]
+        self.assertIn("Last-Modified", response.headers)
+
+        response = self.client.get(f"/api/post/{post.pk}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        # the slug route has the same validators
+        response = self.client.get("/api/post/test", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.tags.create(name="etag")
+        response = self.client.get(f"/api/post/{post.pk}", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_post_detail_not_found(self):
+        response = self.client.get("/api/post/0")
+        self.assertEqual(response.status_code, 404)
+
+    def test_post_detail_sparse_fields(self):
+        post = Post.objects.get(title="test")
+        response = self.client.get(f"/api/post/{post.pk}?fields=id,title")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"id": post.pk, "title": "test"})
+
+        # the full representation has another tag
+        full = self.client.get(f"/api/post/{post.pk}")
+        self.assertNotEqual(full.headers["ETag"], response.headers["ETag"])
+        self.assertIn("content", full.json())
+
+    def test_post_detail_sparse_exclude_skips_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/post/test?exclude=content,content_html")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertNotIn("content", data)
+        self.assertEqual(data["slug"], "test")
+
+        sql = "\n".join(query["sql"] for query in queries.captured_queries)
+        for column in ("content", "content_html"):
+            self.assertNotIn(f'"api_post"."{column}"', sql)
+
+    def test_post_sparse_fields_invalid(self):
+        response = self.client.get("/api/post/test?fields=id,nope")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/post/test?fields=id&exclude=title")
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_list_sparse_fields(self):
+        response = self.client.get("/api/post/?fields=id,slug")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["posts"][0].keys(), {"id", "slug"})
+        self.assertIn("pagination", data)
+
     def test_post_sitemap_structure(self):
         response = self.client.get("/api/post/sitemap")
         self.assertEqual(response.status_code, 200)
@@ -125,6 +221,88 @@ class TestPost(TestCase):
             raise
 
 
+class TestPostSave(TestCase):
+    def test_create_writes_once(self):
+        # SAVEPOINT, INSERT, INSERT api_change, RELEASE
+        with self.assertNumQueries(4):
+            post = Post.objects.create(title="once", content="# Heading", slug="once")
+
+        self.assertIn("Heading</h1>", post.content_html)
+        self.assertIsNotNone(post.content_update_at)
+        self.assertEqual(post.search_version, 1)
+
+    def test_create_with_front_matter_tags(self):
+        content = "---\ntags: [python, django]\n---\n\ncontent"
+        # + INSERT api_change, SELECT tags, INSERT tags, SELECT new tags,
+        # INSERT post_tags
+        with self.assertNumQueries(8):
+            post = Post.objects.create(
+                title="tags", content=content, slug="front-matter-tags"
+            )
+
+        self.assertEqual(
+            sorted(post.tags.values_list("name", flat=True)), ["django", "python"]
+        )
+
+    def test_front_matter_tags_fill_untagged_post(self):
+        content = "---\ntags: [python]\n---\n\ncontent"
+        post = Post.objects.create(title="untagged", content=content, slug="untagged")
+        post.tags.clear()
+
+        # the content is not changed
+        post.save()
+
+        self.assertEqual(list(post.tags.values_list("name", flat=True)), ["python"])
+
+    def test_content_hash(self):
+        post = Post.objects.create(title="hash", content="content", slug="hash")
+
+        self.assertEqual(post.content_hash, calculate_blake3_hash("content"))
+        self.assertEqual(post.content_html_hash, post.content_hash)
+
+    def test_update_writes_once(self):
+        Post.objects.create(title="update", content="old content", slug="update")
+        post = Post.objects.get(slug="update")
+        content_update_at = post.content_update_at
+
+        post.content = "new content"
+        # SAVEPOINT, UPDATE, INSERT api_change, RELEASE
+        with self.assertNumQueries(4):
+            post.save()
+
+        post.refresh_from_db()
+        self.assertIn("new content", post.content_html)
+        self.assertGreater(post.content_update_at, content_update_at)
+        self.assertEqual(post.search_version, 2)
+
+    def test_create_hashes_content(self):
+        post = Post(title="new", content="new content", slug="new")
+        self.assertIn("content", post.get_dirty_fields())
+        post.save()
+
+        post.refresh_from_db()
+        self.assertEqual(post.content_hash, calculate_blake3_hash("new content"))
+        self.assertEqual(post.content_html_hash, post.content_hash)
+        self.assertEqual(post.search_version, 1)
+
+    def test_dirty_fields(self):
+        Post.objects.create(title="dirty", content="content", slug="dirty")
+        post = Post.objects.get(slug="dirty")
+        self.assertEqual(post.get_dirty_fields(), set())
+
+        post.order = 1
+        post.save()
+        post.refresh_from_db()
+        # not a search field, the vector is still fresh
+        self.assertEqual(post.search_version, 1)
+
+        post.title = "changed"
+        self.assertEqual(post.get_dirty_fields(), {"title"})
+        post.save()
+        self.assertEqual(post.get_dirty_fields(), set())
+        self.assertEqual(post.search_version, 2)
+
+
 @override_settings(
     SECURE_SSL_REDIRECT=False,
     CELERY_TASK_ALWAYS_EAGER=True,
@@ -132,27 +310,31 @@ class TestPost(TestCase):
 )
 class TestPostFullTextSearch(TestCase):
     def setUp(self):
-        self.post1 = Post.objects.create(
-            title="中文测试文章",
-            content="这是一篇关于Python和Django的测试文章，包含中文内容。",
-            slug="test-fts-1",
-            status="published",
-        )
-        self.post2 = Post.objects.create(
-            title="English Test Post",
-            content="This is a test post about PostgreSQL full-text search.",
-            slug="test-fts-2",
-            status="published",
-        )
-        self.post3 = Post.objects.create(
-            title="混合语言文章 Mixed Language",
-            content="This post contains both English 中文 and 混合内容 mixed content.",
-            slug="test-fts-3",
-            status="published",
-        )
+        # the search vector is built by the task after commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post1 = Post.objects.create(
+                title="中文测试文章",
+                content="这是一篇关于Python和Django的测试文章，包含中文内容。",
+                slug="test-fts-1",
+                status="published",
+            )
+            self.post2 = Post.objects.create(
+                title="English Test Post",
+                content="This is a test post about PostgreSQL full-text search.",
+                slug="test-fts-2",
+                status="published",
+            )
+            self.post3 = Post.objects.create(
+                title="混合语言文章 Mixed Language",
+                content=(
+                    "This post contains both English 中文 and 混合内容 mixed content."
+                ),
+                slug="test-fts-3",
+                status="published",
+            )
 
     def test_application_level_tokenization(self):
-        """Test that jieba tokenization works correctly in the save method."""
+        """Test that jieba tokenization works correctly in the search task."""
         post = Post.objects.get(slug="test-fts-1")
         self.assertIsNotNone(post.tokenized_content)
         self.assertIsInstance(post.tokenized_content, str)
@@ -221,23 +403,90 @@ class TestPostFullTextSearch(TestCase):
 
     def test_fts_integration_full_workflow(self):
         """Test the full workflow from save to search."""
-        new_post = Post.objects.create(
-            title="全流程测试",
-            content="测试完整的全文搜索流程，从保存到查询。",
-            slug="full-workflow-test",
-            status="published",
-        )
-
-        self.assertIsNotNone(new_post.tokenized_content)
+        with self.captureOnCommitCallbacks(execute=True):
+            new_post = Post.objects.create(
+                title="全流程测试",
+                content="测试完整的全文搜索流程，从保存到查询。",
+                slug="full-workflow-test",
+                status="published",
+            )
 
         new_post.refresh_from_db()
+        self.assertIsNotNone(new_post.tokenized_content)
         self.assertIsNotNone(new_post.pg_gin_search_vector)
+        self.assertEqual(new_post.search_indexed_version, new_post.search_version)
 
         search_query = SearchQuery("流程")
         results = Post.objects.filter(pg_gin_search_vector=search_query)
 
         self.assertIn(new_post, results)
 
+    def test_save_does_not_build_vector(self):
+        post = Post.objects.get(slug="test-fts-2")
+        post.content = "Redis is an in-memory database."
+        post.save()
+        post.refresh_from_db()
+
+        # built after commit, the old vector is stale now
+        self.assertGreater(post.search_version, post.search_indexed_version)
+        self.assertIn(post, get_stale_posts())
+        # the vector is "simple", the default "english" query stems the term
+        redis = SearchQuery("Redis", config="simple")
+        self.assertFalse(Post.objects.filter(pg_gin_search_vector=redis).exists())
+
+        self.assertTrue(update_search_vector(post.pk))
+        self.assertFalse(get_stale_posts().exists())
+        self.assertTrue(Post.objects.filter(pg_gin_search_vector=redis).exists())
+
+    def test_tag_rename_and_delete_reindex_posts(self):
+        def tagged(name):
+            query = SearchQuery(name, config="simple")
+            return list(Post.objects.filter(pg_gin_search_vector=query))
+
+        tag = Tag.objects.create(name="oldtag")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post2.tags.add(tag)
+        self.assertEqual(tagged("oldtag"), [self.post2])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.name = "newtag"
+            tag.save()
+        self.assertEqual(tagged("oldtag"), [])
+        self.assertEqual(tagged("newtag"), [self.post2])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+        self.assertEqual(tagged("newtag"), [])
+        self.assertFalse(get_stale_posts().exists())
+
+    def test_update_skips_fresh_vector(self):
+        self.assertFalse(update_search_vector(self.post1.pk))
+
+    def test_title_ranks_higher_than_body(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                title="Redis 缓存",
+                content="缓存的设计",
+                slug="fts-title",
+                status="published",
+            )
+            Post.objects.create(
+                title="缓存的设计",
+                content="Redis 缓存",
+                slug="fts-body",
+                status="published",
+            )
+
+        search_query = SearchQuery("Redis", config="simple")
+        results = (
+            Post.objects.filter(pg_gin_search_vector=search_query)
+            .annotate(score=SearchRank(F("pg_gin_search_vector"), search_query))
+            .order_by("-score")
+        )
+        self.assertEqual(
+            list(results.values_list("slug", flat=True)), ["fts-title", "fts-body"]
+        )
+
 
 @override_settings(
     SECURE_SSL_REDIRECT=False,
@@ -246,24 +495,26 @@ class TestPostFullTextSearch(TestCase):
 )
 class TestHybridSearch(TestCase):
     def setUp(self):
-        self.post1 = Post.objects.create(
-            title="Django入门教程",
-            content="Django是一个强大的Python Web框架，用于快速开发网站。",
-            slug="hybrid-search-1",
-            status="published",
-        )
-        self.post2 = Post.objects.create(
-            title="Python编程基础",
-            content="Python是一种流行的编程语言，广泛用于数据分析和机器学习。",
-            slug="hybrid-search-2",
-            status="published",
-        )
-        self.post3 = Post.objects.create(
-            title="数据库优化技巧",
-            content="PostgreSQL是一个强大的关系型数据库，支持全文搜索和向量搜索。",
-            slug="hybrid-search-3",
-            status="published",
-        )
+        # the search vector is built by the task after commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post1 = Post.objects.create(
+                title="Django入门教程",
+                content="Django是一个强大的Python Web框架，用于快速开发网站。",
+                slug="hybrid-search-1",
+                status="published",
+            )
+            self.post2 = Post.objects.create(
+                title="Python编程基础",
+                content="Python是一种流行的编程语言，广泛用于数据分析和机器学习。",
+                slug="hybrid-search-2",
+                status="published",
+            )
+            self.post3 = Post.objects.create(
+                title="数据库优化技巧",
+                content="PostgreSQL是一个强大的关系型数据库，支持全文搜索和向量搜索。",
+                slug="hybrid-search-3",
+                status="published",
+            )
         self.post1.save()
         self.post2.save()
         self.post3.save()
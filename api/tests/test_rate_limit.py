@@ -1,9 +1,11 @@
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
+from django.core.cache import cache
 from django.http import HttpRequest
-from django.test import RequestFactory, TestCase
+from django.test import RequestFactory, TestCase, override_settings
 
-from api.rate_limit import rate_limit
+from api import rate_limit as rate_limit_module
+from api.rate_limit import get_client_ip, rate_limit
 
 
 class RateLimitTest(TestCase):
@@ -11,11 +13,12 @@ class RateLimitTest(TestCase):
         self.factory = RequestFactory()
         self.request = self.factory.get("/")
         self.request.META["REMOTE_ADDR"] = "127.0.0.1"
+        rate_limit_module._blocked.clear()
 
-    # mock the cache service, not use really redis service
-    @patch("api.rate_limit.cache")
-    def test_sync_rate_limit_pass(self, mock_cache):
-        mock_cache.incr.return_value = 1
+    # mock the lua script, not use really redis service
+    @patch("api.rate_limit._script")
+    def test_sync_rate_limit_pass(self, mock_script):
+        mock_script.return_value = MagicMock(return_value=[1, 0])
 
         @rate_limit(key_prefix="test_sync", max_requests=2, window=60)
         def test_view(request: HttpRequest):
@@ -23,12 +26,15 @@ class RateLimitTest(TestCase):
 
         status, res = test_view(self.request)
         self.assertEqual(status, 200)
-        self.assertEqual(mock_cache.add.call_count, 1)
-        self.assertEqual(mock_cache.incr.call_count, 1)
+        # one round-trip
+        mock_script.return_value.assert_called_once()
+        _, kwargs = mock_script.return_value.call_args
+        # 30s per request, 60s of burst, cost 1
+        self.assertEqual(kwargs["args"], [30000, 60000, 1])
 
-    @patch("api.rate_limit.cache")
-    def test_sync_rate_limit_black(self, mock_cache):
-        mock_cache.incr.return_value = 3
+    @patch("api.rate_limit._script")
+    def test_sync_rate_limit_black(self, mock_script):
+        mock_script.return_value = MagicMock(return_value=[0, 1000])
 
         @rate_limit(key_prefix="test_sync", max_requests=2, window=60)
         def test_view(request: HttpRequest):
@@ -38,24 +44,22 @@ class RateLimitTest(TestCase):
         self.assertEqual(status, 429)
         self.assertEqual(res.get("message"), "Too many request")
 
-    @patch("api.rate_limit.cache")
-    async def test_async_rate_limit_pass(self, mock_cache):
-        mock_cache.aincr = AsyncMock(return_value=1)
-        mock_cache.aadd = AsyncMock()
+    @patch("api.rate_limit._async_script", new_callable=AsyncMock)
+    async def test_async_rate_limit_pass(self, mock_script):
+        mock_script.return_value = [1, 0]
 
-        @rate_limit(key_prefix="test_async", max_requests=2, window=60)
+        @rate_limit(key_prefix="test_async", max_requests=2, window=60, cost=2)
         async def test_view(request: HttpRequest):
             return 200, "ok"
 
         status, res = await test_view(self.request)
         self.assertEqual(status, 200)
-        mock_cache.aadd.assert_called_once()
-        mock_cache.aincr.assert_called_once()
+        _, kwargs = mock_script.call_args
+        self.assertEqual(kwargs["args"][2], 2)
 
-    @patch("api.rate_limit.cache")
-    async def test_async_rate_limit_block(self, mock_cache):
-        mock_cache.aincr = AsyncMock(return_value=3)
-        mock_cache.aadd = AsyncMock()
+    @patch("api.rate_limit._async_script", new_callable=AsyncMock)
+    async def test_async_rate_limit_block(self, mock_script):
+        mock_script.return_value = [0, 1000]
 
         @rate_limit(key_prefix="test_async", max_requests=2, window=60)
         async def test_view(request: HttpRequest):
@@ -64,3 +68,104 @@ class RateLimitTest(TestCase):
         status, res = await test_view(self.request)
         self.assertEqual(status, 429)
         self.assertEqual(res.get("message"), "Too many request")
+
+    @patch("api.rate_limit._script")
+    def test_blocked_client_skips_redis(self, mock_script):
+        mock_script.return_value = MagicMock(return_value=[0, 60000])
+
+        @rate_limit(key_prefix="test_local", max_requests=2, window=60)
+        def test_view(request: HttpRequest):
+            return 200, "ok"
+
+        for _ in range(3):
+            status, _ = test_view(self.request)
+            self.assertEqual(status, 429)
+        mock_script.return_value.assert_called_once()
+
+        # another client is not blocked
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.1")
+        mock_script.return_value.return_value = [1, 0]
+        self.assertEqual(test_view(request)[0], 200)
+
+    @patch("api.rate_limit._script")
+    def test_redis_error_allows(self, mock_script):
+        mock_script.return_value = MagicMock(side_effect=ConnectionError)
+
+        @rate_limit(key_prefix="test_error", max_requests=2, window=60)
+        def test_view(request: HttpRequest):
+            return 200, "ok"
+
+        self.assertEqual(test_view(self.request)[0], 200)
+
+    @patch("api.rate_limit.logger")
+    @patch("api.rate_limit._script")
+    def test_redis_error_logged_once(self, mock_script, mock_logger):
+        mock_script.return_value = MagicMock(side_effect=ConnectionError)
+        rate_limit_module._error_logged_at = float("-inf")
+
+        @rate_limit(key_prefix="test_error", max_requests=2, window=60)
+        def test_view(request: HttpRequest):
+            return 200, "ok"
+
+        for _ in range(3):
+            self.assertEqual(test_view(self.request)[0], 200)
+        mock_logger.warning.assert_called_once()
+
+
+class RateLimitScriptTest(TestCase):
+    """the real Lua script, in the Redis of the cache"""
+
+    def setUp(self):
+        self.request = RequestFactory().get("/", REMOTE_ADDR="10.1.2.3")
+        self.key = "rate_limit:test_script:10.1.2.3"
+        cache.delete(self.key)
+        self.addCleanup(cache.delete, self.key)
+        rate_limit_module._blocked.clear()
+
+    def test_sync_limit(self):
+        @rate_limit(key_prefix="test_script", max_requests=2, window=60)
+        def test_view(request: HttpRequest):
+            return 200, "ok"
+
+        statuses = [test_view(self.request)[0] for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    async def test_async_limit(self):
+        @rate_limit(key_prefix="test_script", max_requests=2, window=60, cost=2)
+        async def test_view(request: HttpRequest):
+            return 200, "ok"
+
+        statuses = [(await test_view(self.request))[0] for _ in range(2)]
+        self.assertEqual(statuses, [200, 429])
+        # not blocked locally, Redis rejected it
+        rate_limit_module._blocked.clear()
+        self.assertEqual((await test_view(self.request))[0], 429)
+
+
+@override_settings(RATE_LIMIT_TRUSTED_PROXIES=["127.0.0.1", "10.0.0.0/8"])
+class ClientIpTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_untrusted_forwarded_for_ignored(self):
+        request = self.factory.get(
+            "/", REMOTE_ADDR="1.2.3.4", HTTP_X_FORWARDED_FOR="5.6.7.8"
+        )
+        self.assertEqual(get_client_ip(request), "1.2.3.4")
+
+    def test_trusted_proxies_skipped(self):
+        # the client sent a fake "9.9.9.9", the proxies appended the rest
+        request = self.factory.get(
+            "/",
+            REMOTE_ADDR="127.0.0.1",
+            HTTP_X_FORWARDED_FOR="9.9.9.9, 5.6.7.8, 10.0.0.2",
+        )
+        self.assertEqual(get_client_ip(request), "5.6.7.8")
+
+    def test_parsed_once(self):
+        request = self.factory.get(
+            "/", REMOTE_ADDR="127.0.0.1", HTTP_X_FORWARDED_FOR="5.6.7.8"
+        )
+        self.assertEqual(get_client_ip(request), "5.6.7.8")
+        request.META["HTTP_X_FORWARDED_FOR"] = "1.1.1.1"
+        self.assertEqual(get_client_ip(request), "5.6.7.8")
@@ -0,0 +1,53 @@
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import orjson
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from pydantic import BaseModel
+
+from api.renderers import ORJSONParser, ORJSONRenderer
+
+
+class Item(BaseModel):
+    name: str
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    def render(self, data):
+        return orjson.loads(ORJSONRenderer().render(None, data, response_status=200))
+
+    def test_native_types(self):
+        moment = datetime.datetime(2026, 1, 1, 12, 0, 0, 1000, tzinfo=datetime.UTC)
+        uid = uuid.UUID(int=1)
+        data = self.render({"at": moment, "day": moment.date(), "uuid": uid})
+
+        self.assertEqual(data["at"], "2026-01-01T12:00:00.001000Z")
+        self.assertEqual(data["day"], "2026-01-01")
+        self.assertEqual(data["uuid"], str(uid))
+
+    def test_fallback_types(self):
+        data = self.render(
+            {
+                "item": Item(name="a"),
+                "price": Decimal("1.10"),
+                "lazy": gettext_lazy("x"),
+            }
+        )
+        self.assertEqual(data, {"item": {"name": "a"}, "price": "1.10", "lazy": "x"})
+
+    def test_non_str_keys(self):
+        self.assertEqual(self.render({1: "a"}), {"1": "a"})
+
+
+class ORJSONParserTest(SimpleTestCase):
+    def test_parse_body(self):
+        request = MagicMock(body=b'{"id": 1, "tags": ["a"]}')
+        self.assertEqual(ORJSONParser().parse_body(request), {"id": 1, "tags": ["a"]})
+
+    def test_invalid_body(self):
+        with self.assertRaises(json.JSONDecodeError):
+            ORJSONParser().parse_body(MagicMock(body=b""))
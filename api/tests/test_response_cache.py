@@ -0,0 +1,131 @@
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Category, Gal, Post
+from api.response_cache import afill, invalidate_keys
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="cached")
+        self.post = Post.objects.create(
+            title="cached",
+            content="cached content",
+            slug="cached",
+            category=self.category,
+        )
+
+    def test_hit_skips_database(self):
+        first = self.client.get(f"/api/post/{self.post.pk}")
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(f"/api/post/{self.post.pk}")
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.headers["ETag"], first.headers["ETag"])
+        self.assertEqual(second.headers["Content-Type"], first.headers["Content-Type"])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                f"/api/post/{self.post.pk}", HTTP_IF_NONE_MATCH=first.headers["ETag"]
+            )
+        self.assertEqual(response.status_code, 304)
+
+    async def test_fill_after_invalidation_skipped(self):
+        key = "response:test:fill"
+        seen = await cache.aget(key)
+        # invalidated while rendering, the rendered body is the old one
+        await sync_to_async(invalidate_keys)([key])
+        self.assertFalse(await afill(key, seen, {"body": b"old"}))
+        self.assertNotIn("body", await cache.aget(key))
+
+        seen = await cache.aget(key)
+        self.assertTrue(await afill(key, seen, {"body": b"new"}))
+        self.assertEqual((await cache.aget(key))["body"], b"new")
+
+    def test_not_found_not_cached(self):
+        self.client.get("/api/post/missing")
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(title="missing", content="content", slug="missing")
+
+        self.assertEqual(self.client.get("/api/post/missing").status_code, 200)
+
+    def test_save_invalidates_detail(self):
+        self.client.get(f"/api/post/{self.post.pk}")
+        self.client.get("/api/post/cached")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = "renamed"
+            self.post.slug = "renamed"
+            self.post.save()
+
+        response = self.client.get(f"/api/post/{self.post.pk}")
+        self.assertEqual(response.json()["title"], "renamed")
+        # the old slug is not served from the cache
+        self.assertEqual(self.client.get("/api/post/cached").status_code, 404)
+
+    def test_category_invalidates_cards(self):
+        response = self.client.get("/api/post/")
+        self.assertEqual(response.json()["posts"][0]["category"]["name"], "cached")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "renamed"
+            self.category.save()
+
+        response = self.client.get("/api/post/")
+        self.assertEqual(response.json()["posts"][0]["category"]["name"], "renamed")
+
+    def test_cards_vary_on_query(self):
+        Post.objects.create(title="another", content="content", slug="another")
+
+        first = self.client.get("/api/post/", {"size": 1}).json()
+        second = self.client.get("/api/post/", {"size": 1, "page": 2}).json()
+        self.assertNotEqual(first["posts"][0]["id"], second["posts"][0]["id"])
+
+    def test_schema_change_is_a_miss(self):
+        self.client.get(f"/api/post/{self.post.pk}")
+
+        with (
+            patch("api.response_cache._schema_version", return_value="changed"),
+            CaptureQueriesContext(connection) as queries,
+        ):
+            self.client.get(f"/api/post/{self.post.pk}")
+        self.assertTrue(queries.captured_queries)
+
+    def test_gal_invalidated(self):
+        with patch("api.vndb.query_vn", return_value={"results": []}):
+            gal = Gal.objects.create(vndb_id="v1", title="cached")
+        self.client.get(f"/api/gal/{gal.pk}")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gal.title = "renamed"
+            gal.save()
+
+        response = self.client.get(f"/api/gal/{gal.pk}")
+        self.assertEqual(response.json()["title"], "renamed")
+
+    def test_batch_in_order_and_shares_cache(self):
+        other = Post.objects.create(title="other", content="content", slug="other")
+        detail = self.client.get(f"/api/post/{self.post.pk}")
+
+        # the cached post is not queried, only `other` (and its tags)
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                "/api/post/batch", {"ids": f"{other.pk},0,{self.post.pk}"}
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([p["id"] for p in data], [other.pk, self.post.pk])
+        self.assertEqual(data[1], detail.json())
+
+    def test_batch_invalid_ids(self):
+        for ids in ("", "1,x", ",".join(map(str, range(101)))):
+            response = self.client.get("/api/post/batch", {"ids": ids})
+            self.assertEqual(response.status_code, 400, ids)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from api.single_flight import cached_single_flight, single_flight
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class SingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    async def compute(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return self.calls
+
+    def test_concurrent_callers_compute_once(self):
+        async def main():
+            return await asyncio.gather(
+                *(single_flight("key", self.compute) for _ in range(5))
+            )
+
+        self.assertEqual(asyncio.run(main()), [1] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_exception_shared(self):
+        async def fail():
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            raise ValueError("failed")
+
+        async def main():
+            return await asyncio.gather(
+                *(single_flight("key", fail) for _ in range(2)),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(main())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(self.calls, 1)
+        # the lock is released
+        self.assertFalse(cache.has_key("single_flight:key"))
+
+    def test_wait_for_other_worker(self):
+        # the lock is taken by another worker, which writes the value
+        cache.add("single_flight:key", "other", timeout=30)
+
+        async def other_worker():
+            await asyncio.sleep(0.1)
+            await cache.aset("value", 42)
+            await cache.adelete("single_flight:key")
+
+        async def main():
+            result, _ = await asyncio.gather(
+                single_flight("key", self.compute, check=lambda: cache.aget("value")),
+                other_worker(),
+            )
+            return result
+
+        self.assertEqual(asyncio.run(main()), 42)
+        self.assertEqual(self.calls, 0)
+
+    def test_stale_while_revalidate(self):
+        async def get():
+            return await cached_single_flight(
+                "value", self.compute, timeout=60, stale_timeout=60
+            )
+
+        self.assertEqual(asyncio.run(get()), 1)
+
+        async def expired():
+            with patch.object(time, "time", return_value=time.time() + 61):
+                value = await get()
+            # the refresh in the background
+            await asyncio.sleep(0.1)
+            return value
+
+        self.assertEqual(asyncio.run(expired()), 1)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(asyncio.run(get()), 2)
@@ -0,0 +1,83 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from api.models import Page, Post
+from api.sitemap import invalidate_sitemap
+
+
+@async_to_sync
+async def read_stream(response) -> bytes:
+    # the async stream, the rows are read in this thread by `aiterator`
+    return b"".join([part async for part in response.streaming_content])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, SITEMAP_SHARD_SIZE=2)
+class SitemapTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.posts = [
+            Post.objects.create(title=f"post {i}", content="content", slug=f"post-{i}")
+            for i in range(3)
+        ]
+        self.page = Page.objects.create(title="page", content="content", slug="page")
+
+    def get_shard(self, model: str, shard: int):
+        response = self.client.get(f"/api/sitemap/{model}/{shard}")
+        self.assertEqual(response.status_code, 200)
+        # a miss is streamed
+        if response.streaming:
+            return True, json.loads(read_stream(response))
+        return False, response.json()
+
+    def test_index(self):
+        data = self.client.get("/api/sitemap/").json()
+        self.assertEqual(data["shard_size"], 2)
+        posts = [s for s in data["sitemaps"] if s["model"] == "post"]
+        self.assertEqual(sum(s["count"] for s in posts), 3)
+        self.assertIn("page", {s["model"] for s in data["sitemaps"]})
+
+    def test_shards_cover_all_objects(self):
+        data = self.client.get("/api/sitemap/").json()
+        ids = []
+        for shard in data["sitemaps"]:
+            if shard["model"] == "post":
+                _, entries = self.get_shard("post", shard["shard"])
+                ids += [entry["id"] for entry in entries]
+        self.assertEqual(sorted(ids), sorted(post.pk for post in self.posts))
+
+        _, entries = self.get_shard("page", self.page.pk // 2)
+        self.assertEqual(entries[0]["slug"], "page")
+        self.assertIn("updated_at", entries[0])
+
+    def test_cached_and_invalidated(self):
+        post = self.posts[0]
+        shard = post.pk // 2
+        streamed, first = self.get_shard("post", shard)
+        self.assertTrue(streamed)
+        with self.assertNumQueries(0):
+            streamed, cached = self.get_shard("post", shard)
+        self.assertFalse(streamed)
+        self.assertEqual(cached, first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.slug = "renamed"
+            post.save()
+        _, entries = self.get_shard("post", shard)
+        self.assertIn("renamed", [entry["slug"] for entry in entries])
+
+    def test_invalidated_while_streaming_not_cached(self):
+        post = self.posts[0]
+        response = self.client.get(f"/api/sitemap/post/{post.pk // 2}")
+        # committed after the rows were read, the stream has the old slug
+        invalidate_sitemap(Post, post.pk)
+        read_stream(response)
+
+        streamed, _ = self.get_shard("post", post.pk // 2)
+        self.assertTrue(streamed)
+
+    def test_unknown_model(self):
+        response = self.client.get("/api/sitemap/user/0")
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,30 @@
+import asyncio
+import json
+
+from django.test import SimpleTestCase
+
+from api.streaming import iter_json_array
+
+
+async def _rows(count: int):
+    for i in range(count):
+        yield {"id": i, "slug": f"slug,{i}"}
+
+
+class IterJsonArrayTest(SimpleTestCase):
+    def render(self, count: int, chunk_size: int) -> tuple[list, int]:
+        async def collect():
+            return [part async for part in iter_json_array(_rows(count), chunk_size)]
+
+        parts = asyncio.run(collect())
+        return json.loads(b"".join(parts)), len(parts)
+
+    def test_chunk_boundaries(self):
+        for count in (0, 1, 3, 4, 5):
+            data, _ = self.render(count, chunk_size=2)
+            self.assertEqual([row["id"] for row in data], list(range(count)))
+
+    def test_streamed_in_chunks(self):
+        # "[", 3 chunks and "]"
+        _, parts = self.render(5, chunk_size=2)
+        self.assertEqual(parts, 5)
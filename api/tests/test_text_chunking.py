@@ -1,6 +1,32 @@
+import inspect
+import re
+
 from django.test import TestCase
 
-from api.text_chunking import chunk_text
+from api.text_chunking import (
+    ChunkingConfig,
+    TextChunker,
+    TextNormalizer,
+    TextSection,
+    TokenChunker,
+    chunk_text,
+)
+
+# one CJK character or one latin word is a token
+_FAKE_TOKEN_RE = re.compile(r"[\u4e00-\u9fff]|[^\s\u4e00-\u9fff]+")
+
+
+class FakeTokenizer:
+    def __init__(self):
+        self.counted: list[str] = []
+
+    def count(self, texts: list[str]) -> list[int]:
+        self.counted.extend(texts)
+        return [len(_FAKE_TOKEN_RE.findall(text)) for text in texts]
+
+    def split(self, text: str, max_tokens: int) -> list[str]:
+        starts = [m.start() for m in _FAKE_TOKEN_RE.finditer(text)][::max_tokens]
+        return [text[start:end] for start, end in zip(starts, [*starts[1:], None])]
 
 
 class TextChunkingTest(TestCase):
@@ -139,3 +165,218 @@ some [link](https://example.com) and **mark**
         self.assertLess(len(chunks), 20)
         for chunk in chunks:
             self.assertLessEqual(len(chunk), 20)
+
+    def test_iter_chunks(self):
+        # the chunks of the list implementation before streaming
+        sentences = "Sentence one. Sentence two. Sentence three. Sentence four."
+        paragraphs = "第一段第一句。\n\n第二段第一句。\n\n第三段第一句。"
+        cases = [
+            (
+                sentences,
+                30,
+                5,
+                ["Sentence one. Sentence two.", "Sentence three. Sentence four."],
+            ),
+            (
+                sentences,
+                30,
+                0,
+                ["Sentence one. Sentence two.", "Sentence three. Sentence four."],
+            ),
+            (
+                "「第一句。」第二句。『第三句！』第四句？",
+                8,
+                0,
+                ["「第一句。」", "第二句。", "『第三句！』", "第四句？"],
+            ),
+            (paragraphs, 20, 0, ["第一段第一句。\n\n第二段第一句。", "第三段第一句。"]),
+            (
+                paragraphs,
+                20,
+                10,
+                [
+                    "第一段第一句。\n\n第二段第一句。",
+                    "第二段第一句。\n\n第三段第一句。",
+                ],
+            ),
+            (
+                "这是一段没有标点的超长文本" * 20,
+                50,
+                0,
+                [
+                    ("这是一段没有标点的超长文本" * 20)[i : i + 50]
+                    for i in range(0, 260, 50)
+                ],
+            ),
+            (
+                "Sentence one. Sentence two. Sentence three. Sentence four. "
+                "Sentence five.句子一。句子二。句子三。句子四？句子五！",
+                20,
+                5,
+                [
+                    "Sentence one.",
+                    "Sentence two.",
+                    "Sentence three.",
+                    "Sentence four.",
+                    "Sentence five. 句子一。",
+                    "句子一。 句子二。 句子三。 句子四？",
+                    "句子四？ 句子五！",
+                ],
+            ),
+            ("", 500, 50, []),
+        ]
+
+        for text, size, overlap, expected in cases:
+            with self.subTest(text=text, size=size, overlap=overlap):
+                chunker = TextChunker(ChunkingConfig(size=size, overlap=overlap))
+                chunks = chunker.iter_chunks(text)
+                self.assertTrue(inspect.isgenerator(chunks))
+                self.assertEqual(list(chunks), expected)
+                self.assertEqual(chunk_text(text, size, overlap), expected)
+
+    def test_iter_chunks_on_large_text(self):
+        paragraph = "Sentence one. 句子二。" * 50
+        text = "\n\n".join(paragraph for _ in range(200))
+        chunker = TextChunker(ChunkingConfig(size=2000, overlap=200))
+
+        chunks = list(chunker.iter_chunks(text))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 2000)
+        # overlapped with the previous chunk
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertIn(previous[-4:], chunk[:200])
+
+
+class TextNormalizerTest(TestCase):
+    def test_removes_markdown_syntax(self):
+        text = """
+para with [link](https://example.com) and `code` &amp; **bold** $x^2$
+
+- item 1
+- item 2
+
+![cover](cover.png)
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+    indented code
+"""
+        self.assertEqual(
+            TextNormalizer.normalize(text),
+            "para with link and code & bold\n\nitem 1\n\nitem 2\n\na b\n\n1 2",
+        )
+
+    def test_removes_html_tags_and_scripts(self):
+        text = """
+<div>
+block <b>html</b>
+<script>alert("ciallo")</script>
+</div>
+
+inline <span>text</span> <script>alert("ciallo")</script> end
+"""
+        self.assertEqual(
+            TextNormalizer.normalize(text), "block html\n\ninline text end"
+        )
+
+    def test_splits_sections_with_heading_path(self):
+        text = """---
+title: title
+---
+
+intro
+
+# 安装
+
+## Linux
+
+apt install
+
+## Windows
+
+# 使用
+
+> run it
+"""
+        self.assertEqual(
+            TextNormalizer.sections(text),
+            [
+                TextSection("intro", ()),
+                TextSection("Linux\n\napt install", ("安装", "Linux")),
+                TextSection("使用\n\nrun it", ("使用",)),
+            ],
+        )
+
+    def test_setext_heading_levels(self):
+        text = "Guide\n=====\n\nintro\n\n<b>Setup</b>\n-----\n\napt install\n"
+        self.assertEqual(
+            TextNormalizer.sections(text),
+            [
+                TextSection("Guide\n\nintro", ("Guide",)),
+                TextSection("Setup\n\napt install", ("Guide", "Setup")),
+            ],
+        )
+
+    def test_chunks_do_not_cross_sections(self):
+        text = "# 第一章\n\n第一句。第二句。\n\n# 第二章\n\n第三句。"
+        chunks = TextChunker(ChunkingConfig(size=100, overlap=10)).chunk_sections(text)
+
+        self.assertEqual(
+            [(chunk.text, chunk.heading_path) for chunk in chunks],
+            [
+                ("第一章\n\n第一句。第二句。", ("第一章",)),
+                ("第二章\n\n第三句。", ("第二章",)),
+            ],
+        )
+
+
+class TokenChunkerTest(TestCase):
+    def setUp(self):
+        self.tokenizer = FakeTokenizer()
+
+    def _chunker(self, size: int, overlap: int = 0) -> TokenChunker:
+        return TokenChunker(self.tokenizer, ChunkingConfig(size=size, overlap=overlap))
+
+    def test_chunks_fit_token_budget(self):
+        text = "这是第一句话。" * 10 + "\n\n" + "This is an english sentence. " * 10
+        chunks = self._chunker(size=20, overlap=5).chunk(text)
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(self.tokenizer.count([chunk])[0], 20)
+
+    def test_fills_window_with_fewer_chunks_than_characters(self):
+        text = "This is an english sentence. " * 40
+
+        token_chunks = self._chunker(size=100).chunk(text)
+        text_chunks = chunk_text(text, chunk_size=100, overlap=0)
+
+        self.assertLess(len(token_chunks), len(text_chunks))
+        self.assertEqual(len(token_chunks), 2)
+
+    def test_caches_sentence_counts(self):
+        chunker = self._chunker(size=10)
+        text = "第一句。第二句。第三句。第四句。"
+
+        first = chunker.chunk(text)
+        counted = len(self.tokenizer.counted)
+        second = chunker.chunk(text)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.tokenizer.counted[counted:], [])
+
+    def test_splits_long_sentence_at_token_boundaries(self):
+        text = " ".join(f"word{i}" for i in range(25))
+        chunks = self._chunker(size=10).chunk(text)
+
+        self.assertEqual(
+            chunks,
+            [
+                " ".join(f"word{i}" for i in range(0, 10)),
+                " ".join(f"word{i}" for i in range(10, 20)),
+                " ".join(f"word{i}" for i in range(20, 25)),
+            ],
+        )
@@ -0,0 +1,136 @@
+import json
+import time
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+
+from api.backends import TwoTierRedisCache
+from api.backends.TwoTierRedisCache import LocalLRU
+
+
+class LocalLRUTest(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LocalLRU(max_entries=2, timeout=60)
+        lru.set("a", 1, lru.generation)
+        lru.set("b", 2, lru.generation)
+        lru.get("a")
+        lru.set("c", 3, lru.generation)
+
+        self.assertEqual(lru.get("a"), 1)
+        self.assertEqual(lru.get("c"), 3)
+        self.assertNotIn("b", lru._entries)
+        self.assertEqual(len(lru), 2)
+
+    def test_expires(self):
+        lru = LocalLRU(max_entries=2, timeout=60)
+        lru.set("a", 1, lru.generation)
+
+        with patch.object(time, "monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual(len(lru), 1)
+            lru.get("a")
+        self.assertEqual(len(lru), 0)
+
+    def test_returns_copies(self):
+        lru = LocalLRU(max_entries=2, timeout=60)
+        lru.set("session", {"user": 1}, lru.generation)
+        lru.get("session")["user"] = 2
+
+        self.assertEqual(lru.get("session"), {"user": 1})
+
+    def test_skip_stale_read(self):
+        lru = LocalLRU(max_entries=2, timeout=60)
+        # read from redis, then invalidated before storing it
+        generation = lru.generation
+        lru.evict(["a"])
+        lru.set("a", "old", generation)
+
+        self.assertEqual(len(lru), 0)
+
+
+class TwoTierRedisCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = TwoTierRedisCache(
+            "redis://localhost:6379/0",
+            {"OPTIONS": {"LOCAL_KEY_PREFIXES": ["response:"], "LOCAL_TIMEOUT": 60}},
+        )
+        self.cache._client = self.client = MagicMock()
+        self.redis = self.client.get_client.return_value
+        # subscribed, without the listener thread
+        patcher = patch.object(self.cache, "_ensure_listener", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_local_hit(self):
+        self.client.get.return_value = b"body"
+
+        self.assertEqual(self.cache.get("response:post:1"), b"body")
+        self.assertEqual(self.cache.get("response:post:1"), b"body")
+        self.client.get.assert_called_once()
+
+    def test_other_keys_always_from_redis(self):
+        self.client.get.return_value = 1
+
+        self.cache.get("rate_limit:1")
+        self.cache.get("rate_limit:1")
+        self.assertEqual(self.client.get.call_count, 2)
+
+        # the counters don't publish
+        self.cache.incr("rate_limit:1")
+        self.redis.publish.assert_not_called()
+
+    def test_write_publishes_invalidation(self):
+        self.client.get.return_value = b"old"
+        self.cache.get("response:post:1")
+
+        self.cache.set("response:post:1", b"new")
+        channel, payload = self.redis.publish.call_args.args
+        self.assertEqual(channel, "cache:invalidate")
+        self.assertEqual(json.loads(payload), [self.cache.make_key("response:post:1")])
+
+        self.client.get.return_value = b"new"
+        self.assertEqual(self.cache.get("response:post:1"), b"new")
+
+    def test_message_evicts(self):
+        self.client.get.return_value = b"old"
+        self.cache.get("response:post:1")
+
+        # written by another worker
+        self.cache._on_message(json.dumps([self.cache.make_key("response:post:1")]))
+        self.client.get.return_value = b"new"
+        self.assertEqual(self.cache.get("response:post:1"), b"new")
+
+        self.cache._on_message(json.dumps("*"))
+        self.assertEqual(len(self.cache._local), 0)
+
+    def test_bypass_when_not_subscribed(self):
+        self.client.get.return_value = b"body"
+
+        with patch.object(self.cache, "_ensure_listener", return_value=False):
+            self.cache.get("response:post:1")
+            self.cache.get("response:post:1")
+        self.assertEqual(self.client.get.call_count, 2)
+        self.assertEqual(len(self.cache._local), 0)
+
+    def test_get_many_one_round_trip(self):
+        self.client.get.return_value = b"cached"
+        self.cache.get("response:post:1")
+        self.client.get_many.return_value = {"response:post:2": b"2"}
+
+        values = self.cache.get_many(["response:post:1", "response:post:2"])
+        self.assertEqual(
+            values, {"response:post:1": b"cached", "response:post:2": b"2"}
+        )
+        # only the local misses, in one MGET
+        self.client.get_many.assert_called_once_with(
+            ["response:post:2"], version=None, client=None
+        )
+
+        self.cache.get_many(["response:post:2"])
+        self.client.get_many.assert_called_once()
+
+    async def test_aget_many(self):
+        self.client.get_many.return_value = {"response:post:1": b"1"}
+
+        values = await self.cache.aget_many(["response:post:1", "response:post:2"])
+        self.assertEqual(values, {"response:post:1": b"1"})
+        self.client.get_many.assert_called_once()
@@ -1,11 +1,23 @@
 import re
+from collections import deque
 from dataclasses import dataclass
 from html import unescape
-from typing import Protocol
+from typing import Iterable, Iterator, Protocol
+
+from .markdown import Markdown
 
 # performance issue. RIIR?
 
-__all__ = ["ChunkingConfig", "TextNormalizer", "TextChunker", "chunk_text"]
+__all__ = [
+    "ChunkingConfig",
+    "TextChunk",
+    "TextNormalizer",
+    "TextChunker",
+    "TextSection",
+    "TokenChunker",
+    "Tokenizer",
+    "chunk_text",
+]
 
 
 _SENTENCE_BOUNDARY_CHARS = ".!?。！？"
@@ -15,11 +27,22 @@ _SENTENCE_END_RE = re.compile(
     rf"[{re.escape(_SENTENCE_BOUNDARY_CHARS)}]+"
     rf"[{re.escape(_SENTENCE_CLOSING_CHARS)}]*"
 )
+_PARAGRAPH_BREAK_RE = re.compile(r"\n{2,}")
 
 
-# TODO: token base chunker
 class Chunker(Protocol):
     def chunk(self, text: str) -> list[str]: ...
+    def chunk_sections(self, text: str) -> list["TextChunk"]: ...
+    def chunk_normalized(
+        self, sections: Iterable["TextSection"]
+    ) -> list["TextChunk"]: ...
+
+
+class Tokenizer(Protocol):
+    """the tokenizer of the embedding model, see `api.ml_model.FastTokenizer`"""
+
+    def count(self, texts: list[str]) -> list[int]: ...
+    def split(self, text: str, max_tokens: int) -> list[str]: ...
 
 
 @dataclass(frozen=True)
@@ -36,90 +59,231 @@ class ChunkingConfig:
             raise ValueError("overlap must smaller than chunk size")
 
 
+@dataclass(frozen=True)
+class TextSection:
+    """plain text under the same headings"""
+
+    text: str
+    heading_path: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class TextChunk:
+    text: str
+    heading_path: tuple[str, ...] = ()
+
+
 class TextNormalizer:
+    """
+    Delete Markdown syntax.
+
+    Walk the syntax tree of the Rust parser once instead of guessing the
+    structure with regex, paragraphs and headings come from the parser.
+    """
+
     SENTENCE_END_RE = _SENTENCE_END_RE
-    FRONT_MATTER_RE = re.compile(r"\A\s*---\s*\n.*?\n---\s*(?:\n|\Z)", re.DOTALL)
-    FENCED_CODE_RE = re.compile(r"```[\s\S]*?```|~~~[\s\S]*?~~~")
+
+    # not readable text, skip the whole node
+    SKIP_NODES = frozenset(
+        {"CodeFence", "CodeBlock", "MathInline", "MathBlock", "Image", "ThematicBreak"}
+    )
+    HEADING_NODES = frozenset({"ATXHeading", "SetextHeader"})
+    # the binding has no level of a heading node, only its rendered tag
+    HEADING_LEVEL_RE = re.compile(r"<h([1-6])\b", re.IGNORECASE)
+    # inline nodes outside `*::inline::*`
+    EXTRA_INLINE_NODES = frozenset({"Strikethrough", "Mark"})
+
+    # only for the raw HTML fragments
+    HTML_SKIP_RE = re.compile(
+        r"<(script|style|pre)\b[^>]*>[\s\S]*?</\s*\1[^>]*>"
+        r"|<!--[\s\S]*?-->|<!\[CDATA\[[\s\S]*?]]>|<!DOCTYPE[^>]*>",
+        re.IGNORECASE,
+    )
     HTML_BLOCK_BREAK_RE = re.compile(
         r"</?(?:p|span|div|section|article|header|footer|main|aside|nav|br|hr|h[1-6]|"
-        r"li|ul|ol|blockquote|pre|table|thead|tbody|tr|td|th)[^>]*>",
+        r"li|ul|ol|blockquote|pre|table|thead|tbody|tr|td|th)\b[^>]*>",
         re.IGNORECASE,
     )
+    HTML_TAG_RE = re.compile(r"<[^>]+>")
+    HTML_SKIP_OPEN_RE = re.compile(r"<(script|style)\b", re.IGNORECASE)
+    WHITESPACE_RE = re.compile(r"[ \t\r\n]+")
+    # the front matter must be at the very beginning for the parser
+    LEADING_BLANK_LINES_RE = re.compile(r"\A(?:[ \t]*\r?\n)+")
+
+    _node_kinds: dict[str, str] = {}
+
+    _markdown = Markdown(
+        html=True,
+        linkify=False,
+        math=True,
+        frontmatter=True,
+        syntax_highlighting=False,
+    )
 
     @classmethod
     def normalize(cls, text: str) -> str:
-        """delete Markdown syntax"""
-
-        text = cls.FRONT_MATTER_RE.sub("", text)
-        text = cls._remove_code(text)
-        text = re.sub(r"!\[[^\]]*]\([^)]+\)", "", text)
-        text = re.sub(r"\[([^\]]+)]\([^)]+\)", r"\1", text)
-        text = re.sub(r"^#{1,6}\s+", "", text, flags=re.MULTILINE)
-        text = re.sub(r"^>\s?", "", text, flags=re.MULTILINE)
-        text = re.sub(r"^[\t ]*[-*+]\s+", "", text, flags=re.MULTILINE)
-        text = re.sub(r"^[\t ]*\d+\.\s+", "", text, flags=re.MULTILINE)
-        text = re.sub(r"^([-*_])(?:\s*\1){2,}\s*$", "", text, flags=re.MULTILINE)
-        text = re.sub(r"(\*\*\*|___)(.*?)\1", r"\2", text, flags=re.DOTALL)
-        text = re.sub(r"(\*\*|__)(.*?)\1", r"\2", text, flags=re.DOTALL)
-        text = re.sub(r"([*_])(.*?)\1", r"\2", text, flags=re.DOTALL)
-        text = re.sub(r"~~(.*?)~~", r"\1", text, flags=re.DOTALL)
-        text = re.sub(r"`([^`]+)`", r"\1", text)
-        text = re.sub(r"\$\$[\s\S]*?\$\$|\\\[[\s\S]*?\\]", "", text)
-        text = re.sub(r"\$[^$\n]+\$|\\\([^)]+\\\)", "", text)
-        text = cls._remove_html(text)
-        text = unescape(text)
-        return cls._normalize_whitespace(text)
+        """markdown -> plain text, paragraphs are separated by blank lines"""
+        return "\n\n".join(section.text for section in cls.sections(text))
 
     @classmethod
-    def _remove_code(cls, text: str) -> str:
-        text = re.sub(r"<pre[\s\S]*?</pre>", "", text, flags=re.IGNORECASE)
-        text = cls.FENCED_CODE_RE.sub("", text)
-        text = re.sub(r"(?m)^(?: {4,}|\t).*$", "", text)
-        return re.sub(r"<code[^>]*>([\s\S]*?)</code>", r"\1", text, flags=re.IGNORECASE)
+    def sections(cls, text: str) -> list[TextSection]:
+        """markdown -> plain text of each section, split by top-level headings"""
+        if not text.strip():
+            return []
+        text = cls.LEADING_BLANK_LINES_RE.sub("", text)
+        walker = _SectionWalker(cls)
+        walker.walk_root(cls._markdown.parse(text).root)
+        return walker.finish()
 
     @classmethod
-    def _remove_html(cls, text: str) -> str:
-        text = re.sub(
-            r"<script[^>]*>[\s\S]*?</\s*script[^>]*>",
-            "",
-            text,
-            flags=re.IGNORECASE,
-        )
-        text = re.sub(
-            r"<style[^>]*>[\s\S]*?</\s*style[^>]*>",
-            "",
-            text,
-            flags=re.IGNORECASE,
+    def node_kind(cls, type_name: str) -> str:
+        """how to walk the node, by the full type name of the node"""
+        if (kind := cls._node_kinds.get(type_name)) is not None:
+            return kind
+
+        name = type_name.rsplit("::", 1)[-1]
+        if name in cls.SKIP_NODES:
+            kind = "skip"
+        elif name in cls.HEADING_NODES:
+            kind = "heading"
+        elif name in ("Text", "TextSpecial"):
+            kind = "text"
+        elif name in ("Softbreak", "Hardbreak"):
+            kind = "break"
+        elif name == "HtmlInline":
+            kind = "html_inline"
+        elif name == "HtmlBlock":
+            kind = "html_block"
+        elif name == "TableCell":
+            kind = "cell"
+        elif "::inline::" in type_name or name in cls.EXTRA_INLINE_NODES:
+            kind = "inline"
+        else:
+            kind = "block"
+        cls._node_kinds[type_name] = kind
+        return kind
+
+    @classmethod
+    def html_to_paragraphs(cls, html: str) -> list[str]:
+        html = cls.HTML_SKIP_RE.sub("", html)
+        html = cls.HTML_BLOCK_BREAK_RE.sub("\n\n", html)
+        html = unescape(cls.HTML_TAG_RE.sub("", html))
+        paragraphs = (
+            cls.WHITESPACE_RE.sub(" ", paragraph).strip()
+            for paragraph in _PARAGRAPH_BREAK_RE.split(html)
         )
-        text = re.sub(r"<!--[\s\S]*?-->", "", text)
-        text = re.sub(r"<!\[CDATA\[[\s\S]*?]]>", "", text)
-        text = re.sub(r"<!DOCTYPE[^>]*>", "", text, flags=re.IGNORECASE)
-        text = cls.HTML_BLOCK_BREAK_RE.sub("\n", text)
-        return re.sub(r"<[^>]+>", "", text)
+        return [paragraph for paragraph in paragraphs if paragraph]
 
-    @staticmethod
-    def _normalize_whitespace(text: str) -> str:
-        paragraphs: list[str] = []
-        current: list[str] = []
-        lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
-        for line in lines:
-            if line:
-                current.append(line)
-                continue
-            if current:
-                paragraphs.append(" ".join(current))
-                current = []
 
-        if current:
-            paragraphs.append(" ".join(current))
+class _SectionWalker:
+    """the state of one `TextNormalizer.sections` call"""
 
-        return "\n\n".join(paragraphs).strip()
+    def __init__(self, normalizer: type[TextNormalizer]):
+        self.normalizer = normalizer
+        self.sections: list[TextSection] = []
+        self.headings: list[tuple[int, str]] = []  # (level, text)
+        self.paragraphs: list[str] = []
+        self.has_body = False
+        self.inline: list[str] = []
+        self.skip_html_tag: str | None = None  # inside inline <script> / <style>
+
+    def walk_root(self, root) -> None:
+        for node in root.children:
+            if self.normalizer.node_kind(node.type_name) == "heading":
+                self._start_section(node)
+            else:
+                self._walk([node])
+        self._flush()
+
+    def finish(self) -> list[TextSection]:
+        self._finish_section()
+        return self.sections
+
+    def _walk(self, nodes) -> None:
+        node_kind = self.normalizer.node_kind
+        inline = self.inline
+        for node in nodes:
+            kind = node_kind(node.type_name)
+            if kind == "text":
+                if self.skip_html_tag is None:
+                    inline.append(unescape(node.render()))
+            elif kind == "inline":
+                self._walk(node.children)
+            elif kind == "break":
+                inline.append(" ")
+            elif kind == "html_inline":
+                self._inline_html(node.render())
+            elif kind == "html_block":
+                self._flush()
+                self._add_paragraphs(self.normalizer.html_to_paragraphs(node.render()))
+            elif kind == "cell":
+                # a table row is a paragraph
+                self._walk(node.children)
+                inline.append(" ")
+            elif kind != "skip":
+                # block (including the nested headings)
+                self._flush()
+                self._walk(node.children)
+                self._flush()
+
+    def _inline_html(self, html: str) -> None:
+        if self.skip_html_tag is not None:
+            if html.lower().startswith(f"</{self.skip_html_tag}"):
+                self.skip_html_tag = None
+            return
+        if match := self.normalizer.HTML_SKIP_OPEN_RE.match(html):
+            self.skip_html_tag = match.group(1).lower()
+        elif html.lower().startswith("<br"):
+            self.inline.append(" ")
+
+    def _flush(self) -> None:
+        """end the current paragraph"""
+        if not self.inline:
+            return
+        paragraph = "".join(self.inline)
+        self.inline.clear()
+        self._add_paragraphs([paragraph])
+
+    def _add_paragraphs(self, paragraphs: list[str]) -> None:
+        for paragraph in paragraphs:
+            paragraph = self.normalizer.WHITESPACE_RE.sub(" ", paragraph).strip()
+            if paragraph:
+                self.paragraphs.append(paragraph)
+                self.has_body = True
+
+    def _start_section(self, heading) -> None:
+        self._flush()
+        self._finish_section()
+
+        # "<h2 id=...>", the deepest level if a plugin renders it otherwise
+        match = self.normalizer.HEADING_LEVEL_RE.search(heading.render())
+        level = int(match.group(1)) if match else 6
+        self._walk(heading.children)
+        title = self.normalizer.WHITESPACE_RE.sub(" ", "".join(self.inline)).strip()
+        self.inline.clear()
+
+        while self.headings and self.headings[-1][0] >= level:
+            self.headings.pop()
+        self.headings.append((level, title))
+        if title:
+            self.paragraphs.append(title)
+
+    def _finish_section(self) -> None:
+        # a heading without content is only kept in the heading path
+        if self.has_body:
+            heading_path = tuple(title for _, title in self.headings if title)
+            self.sections.append(
+                TextSection("\n\n".join(self.paragraphs), heading_path)
+            )
+        self.paragraphs = []
+        self.has_body = False
 
 
 @dataclass(frozen=True)
 class _TextUnit:
     text: str
     separator_before: str = " "
+    length: int = 0  # measured by the chunker, characters or tokens
 
 
 class TextChunker(Chunker):
@@ -133,38 +297,78 @@ class TextChunker(Chunker):
 
     def chunk(self, text: str) -> list[str]:
         """core method. chunk text to makesure it less than a fixed length"""
-        text = self.normalizer.normalize(text)
-        if not text:
-            return []
-        if len(text) <= self.config.size:
-            return [text]
+        return list(self.iter_chunks(text))
+
+    def chunk_sections(self, text: str) -> list[TextChunk]:
+        """same as `chunk`, with the heading path of each chunk"""
+        return list(self.iter_section_chunks(text))
+
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        """streaming version of `chunk`, yield each chunk once it is completed"""
+        for chunk in self.iter_section_chunks(text):
+            yield chunk.text
+
+    def chunk_normalized(self, sections: Iterable[TextSection]) -> list[TextChunk]:
+        """chunk the sections from `TextNormalizer.sections`, skip normalizing"""
+        return list(self._iter_normalized_chunks(sections))
 
-        units = self._to_atomic_units(text)
-        return self._merge_units(units)
+    def iter_section_chunks(self, text: str) -> Iterator[TextChunk]:
+        """a chunk never crosses the top-level headings"""
+        yield from self._iter_normalized_chunks(self.normalizer.sections(text))
 
-    def _to_atomic_units(self, text: str) -> list[_TextUnit]:
+    def _iter_normalized_chunks(
+        self, sections: Iterable[TextSection]
+    ) -> Iterator[TextChunk]:
+        for section in sections:
+            for chunk in self._iter_text_chunks(section.text):
+                yield TextChunk(chunk, section.heading_path)
+
+    def _iter_text_chunks(self, text: str) -> Iterator[str]:
+        if self._measure([text])[0] <= self.config.size:
+            yield text
+            return
+
+        yield from self._merge_units(self._iter_atomic_units(text))
+
+    def _iter_atomic_units(self, text: str) -> Iterator[_TextUnit]:
         """split text to text units. makesure each unit is shorter than chunk_size"""
 
-        units: list[_TextUnit] = []
-        for paragraph in re.split(r"\n{2,}", text):
+        has_units = False
+        for paragraph in self._iter_paragraphs(text):
             paragraph = paragraph.strip()
             # empty paragraph
             if not paragraph:
                 continue
 
-            # add the paragraph if possible
-            if len(paragraph) <= self.config.size:
-                paragraph_units = self._split_sentences(paragraph)
-            else:
-                paragraph_units = []
-                for sentence in self._split_sentences(paragraph):
-                    paragraph_units.extend(self._split_long_text(sentence))
+            # measure all sentences of the paragraph at once
+            sentences = self._split_sentences(paragraph)
+            paragraph_units: list[tuple[str, int]] = []
+            for sentence, length in zip(sentences, self._measure(sentences)):
+                if length <= self.config.size:
+                    paragraph_units.append((sentence, length))
+                    continue
+                pieces = self._split_long_text(sentence)
+                paragraph_units.extend(zip(pieces, self._measure(pieces)))
 
-            for index, unit in enumerate(paragraph_units):
-                separator = "\n\n" if units and index == 0 else " "
-                units.append(_TextUnit(unit, separator))
+            for index, (unit, length) in enumerate(paragraph_units):
+                separator = "\n\n" if has_units and index == 0 else " "
+                yield _TextUnit(unit, separator, length)
+                has_units = True
 
-        return units
+    def _measure(self, texts: list[str]) -> list[int]:
+        """the length of texts, count characters by default"""
+        return [len(text) for text in texts]
+
+    def _separator_length(self, separator: str) -> int:
+        return len(separator)
+
+    @staticmethod
+    def _iter_paragraphs(text: str) -> Iterator[str]:
+        start = 0
+        for match in _PARAGRAPH_BREAK_RE.finditer(text):
+            yield text[start : match.start()]
+            start = match.end()
+        yield text[start:]
 
     def _split_sentences(self, text: str) -> list[str]:
         """a long text -> a sentences list"""
@@ -199,45 +403,63 @@ class TextChunker(Chunker):
             if text[start : start + self.config.size].strip()
         ]
 
-    def _merge_units(self, units: list[_TextUnit]) -> list[str]:
-        """units -> text"""
+    def _merge_units(self, units: Iterable[_TextUnit]) -> Iterator[str]:
+        """
+        units -> text
+
+        the length of the joined chunk is counted incrementally, units are
+        stripped and not empty, so joined length is the sum of the units and
+        the separators between them
+        """
 
-        chunks: list[str] = []  # result
-        current: list[_TextUnit] = []  # current text
+        size = self.config.size
+        current: deque[_TextUnit] = deque()  # current text
+        length = 0  # length of current text after joined
         for unit in units:
-            tmp = self._join_units([*current, unit])
-            if current and len(tmp) > self.config.size:
-                # if looger then configured append it to result
-                chunks.append(self._join_units(current))
-                current = self._overlap_units(current)
-                tmp = self._join_units([*current, unit])
-                if len(tmp) > self.config.size:
-                    current = [unit]
+            added = self._joined_length(unit, current)
+            if current and length + added > size:
+                # if looger then configured yield it
+                yield self._join_units(current)
+                current, length = self._overlap_units(current)
+                added = self._joined_length(unit, current)
+                if length + added > size:
+                    current = deque([unit])
+                    length = unit.length
                 else:
                     current.append(unit)
+                    length += added
             else:
                 current.append(unit)
+                length += added
 
         if current:
-            chunks.append(self._join_units(current))
+            yield self._join_units(current)
 
-        return chunks
+    def _overlap_units(self, units: deque[_TextUnit]) -> tuple[deque[_TextUnit], int]:
+        """overlap, return the tailing units and the length after joined"""
 
-    def _overlap_units(self, units: list[_TextUnit]) -> list[_TextUnit]:
-        """overlap"""
-
-        selected: list[_TextUnit] = []
+        selected: deque[_TextUnit] = deque()
+        length = 0
         for unit in reversed(units):
             # makesure it shorter than config.overlap
-            tmp = self._join_units([unit, *selected])
-            if len(tmp) > self.config.overlap:
+            tmp = unit.length
+            if selected:
+                tmp += self._separator_length(selected[0].separator_before) + length
+            if tmp > self.config.overlap:
                 break
-            selected.insert(0, unit)
+            selected.appendleft(unit)
+            length = tmp
+
+        return selected, length
 
-        return selected
+    def _joined_length(self, unit: _TextUnit, current: deque[_TextUnit]) -> int:
+        """how much length will be added after append the unit"""
+        if current:
+            return self._separator_length(unit.separator_before) + unit.length
+        return unit.length
 
     @staticmethod
-    def _join_units(units: list[_TextUnit]) -> str:
+    def _join_units(units: Iterable[_TextUnit]) -> str:
         parts: list[str] = []
         for unit in units:
             text = unit.text.strip()
@@ -249,6 +471,61 @@ class TextChunker(Chunker):
         return "".join(parts).strip()
 
 
+class TokenChunker(TextChunker):
+    """
+    Measure the text with the tokenizer of the embedding model, so the chunks
+    fill the context window instead of a fixed number of characters.
+
+    `config.size` and `config.overlap` are counted in tokens. The length of a
+    chunk is the sum of its sentences, it's close to (but not exactly) the
+    tokens of the joined text, keep some room for the special tokens.
+    """
+
+    # per-sentence token counts, shared by all posts
+    CACHE_SIZE = 100_000
+    # don't keep the whole post in the cache
+    CACHE_MAX_TEXT_LENGTH = 2000
+
+    def __init__(
+        self,
+        tokenizer: Tokenizer,
+        config: ChunkingConfig = None,
+        normalizer: TextNormalizer = None,
+    ):
+        super().__init__(config, normalizer)
+        self.tokenizer = tokenizer
+        self._counts: dict[str, int] = {}
+
+    def _measure(self, texts: list[str]) -> list[int]:
+        missing = list({text for text in texts if text not in self._counts})
+        if not missing:
+            return [self._counts[text] for text in texts]
+
+        # tokenize in one batch
+        counts = dict(zip(missing, self.tokenizer.count(missing), strict=True))
+        if len(self._counts) + len(counts) > self.CACHE_SIZE:
+            self._counts.clear()
+        for text, count in counts.items():
+            if len(text) <= self.CACHE_MAX_TEXT_LENGTH:
+                self._counts[text] = count
+
+        return [counts[t] if t in counts else self._counts[t] for t in texts]
+
+    def _separator_length(self, separator: str) -> int:
+        # whitespace is merged into the next token
+        return 0
+
+    def _split_long_text(self, text: str) -> list[str]:
+        """makesure text is shorter than config.size tokens"""
+
+        if self._measure([text])[0] <= self.config.size:
+            return [text]
+        pieces = (
+            piece.strip() for piece in self.tokenizer.split(text, self.config.size)
+        )
+        return [piece for piece in pieces if piece]
+
+
 # helper method
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> list[str]:
     config = ChunkingConfig(size=chunk_size, overlap=overlap)
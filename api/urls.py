@@ -3,9 +3,11 @@ from django.contrib.admin.views.decorators import staff_member_required
 from ninja import NinjaAPI
 from ninja.errors import HttpError
 
+from .renderers import ORJSONParser, ORJSONRenderer
 from .routers.anime import router as anime_router
 from .routers.auth import router as auth_router
 from .routers.category import router as categories_router
+from .routers.change import router as change_router
 from .routers.comment import router as comment_router
 from .routers.gal import router as gal_router
 from .routers.guest import router as guest_router
@@ -15,12 +17,15 @@ from .routers.mail import router as mail_router
 from .routers.page import router as page_router
 from .routers.post import router as posts_router
 from .routers.root import router as root_router
+from .routers.sitemap import router as sitemap_router
 
 api = NinjaAPI(
     title="GSGFs blog API",
     description="GSGFs blog backend API",
     version="1.0.0",
     docs_decorator=staff_member_required if not settings.DEBUG else None,
+    renderer=ORJSONRenderer(),
+    parser=ORJSONParser(),
 )
 
 
@@ -38,6 +43,7 @@ def http_error_handler(request, exc: HttpError):
 api.add_router("/anime", anime_router)
 api.add_router("/auth", auth_router)
 api.add_router("/category", categories_router)
+api.add_router("/changes", change_router)
 api.add_router("/comment", comment_router)
 api.add_router("/gal", gal_router)
 api.add_router("/guest", guest_router)
@@ -46,4 +52,5 @@ api.add_router("/image", image_router)
 api.add_router("/mail", mail_router)
 api.add_router("/page", page_router)
 api.add_router("/post", posts_router)
+api.add_router("/sitemap", sitemap_router)
 api.add_router("/", root_router)
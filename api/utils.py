@@ -205,18 +205,10 @@ def extract_first_image(text: str) -> Optional[str]:
 
 
 def extract_metadata(text: str, num_keywords=5) -> MetadataResult:
-    from jieba import analyse as jieba_analyse
-
     """
     Extracts metadata from a given text,
     including keywords, tags, category, title, slug, cover image, and header image.
-    The function processes the input text by:
-    - Extracting front matter metadata if present.
-    - Identifying the first image in the text.
-    - Removing code blocks, Markdown syntax, and HTML tags from the text.
-    - Collecting keywords and tags from front matter and by analyzing the text content.
-    - Determining the category from front matter fields.
-    - Extracting cover and header images from front matter using common field names.
+    The text is parsed once and memoised, see `api.content_analysis`.
     Args:
         text (str): The input text from which metadata is to be extracted.
         num_keywords (int, optional): The maximum number of keywords to extract.
@@ -231,16 +223,24 @@ def extract_metadata(text: str, num_keywords=5) -> MetadataResult:
             - cover_image (Optional[str]): Cover image URL or path.
             - header_image (Optional[str]): Header image URL or path.
     """
+    from api.content_analysis import analyze_content
 
-    # Get front matter if exists
-    front_matter = extract_front_matter(text)
+    return analyze_content(text).metadata(num_keywords)
 
-    first_image = extract_first_image(text)
 
-    # Remove HTML tags and Markdown syntax
-    text = remove_code_blocks(text)
-    text = remove_markdown(text)
-    text = remove_html_tags(text)
+def build_metadata(
+    front_matter: Dict[str, Any],
+    text: str,
+    first_image: Optional[str] = None,
+    num_keywords=5,
+) -> MetadataResult:
+    """
+    Build the metadata from the parsed front matter and the plain text.
+    - Collecting keywords and tags from front matter and by analyzing the text content.
+    - Determining the category from front matter fields.
+    - Extracting cover and header images from front matter using common field names.
+    """
+    from api.keywords import extract_keywords
 
     # === tags ===
     tags_list: List[str] = []
@@ -263,7 +263,7 @@ def extract_metadata(text: str, num_keywords=5) -> MetadataResult:
         keywords_list.extend(front_matter["keywords"])
     if "tags" in front_matter:
         keywords_list.extend(tags_list)
-    most_common = jieba_analyse.extract_tags(text, topK=num_keywords)
+    most_common = extract_keywords(text, top_k=num_keywords)
     # Ensure most_common is a list of strings (extract the first element if tuples)
     if most_common and isinstance(most_common[0], tuple):
         most_common = [item[0] for item in most_common if item[0] not in keywords_list]
@@ -193,11 +193,22 @@ _redis_url = os.environ.get("REDIS_URL", f"redis://{_redis_host}:{_redis_port}/0
 
 CACHES = {
     "default": {
-        "BACKEND": "django_prometheus.cache.backends.redis.RedisCache",
+        # redis with an in-process LRU, see 'api/backends/TwoTierRedisCache.py'
+        "BACKEND": "api.backends.TwoTierRedisCache",
         "LOCATION": _redis_url,
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
             "CONNECTION_POOL_KWARGS": {"max_connections": 100},
+            # the hot read-only keys, the counters and sessions stay in redis
+            "LOCAL_KEY_PREFIXES": [
+                "response:",
+                "count:",
+                "post_search:",
+                "sitemap:",
+                "views.decorators.cache.",
+            ],
+            "LOCAL_MAX_ENTRIES": 2048,
+            "LOCAL_TIMEOUT": 5,  # seconds, in case an invalidation is lost
         },
         "KEY_PREFIX": "django",  # eg. django:1:health_check
     },
@@ -306,6 +317,19 @@ INTERNAL_IPS = [
 API_KEY = os.getenv("API_KEY")
 if API_KEY is None:
     logging.warning("API_KEY is not set in environment variables.")
+# the old keys still accepted while rotating `API_KEY`, comma separated
+API_KEY_FALLBACKS = [
+    key for key in os.getenv("API_KEY_FALLBACKS", "").split(",") if key
+]
+# the keys of the clients, "client=key,old key;other=key", the first key signs,
+# a client without its own keys uses `API_KEY`, see 'api/auth.py'
+API_CLIENT_KEYS = {
+    client_id: [key for key in keys.split(",") if key]
+    for client_id, _, keys in (
+        item.partition("=") for item in os.getenv("API_CLIENT_KEYS", "").split(";")
+    )
+    if client_id
+}
 
 RESEND_API_KEY = os.getenv("RESEND_API_KEY")
 
@@ -363,6 +387,32 @@ USE_REMOTE_EMBEDDING = os.environ.get("USE_REMOTE_EMBEDDING", "False").lower() i
     "true",
     "yes",
 )
+# the remote API can't tokenize, it's the huggingface name of the same model
+REMOTE_EMBEDDING_TOKENIZER = os.environ.get("REMOTE_EMBEDDING_TOKENIZER", MODEL_NAME)
+REMOTE_EMBEDDING_MAX_TOKENS = int(os.environ.get("REMOTE_EMBEDDING_MAX_TOKENS", 2048))
+
+# how to chunk posts before embedding
+# "text": fixed number of characters, "token": fill the model context window
+EMBEDDING_CHUNKER = os.environ.get("EMBEDDING_CHUNKER", "text")
+
+# IDF table of our own posts for keyword extraction, see 'api/keywords.py'
+# shared by the web and celery processes
+KEYWORD_IDF_DIR = os.environ.get(
+    "KEYWORD_IDF_DIR", os.path.join(BASE_DIR, "data", "keyword_idf")
+)
+
+# the reverse proxies whose `X-Forwarded-For` is trusted by the rate limit,
+# comma separated addresses or networks, see 'api/rate_limit.py'
+# default: loopback and the private networks of the cluster (the ingress pods)
+RATE_LIMIT_TRUSTED_PROXIES = _split_csv(
+    os.environ.get(
+        "RATE_LIMIT_TRUSTED_PROXIES",
+        "127.0.0.1,::1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16",
+    )
+)
+
+# the objects in one shard of the sitemap data, see 'api/sitemap.py'
+SITEMAP_SHARD_SIZE = int(os.environ.get("SITEMAP_SHARD_SIZE", 5000))
 
 # supervisord may use root permissions
 # PermissionError: [Errno 13] Permission denied: '/root/.cache/huggingface/token'
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the text chunker on very large posts.
+
+usage: ./scripts/benchmark_chunking.py [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# (sentences per paragraph, paragraphs, chunk size, overlap)
+CASES = [
+    (20, 500, 500, 50),
+    (20, 5000, 500, 50),
+    (50, 2000, 4000, 400),
+    (200, 500, 20000, 2000),
+]
+
+
+def _make_post(sentences: int, paragraphs: int) -> str:
+    paragraph = "".join(
+        f"这是第{i}句测试文本。" if i % 2 else f"Sentence number {i}. "
+        for i in range(sentences)
+    )
+    return "\n\n".join(paragraph for _ in range(paragraphs))
+
+
+def _measure(func, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(project_root)
+
+    from api.text_chunking import ChunkingConfig, TextChunker
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'chars':>10} {'size':>6} {'overlap':>8} {'chunks':>7} {'best (s)':>10}")
+    for sentences, paragraphs, size, overlap in CASES:
+        post = _make_post(sentences, paragraphs)
+        chunker = TextChunker(ChunkingConfig(size=size, overlap=overlap))
+        chunks = chunker.chunk(post)
+        elapsed = _measure(chunker.chunk, post, args.repeat)
+        print(
+            f"{len(post):>10} {size:>6} {overlap:>8} {len(chunks):>7} {elapsed:>10.4f}"
+        )
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the JSON renderers of the API on payloads shaped like the responses.
+
+usage: ./scripts/benchmark_renderer.py [--repeat 20]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0, 0, 123456, tzinfo=datetime.UTC)
+
+
+def _post(html_size: int) -> dict:
+    return {
+        "id": 1,
+        "title": "标题 title",
+        "slug": "slug",
+        "content": "正文 content " * (html_size // 20),
+        "content_html": "<p>正文 <b>content</b></p>" * (html_size // 30),
+        "meta_description": "description",
+        "status": "published",
+        "view_count": 0,
+        "category": {"id": 1, "name": "category"},
+        "tags": [{"id": i, "name": f"tag {i}"} for i in range(5)],
+        "created_at": NOW,
+        "updated_at": NOW,
+        "content_update_at": NOW,
+    }
+
+
+def _sitemap(count: int) -> list:
+    return [{"id": i, "slug": f"post-{i}", "updated_at": NOW} for i in range(count)]
+
+
+def _comments(count: int) -> list:
+    return [
+        {
+            "id": i,
+            "content": "评论 comment " * 20,
+            "guest": {"id": i, "name": f"guest {i}", "avatar": None},
+            "created_at": NOW,
+        }
+        for i in range(count)
+    ]
+
+
+# (name, payload)
+CASES = [
+    ("post detail 50 KB", _post(50_000)),
+    ("post detail 500 KB", _post(500_000)),
+    ("post ids 10k", {"ids": list(range(10_000))}),
+    ("sitemap 2k", _sitemap(2_000)),
+    ("comments 500", _comments(500)),
+]
+
+
+def _measure(func, payload, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(None, payload, response_status=200)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(project_root)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blog.settings")
+
+    import django
+
+    django.setup()
+
+    from ninja.renderers import JSONRenderer
+
+    from api.renderers import ORJSONRenderer
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    json_renderer, orjson_renderer = JSONRenderer(), ORJSONRenderer()
+    print(f"{'payload':<20} {'json (ms)':>10} {'orjson (ms)':>12} {'speedup':>8}")
+    for name, payload in CASES:
+        stdlib = _measure(json_renderer.render, payload, args.repeat)
+        fast = _measure(orjson_renderer.render, payload, args.repeat)
+        print(
+            f"{name:<20} {stdlib * 1000:>10.3f} {fast * 1000:>12.3f} "
+            f"{stdlib / fast:>7.1f}x"
+        )